@@ -5,6 +5,7 @@ from django.contrib import messages
 import json
 import os
 from django.conf import settings
+from . import expiry_calendar
 
 def is_admin(user):
     return user.is_superuser
@@ -16,8 +17,8 @@ def update_expiry_dates(request):
             symbol = request.POST.get('symbol')
             expiry_dates = request.POST.get('expiry_dates')
             
-            # Parse expiry dates (comma-separated)
-            dates_list = [date.strip() for date in expiry_dates.split(',')]
+            # Parse expiry dates (comma-separated), deduped and sorted
+            dates_list = expiry_calendar.normalize_expiries(expiry_dates.split(','))
             
             # Load current symbol.json
             symbol_file_path = os.path.join(settings.BASE_DIR, 'dashboard', 'static', 'symbol.json')
@@ -30,6 +31,7 @@ def update_expiry_dates(request):
             # Save back to file
             with open(symbol_file_path, 'w') as f:
                 json.dump(data, f, indent=2)
+            expiry_calendar.invalidate(symbol)
             
             messages.success(request, f'Updated expiry dates for {symbol}')
             return redirect('admin_expiry')
@@ -0,0 +1,307 @@
+# ========== ALERT RULES ==========
+# Active AlertRules are loaded into an in-memory index keyed by
+# (symbol, expiry) -> field -> RuleGroup, where each group stores its rules as
+# parallel NumPy arrays. A new snapshot is handed to a background worker that
+# evaluates only the groups for that chain, each as one (rule x strike)
+# comparison. get_live_data never waits on evaluation; fired alerts are
+# stored as AlertEvents and returned with the user's next poll.
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from . import expiry_calendar
+from .snapshot import COLUMN_NAMES
+
+CHAIN_FIELDS = ('pcr', 'spot')
+FIELDS = CHAIN_FIELDS + COLUMN_NAMES
+CONDITIONS = ('above', 'below', 'crosses_above', 'crosses_below', 'grows_pct', 'falls_pct')
+GROWTH_CONDITIONS = ('grows_pct', 'falls_pct')
+# Compared in lots, as the option chain table shows them (to_rows)
+LOT_FIELDS = tuple(f"{side}_{field}" for side in ('call', 'put') for field in ('oi', 'oich', 'volume'))
+MAX_WINDOW_MINUTES = 60
+
+
+class RuleError(ValueError):
+    pass
+
+
+def parse_rule(body):
+    """Validate a rule definition from a request body; returns AlertRule field values
+
+    Thresholds on OI, OI change and volume are in lots, like the table.
+    """
+    try:
+        rule = {
+            'symbol': str(body['symbol']),
+            'expiry': str(body.get('expiry') or ''),
+            'field': str(body['field']).lower(),
+            'strike': float(body['strike']) if body.get('strike') not in (None, '') else None,
+            'condition': str(body['condition']),
+            'threshold': float(body['threshold']),
+            'window_minutes': int(body.get('window_minutes', 15)),
+            'repeat': bool(body.get('repeat', False)),
+        }
+    except (KeyError, TypeError, ValueError):
+        raise RuleError('Rules need symbol, field, condition and a numeric threshold')
+    if not expiry_calendar.is_known_symbol(rule['symbol']):
+        raise RuleError(f"Unknown symbol {rule['symbol']}")
+    # A rule on an expiry that can never be fetched would never fire
+    expiry_error = expiry_calendar.validate_expiry(rule['symbol'], rule['expiry']) if rule['expiry'] else None
+    if expiry_error:
+        raise RuleError(expiry_error)
+    if rule['field'] not in FIELDS:
+        raise RuleError(f"field must be one of: {', '.join(FIELDS)} (OI, OI change and volume in lots)")
+    if rule['condition'] not in CONDITIONS:
+        raise RuleError(f"condition must be one of: {', '.join(CONDITIONS)}")
+    if rule['field'] in CHAIN_FIELDS and rule['strike'] is not None:
+        raise RuleError(f"{rule['field']} is chain-wide and takes no strike")
+    if rule['condition'] in GROWTH_CONDITIONS and not 1 <= rule['window_minutes'] <= MAX_WINDOW_MINUTES:
+        raise RuleError(f"window_minutes must be between 1 and {MAX_WINDOW_MINUTES}")
+    return rule
+
+
+# ========== RULE INDEX ==========
+class RuleGroup:
+    """All active rules on one (symbol, expiry, field), as parallel arrays"""
+
+    def __init__(self, rules):
+        self.ids = np.array([rule['id'] for rule in rules])
+        self.users = np.array([rule['user_id'] for rule in rules])
+        self.strikes = np.array([np.nan if rule['strike'] is None else rule['strike'] for rule in rules])
+        self.conditions = np.array([CONDITIONS.index(rule['condition']) for rule in rules])
+        self.thresholds = np.array([rule['threshold'] for rule in rules], dtype=np.float64)
+        self.windows = np.array([rule['window_minutes'] if rule['condition'] in GROWTH_CONDITIONS else 0
+                                 for rule in rules])
+        self.repeat = np.array([rule['repeat'] for rule in rules])
+        self.labels = [rule['label'] for rule in rules]
+
+    def __len__(self):
+        return len(self.ids)
+
+
+# (symbol, expiry) -> {field: RuleGroup}; expiry '' holds rules for every expiry
+rule_index = {}
+index_loaded_at = 0.0
+index_dirty = True
+# rule id -> time before which a repeating rule stays quiet
+cooldowns = {}
+
+
+def invalidate():
+    global index_dirty
+    index_dirty = True
+
+
+def load_index():
+    """Rebuild the index from the database (rules changed, or periodically for other processes)"""
+    global rule_index, index_loaded_at, index_dirty
+    from .models import AlertRule
+
+    grouped = {}
+    for rule in AlertRule.objects.filter(active=True).values(
+            'id', 'user_id', 'symbol', 'expiry', 'field', 'strike', 'condition', 'threshold',
+            'window_minutes', 'repeat').iterator(chunk_size=5000):
+        strike = f" {rule['strike']:g}" if rule['strike'] is not None else ''
+        rule['label'] = f"{rule['symbol']}{strike} {rule['field'].upper()} {rule['condition'].replace('_', ' ')} {rule['threshold']:g}"
+        grouped.setdefault((rule['symbol'], rule['expiry']), {}).setdefault(rule['field'], []).append(rule)
+
+    rule_index = {chain: {field: RuleGroup(rules) for field, rules in fields.items()}
+                  for chain, fields in grouped.items()}
+    index_loaded_at = time.time()
+    index_dirty = False
+
+
+def groups_for(symbol, expiry):
+    if index_dirty or time.time() - index_loaded_at > settings.ALERTS_RELOAD_SECONDS:
+        load_index()
+    for key in ((symbol, expiry), (symbol, '')):
+        for field, group in rule_index.get(key, {}).items():
+            yield field, group
+
+
+# ========== SNAPSHOT HISTORY ==========
+# Bounded per-chain history for growth rules: at most one snapshot per
+# ALERTS_HISTORY_STEP seconds, kept for MAX_WINDOW_MINUTES
+history = {}
+last_seen = {}
+
+
+def record_history(snapshot, now):
+    entries = history.setdefault((snapshot.symbol, snapshot.expiry), deque())
+    if not entries or now - entries[-1][0] >= settings.ALERTS_HISTORY_STEP:
+        entries.append((now, snapshot))
+    while entries and now - entries[0][0] > MAX_WINDOW_MINUTES * 60 + settings.ALERTS_HISTORY_STEP:
+        entries.popleft()
+
+
+def snapshot_before(symbol, expiry, cutoff):
+    """Most recent recorded snapshot taken at or before cutoff"""
+    found = None
+    for taken_at, snapshot in history.get((symbol, expiry), ()):
+        if taken_at > cutoff:
+            break
+        found = snapshot
+    return found
+
+
+def field_values(snapshot, field, strikes):
+    """Values of a field aligned to strikes (NaN where the snapshot lacks a strike)
+
+    PCR is taken over the default ATM window rather than the fetched superset,
+    whose width depends on which windows other sessions happen to have open.
+    """
+    if snapshot is None:
+        return np.full(len(strikes), np.nan)
+    if field in CHAIN_FIELDS:
+        view = snapshot.window(settings.DEFAULT_STRIKECOUNT)
+        return np.array([view.pcr if field == 'pcr' else snapshot.spot], dtype=np.float64)
+    if len(snapshot) == 0:
+        return np.full(len(strikes), np.nan)
+    values = snapshot[field] // snapshot.lot_size if field in LOT_FIELDS else snapshot[field]
+    index = np.minimum(np.searchsorted(snapshot.strikes, strikes), len(snapshot) - 1)
+    return np.where(snapshot.strikes[index] == strikes, values[index], np.nan)
+
+
+# ========== EVALUATION ==========
+def evaluate_group(group, field, snapshot, previous, now):
+    """Indices of fired rules with the value and strike that fired them"""
+    strikes = snapshot.strikes if field not in CHAIN_FIELDS else np.array([np.nan])
+    current = field_values(snapshot, field, strikes)
+    prior = field_values(previous, field, strikes)
+
+    # Which (rule, strike) cells each rule looks at; any-strike rules watch the default window
+    if field in CHAIN_FIELDS:
+        applies = np.ones((len(group), 1), dtype=bool)
+    else:
+        in_window = np.isin(strikes, snapshot.window(settings.DEFAULT_STRIKECOUNT).strikes)
+        applies = ((np.isnan(group.strikes)[:, None] & in_window[None, :])
+                   | (group.strikes[:, None] == strikes[None, :]))
+
+    threshold = group.thresholds[:, None]
+    value = current[None, :]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        results = [
+            value > threshold,
+            value < threshold,
+            (prior[None, :] <= threshold) & (value > threshold),
+            (prior[None, :] >= threshold) & (value < threshold),
+        ]
+        # Growth rules compare against the snapshot from window_minutes ago
+        growth = np.full(applies.shape, np.nan)
+        for window in np.unique(group.windows[group.windows > 0]):
+            rows = group.windows == window
+            past = field_values(snapshot_before(snapshot.symbol, snapshot.expiry, now - window * 60), field, strikes)
+            growth[rows] = np.where(past > 0, (value[0] - past) / past * 100, np.nan)
+        results += [growth >= threshold, -growth >= threshold]
+
+    fired_cells = applies & np.choose(group.conditions[:, None], results)
+    fired = np.nonzero(fired_cells.any(axis=1))[0]
+    columns = fired_cells[fired].argmax(axis=1)
+    return [(int(rule), float(current[column]), None if field in CHAIN_FIELDS else float(strikes[column]))
+            for rule, column in zip(fired, columns)]
+
+
+def evaluate_snapshot(snapshot, now=None):
+    """Evaluate every rule on this snapshot's chain; returns the AlertEvents created"""
+    now = now or time.time()
+    key = (snapshot.symbol, snapshot.expiry)
+    previous = last_seen.get(key)
+    last_seen[key] = snapshot
+
+    fired = []
+    for field, group in groups_for(snapshot.symbol, snapshot.expiry):
+        for rule, value, strike in evaluate_group(group, field, snapshot, previous, now):
+            rule_id = int(group.ids[rule])
+            if cooldowns.get(rule_id, 0) > now:
+                continue
+            fired.append((rule_id, int(group.users[rule]), bool(group.repeat[rule]), group.labels[rule], value, strike))
+    record_history(snapshot, now)
+    return deliver(fired, now) if fired else []
+
+
+def deliver(fired, now):
+    """Claim each fired rule (so only one process reports it) and store its event"""
+    from .models import AlertEvent, AlertRule
+
+    cutoff = timezone.now() - timedelta(seconds=settings.ALERTS_COOLDOWN_SECONDS)
+    events = []
+    for rule_id, user_id, repeat, label, value, strike in fired:
+        claimed = AlertRule.objects.filter(pk=rule_id, active=True).filter(
+            Q(last_triggered_at__isnull=True) | Q(last_triggered_at__lt=cutoff)
+        ).update(last_triggered_at=timezone.now(), active=repeat)
+        if repeat:
+            cooldowns[rule_id] = now + settings.ALERTS_COOLDOWN_SECONDS
+        else:
+            invalidate()
+        if claimed:
+            events.append(AlertEvent(rule_id=rule_id, user_id=user_id, value=value, strike=strike,
+                                     message=f"{label} (now {value:g})"))
+            pending_users.add(user_id)
+    return AlertEvent.objects.bulk_create(events)
+
+
+# ========== BACKGROUND WORKER ==========
+# Latest unevaluated snapshot per chain; a slow evaluation skips stale versions
+pending = {}
+pending_lock = threading.Condition()
+worker_thread = None
+
+
+def submit(snapshot):
+    """Snapshot listener: queue the chain for evaluation and return immediately"""
+    with pending_lock:
+        pending[(snapshot.symbol, snapshot.expiry)] = snapshot
+        pending_lock.notify()
+    ensure_worker()
+
+
+def run_worker():
+    while True:
+        with pending_lock:
+            while not pending:
+                pending_lock.wait()
+            key = next(iter(pending))
+            snapshot = pending.pop(key)
+        try:
+            evaluate_snapshot(snapshot)
+        except Exception as e:
+            print(f"Alert evaluation error for {key}: {e}")
+
+
+def ensure_worker():
+    global worker_thread
+    with pending_lock:
+        if worker_thread is None:
+            worker_thread = threading.Thread(target=run_worker, name='alert-worker', daemon=True)
+            worker_thread.start()
+
+
+# ========== DELIVERY ==========
+# Users with events fired in this process, and when each user was last
+# checked in the database (events fired by other processes)
+pending_users = set()
+last_checked = {}
+
+
+def pop_events(user_id):
+    """Undelivered events for a user, marked delivered; cheap when there are none"""
+    from .models import AlertEvent
+
+    now = time.time()
+    if user_id not in pending_users and now - last_checked.get(user_id, 0) < settings.ALERTS_DELIVERY_INTERVAL:
+        return []
+    pending_users.discard(user_id)
+    last_checked[user_id] = now
+
+    events = list(AlertEvent.objects.filter(user_id=user_id, delivered=False).order_by('created_at')[:20])
+    if not events:
+        return []
+    AlertEvent.objects.filter(pk__in=[event.pk for event in events]).update(delivered=True)
+    return [{'id': event.pk, 'message': event.message, 'value': event.value, 'strike': event.strike,
+             'created_at': event.created_at.isoformat()} for event in events]
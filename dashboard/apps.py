@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class DashboardConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "dashboard"
+
+    def ready(self):
+        from . import alerts, buildup, intraday, market_hours, recorder
+        from .data import add_snapshot_listener
+        add_snapshot_listener(alerts.submit)
+        add_snapshot_listener(market_hours.observe_snapshot)
+        add_snapshot_listener(recorder.record_snapshot)
+        add_snapshot_listener(intraday.record_snapshot)
+        add_snapshot_listener(buildup.observe_snapshot)
@@ -0,0 +1,155 @@
+# ========== ROLLING OI BUILDUP ==========
+# CALL_OICH/PUT_OICH are the day-level change reported upstream. For shorter
+# windows each chain keeps a ring of per-strike (OI, LTP) samples for both
+# legs, one slot per BUILDUP_STEP_SECONDS, just long enough for the largest
+# window. A window's change is the live value minus a single ring slot, so
+# each snapshot costs O(strikes) whatever the session length, and memory is
+# capped by slot count x strike count x chain count.
+import threading
+from datetime import datetime
+
+import numpy as np
+from django.conf import settings
+
+from .expiry_calendar import IST
+
+# Ring rows per slot: one per (leg, field)
+SAMPLE_FIELDS = ('call_oi', 'call_ltp', 'put_oi', 'put_ltp')
+LEGS = ('call', 'put')
+LONG_BUILDUP = 'Long Buildup'
+SHORT_BUILDUP = 'Short Buildup'
+SHORT_COVERING = 'Short Covering'
+LONG_UNWINDING = 'Long Unwinding'
+
+
+def windows():
+    """Rolling windows in minutes, e.g. (5, 15, 60)"""
+    return tuple(int(minutes) for minutes in settings.BUILDUP_WINDOWS.split(',') if minutes.strip())
+
+
+class StrikeHistory:
+    """Per-strike sample ring for one (symbol, expiry)"""
+
+    def __init__(self, slots):
+        self.slots = slots
+        self.columns = {}  # strike -> column in the ring
+        self.samples = np.full((slots, len(SAMPLE_FIELDS), 16), np.nan)
+        self.slot = None   # absolute slot number (time // step) of the newest sample
+        self.filled = 0
+        self.day = None
+        self.updated_at = 0.0
+
+    def column_indices(self, strikes):
+        """Ring columns for strikes, adding new ones up to BUILDUP_MAX_STRIKES (-1 when full)"""
+        indices = []
+        for strike in strikes.tolist():
+            column = self.columns.get(strike)
+            if column is None and len(self.columns) < settings.BUILDUP_MAX_STRIKES:
+                column = self.columns[strike] = len(self.columns)
+                if column >= self.samples.shape[2]:
+                    grown = np.full(self.samples.shape[:2] + (self.samples.shape[2] * 2,), np.nan)
+                    grown[:, :, :self.samples.shape[2]] = self.samples
+                    self.samples = grown
+            indices.append(-1 if column is None else column)
+        return np.array(indices, dtype=int)
+
+    def observe(self, snapshot, step):
+        day = datetime.fromtimestamp(snapshot.fetched_at, IST).date()
+        if day != self.day:
+            # Strikes come back on demand, so yesterday's strikes near the old ATM don't hold slots
+            self.columns = {}
+            self.samples = np.full((self.slots, len(SAMPLE_FIELDS), 16), np.nan)
+            self.slot = None
+            self.filled = 0
+            self.day = day
+
+        slot = int(snapshot.fetched_at // step)
+        if self.slot is not None and slot < self.slot:
+            return  # an older version arriving late
+        if self.slot is None:
+            self.filled = 1
+        elif slot > self.slot:
+            # Slots with no snapshot carry the last known values forward
+            gap = min(slot - self.slot, self.slots)
+            skipped = (self.slot + np.arange(1, gap)) % self.slots
+            self.samples[skipped] = self.samples[self.slot % self.slots]
+            self.samples[slot % self.slots] = self.samples[self.slot % self.slots]
+            self.filled = min(self.filled + gap, self.slots)
+        self.slot = slot
+
+        indices = self.column_indices(snapshot.strikes)
+        known = indices >= 0
+        values = np.stack([snapshot[name] for name in SAMPLE_FIELDS])
+        self.samples[slot % self.slots][:, indices[known]] = values[:, known]
+        self.updated_at = snapshot.fetched_at
+
+    def baseline(self, strikes, minutes, step):
+        """(field, strike) samples from minutes ago, NaN where there is no history yet"""
+        back = int(round(minutes * 60 / step))
+        if self.slot is None or back >= self.filled:
+            return np.full((len(SAMPLE_FIELDS), len(strikes)), np.nan)
+        indices = np.array([self.columns.get(strike, -1) for strike in strikes.tolist()], dtype=int)
+        past = self.samples[(self.slot - back) % self.slots][:, np.maximum(indices, 0)]
+        past[:, indices < 0] = np.nan
+        return past
+
+
+# (symbol, expiry) -> StrikeHistory
+histories = {}
+history_lock = threading.Lock()
+
+
+def observe_snapshot(snapshot):
+    """Snapshot listener: record this version's per-strike OI and LTP"""
+    if len(snapshot) == 0:
+        return
+    step = settings.BUILDUP_STEP_SECONDS
+    key = (snapshot.symbol, snapshot.expiry)
+    with history_lock:
+        history = histories.get(key)
+        if history is None:
+            # Chains nobody watches any more make room for new ones
+            while len(histories) >= settings.BUILDUP_MAX_CHAINS:
+                del histories[min(histories, key=lambda chain: histories[chain].updated_at)]
+            slots = int(max(windows(), default=0) * 60 // step) + 1
+            history = histories[key] = StrikeHistory(slots)
+        history.observe(snapshot, step)
+
+
+def classify(oi_change, price_change):
+    """Buildup label per strike from the sign of OI and price changes ('' when flat or unknown)"""
+    return np.select(
+        [(oi_change > 0) & (price_change > 0), (oi_change > 0) & (price_change < 0),
+         (oi_change < 0) & (price_change > 0), (oi_change < 0) & (price_change < 0)],
+        [LONG_BUILDUP, SHORT_BUILDUP, SHORT_COVERING, LONG_UNWINDING],
+        default='',
+    )
+
+
+def add_columns(snapshot, rows):
+    """Add CALL/PUT_OICH_<n>M (lots) and CALL/PUT_BUILDUP_<n>M to a snapshot's table rows"""
+    step = settings.BUILDUP_STEP_SECONDS
+    with history_lock:
+        history = histories.get((snapshot.symbol, snapshot.expiry))
+        baselines = {minutes: history.baseline(snapshot.strikes, minutes, step) if history else None
+                     for minutes in windows()}
+
+    for minutes, past in baselines.items():
+        for leg in LEGS:
+            oi_column = f"{leg.upper()}_OICH_{minutes}M"
+            buildup_column = f"{leg.upper()}_BUILDUP_{minutes}M"
+            if past is None:
+                for row in rows:
+                    row[oi_column] = None
+                    row[buildup_column] = ''
+                continue
+            oi_change = snapshot[f"{leg}_oi"] - past[SAMPLE_FIELDS.index(f"{leg}_oi")]
+            price_change = snapshot[f"{leg}_ltp"] - past[SAMPLE_FIELDS.index(f"{leg}_ltp")]
+            lots = oi_change // snapshot.lot_size
+            # Strikes without history for this window report None
+            changes = np.where(np.isnan(lots), None, np.nan_to_num(lots).astype(np.int64)).tolist()
+            labels = classify(oi_change, price_change).tolist()
+            for row, change, label in zip(rows, changes, labels):
+                row[oi_column] = change
+                row[buildup_column] = label
+    return rows
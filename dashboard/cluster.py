@@ -0,0 +1,250 @@
+# ========== MULTI-NODE UPSTREAM POLLING ==========
+# With CLUSTER_MODE=cluster every app instance competes for one lease. The
+# holder (leader) is the only node that polls Fyers; it publishes each chain
+# through the broker and every node serves those snapshots. When the leader
+# stops renewing, the lease lapses and the next node to try takes over.
+# Each node reports its viewer count along with its demand, so the refresh
+# cadence follows everyone watching a chain rather than one node's viewers.
+import json
+import os
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import market_hours
+
+NODE_ID = f"{socket.gethostname()}:{os.getpid()}"
+LEASE_NAME = 'upstream-poller'
+
+
+def is_enabled():
+    return getattr(settings, 'CLUSTER_MODE', 'single') == 'cluster'
+
+
+# ========== SNAPSHOT SERIALIZATION ==========
+def serialize_chain(snapshot):
+    # Strike windows are derived data; followers slice them on demand
+    return json.dumps(snapshot.to_dict())
+
+
+def deserialize_chain(payload):
+    from .snapshot import ChainSnapshot
+    return ChainSnapshot.from_dict(json.loads(payload))
+
+
+# ========== BROKERS ==========
+class DatabaseBroker:
+    """Lease and snapshots stored in the shared database (works across hosts)"""
+
+    def try_acquire_lease(self, node_id, lease_seconds):
+        from .models import PollerLease
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=lease_seconds)
+        try:
+            PollerLease.objects.get_or_create(name=LEASE_NAME, defaults={'holder': node_id, 'expires_at': expires_at})
+        except IntegrityError:
+            pass
+        # Conditional update is atomic: only the holder or a taker of a lapsed lease wins
+        updated = PollerLease.objects.filter(name=LEASE_NAME).filter(
+            Q(holder=node_id) | Q(expires_at__lt=now)
+        ).update(holder=node_id, expires_at=expires_at)
+        return updated == 1
+
+    def request_chain(self, symbol, expiry, strikecount, viewers):
+        """Register demand and this node's viewer count; returns (version, payload, cluster viewers)"""
+        from .models import SharedSnapshot
+        now = timezone.now()
+        snapshot, created = SharedSnapshot.objects.get_or_create(
+            symbol=symbol, expiry=expiry,
+            defaults={'strikecount': strikecount, 'requested_at': now, 'viewers': viewers, 'viewers_since': now}
+        )
+        if created:
+            return snapshot.version, snapshot.payload, viewers
+        SharedSnapshot.objects.filter(pk=snapshot.pk).update(requested_at=now)
+        if strikecount > snapshot.strikecount:
+            SharedSnapshot.objects.filter(pk=snapshot.pk).update(strikecount=strikecount)
+        # The row keeps the largest count any node reported in the current
+        # viewer window; the first report after the window lapses starts a new one
+        window_start = now - timedelta(seconds=market_hours.viewer_ttl())
+        if snapshot.viewers_since is None or snapshot.viewers_since < window_start:
+            SharedSnapshot.objects.filter(pk=snapshot.pk).filter(
+                Q(viewers_since__isnull=True) | Q(viewers_since__lt=window_start)
+            ).update(viewers=viewers, viewers_since=now)
+            return snapshot.version, snapshot.payload, viewers
+        if viewers > snapshot.viewers:
+            SharedSnapshot.objects.filter(pk=snapshot.pk, viewers__lt=viewers).update(viewers=viewers)
+        return snapshot.version, snapshot.payload, max(viewers, snapshot.viewers)
+
+    def demanded_chains(self, max_age):
+        """(symbol, expiry, strikecount, cluster viewers) for chains requested within max_age"""
+        from .models import SharedSnapshot
+        now = timezone.now()
+        window_start = now - timedelta(seconds=market_hours.viewer_ttl())
+        rows = SharedSnapshot.objects.filter(requested_at__gte=now - timedelta(seconds=max_age)).values_list(
+            'symbol', 'expiry', 'strikecount', 'viewers', 'viewers_since')
+        return [(symbol, expiry, strikecount, viewers if since and since >= window_start else 0)
+                for symbol, expiry, strikecount, viewers, since in rows]
+
+    def publish(self, symbol, expiry, strikecount, payload):
+        from .models import SharedSnapshot
+        SharedSnapshot.objects.filter(symbol=symbol, expiry=expiry).update(
+            payload=payload, version=F('version') + 1, published_at=timezone.now()
+        )
+
+
+class LocalBroker:
+    """In-process stand-in for DatabaseBroker (single process, development, tests)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.lease = None
+        self.snapshots = {}
+
+    def try_acquire_lease(self, node_id, lease_seconds):
+        with self.lock:
+            now = time.time()
+            if self.lease is None or self.lease[0] == node_id or self.lease[1] < now:
+                self.lease = (node_id, now + lease_seconds)
+                return True
+            return False
+
+    def request_chain(self, symbol, expiry, strikecount, viewers):
+        with self.lock:
+            now = time.time()
+            entry = self.snapshots.setdefault((symbol, expiry), {'strikecount': strikecount, 'payload': '', 'version': 0,
+                                                                 'viewers': 0, 'viewers_since': 0.0})
+            entry['strikecount'] = max(entry['strikecount'], strikecount)
+            entry['requested_at'] = now
+            if now - entry['viewers_since'] > market_hours.viewer_ttl():
+                entry['viewers'], entry['viewers_since'] = viewers, now
+            else:
+                entry['viewers'] = max(entry['viewers'], viewers)
+            return entry['version'], entry['payload'], entry['viewers']
+
+    def demanded_chains(self, max_age):
+        with self.lock:
+            now = time.time()
+            return [(symbol, expiry, entry['strikecount'],
+                     entry['viewers'] if now - entry['viewers_since'] <= market_hours.viewer_ttl() else 0)
+                    for (symbol, expiry), entry in self.snapshots.items() if now - entry['requested_at'] <= max_age]
+
+    def publish(self, symbol, expiry, strikecount, payload):
+        with self.lock:
+            entry = self.snapshots.get((symbol, expiry))
+            if entry is not None:
+                entry['payload'] = payload
+                entry['version'] += 1
+
+
+BROKERS = {
+    'database': DatabaseBroker,
+    'local': LocalBroker,
+}
+
+broker = None
+
+
+def get_broker():
+    global broker
+    if broker is None:
+        broker = BROKERS[getattr(settings, 'CLUSTER_BROKER', 'database')]()
+    return broker
+
+
+# ========== FOLLOWER SIDE ==========
+# Deserialized chains keyed by (symbol, expiry) -> (version, chain), so each
+# published version is parsed once per node
+replicated_chains = {}
+
+
+def get_replicated_chain(symbol, expiry, strikecount):
+    """Register demand for a chain and return the leader's latest snapshot of it"""
+    ensure_poller()
+    version, payload, viewers = get_broker().request_chain(
+        symbol, expiry, strikecount, market_hours.local_viewers(symbol, expiry))
+    # Cadence follows everyone watching the chain, not just this node's viewers
+    market_hours.note_shared_viewers(symbol, expiry, viewers)
+    if not payload:
+        return None
+    cached = replicated_chains.get((symbol, expiry))
+    if cached and cached[0] == version:
+        return cached[1]
+    chain = deserialize_chain(payload)
+    replicated_chains[(symbol, expiry)] = (version, chain)
+    return chain
+
+
+# ========== LEADER SIDE ==========
+poller_thread = None
+poller_lock = threading.Lock()
+is_leader = False
+# (symbol, expiry) -> when the leader last fetched it
+last_fetched = {}
+
+
+def poll_once():
+    """Renew or take the lease and, when leading, refresh every demanded chain"""
+    global is_leader
+    from . import recorder
+    from .data import load_chain
+
+    active_broker = get_broker()
+    is_leader = active_broker.try_acquire_lease(NODE_ID, settings.CLUSTER_LEASE_SECONDS)
+    if not is_leader:
+        return 0
+
+    published = 0
+    for symbol, expiry, strikecount, viewers in active_broker.demanded_chains(settings.CLUSTER_DEMAND_TTL):
+        # Same cadence rules as single mode: adaptive in session, frozen after the close
+        market_hours.note_shared_viewers(symbol, expiry, viewers)
+        fetched_at = last_fetched.get((symbol, expiry), 0)
+        if market_hours.is_open():
+            if time.time() - fetched_at < market_hours.cache_ttl(symbol, expiry):
+                continue
+        elif not market_hours.needs_refresh(fetched_at):
+            continue
+        # Throttled fetches can outlast the lease: renew before each one and stop
+        # as soon as another node has taken over
+        if not active_broker.try_acquire_lease(NODE_ID, settings.CLUSTER_LEASE_SECONDS):
+            is_leader = False
+            break
+        try:
+            chain = load_chain(symbol, expiry, strikecount)
+        except Exception as e:
+            print(f"Leader fetch failed for {symbol} {expiry}: {e}")
+            continue
+        if chain is not None:
+            last_fetched[(symbol, expiry)] = time.time()
+            active_broker.publish(symbol, expiry, strikecount, serialize_chain(chain))
+            recorder.submit(chain)
+            published += 1
+    return published
+
+
+def run_poller():
+    was_leader = False
+    while True:
+        started = time.time()
+        try:
+            poll_once()
+        except Exception as e:
+            print(f"Cluster poller error: {e}")
+        if is_leader != was_leader:
+            print(f"Cluster node {NODE_ID} is now {'leader' if is_leader else 'follower'}")
+            was_leader = is_leader
+        time.sleep(max(0.1, settings.CLUSTER_POLL_INTERVAL - (time.time() - started)))
+
+
+def ensure_poller():
+    """Start this node's lease/poll loop the first time cluster data is requested"""
+    global poller_thread
+    with poller_lock:
+        if poller_thread is None:
+            poller_thread = threading.Thread(target=run_poller, name='cluster-poller', daemon=True)
+            poller_thread.start()
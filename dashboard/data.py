@@ -9,6 +9,15 @@ import time
 from py_vollib.black_scholes.implied_volatility import implied_volatility as iv
 from py_vollib.black_scholes.greeks.analytical import delta, gamma, theta, vega
 from .fyers_auth import login_fyers
+from . import buildup
+from . import cluster
+from . import expiry_calendar
+from . import market_hours
+from . import prefetch
+from . import streaming
+from . import throttle
+from .pricing import TABLE_SCALE
+from .snapshot import ChainSnapshot
 
 
 # Use absolute path for file operations
@@ -20,19 +29,33 @@ data_cache = {}
 
 
 
-def get_lot_size(symbol):
+# ========== SYMBOL METADATA ==========
+# symbol.json parsed once and re-read only when the admin editor rewrites it
+symbol_metadata = {'mtime': None, 'data': {'expiry_dates': {}, 'lot_sizes': {}}}
+
+def get_symbol_metadata():
     try:
         symbol_file = os.path.join(BASE_DIR, 'dashboard', 'static', 'symbol.json')
-        with open(symbol_file, 'r') as f:
-            data = json.load(f)
-        return data.get('lot_sizes', {}).get(symbol, 1)
+        mtime = os.path.getmtime(symbol_file)
+        if mtime != symbol_metadata['mtime']:
+            with open(symbol_file, 'r') as f:
+                symbol_metadata['data'] = json.load(f)
+            symbol_metadata['mtime'] = mtime
+    except Exception as e:
+        print(f"Error loading symbol.json: {e}")
+    return symbol_metadata['data']
+
+def get_lot_size(symbol):
+    try:
+        return get_symbol_metadata().get('lot_sizes', {}).get(symbol, 1)
     except:
         return 1
 
 # ========== CURRENT SELECTION STATE ==========
 current_symbol = 'NSE:NIFTY50-INDEX'
-current_expiry = '30-10-2025'
+current_expiry = None  # resolved to the nearest listed expiry on first use
 current_strikecount = 10
+MAX_STRIKECOUNT = 50  # Fyers optionchain accepts at most 50 strikes either side of ATM
 
 def update_symbol_expiry(symbol, expiry):
     global current_symbol, current_expiry
@@ -45,6 +68,16 @@ def update_strikecount(strikecount):
     current_strikecount = strikecount
     return current_strikecount
 
+def parse_strikecount(value, default=10):
+    """Strike count from a request parameter, clamped to 1..MAX_STRIKECOUNT; ValueError if not a number"""
+    if value in (None, ''):
+        return default
+    try:
+        strikecount = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('strikecount must be a whole number')
+    return min(max(strikecount, 1), MAX_STRIKECOUNT)
+
 # ========== DATE/TIME UTILITIES ==========
 def get_expiry_timestamp_ist(date_str: str, time_str: str = "15:30") -> int:
     dt_naive = datetime.strptime(f"{date_str} {time_str}", "%d-%m-%Y %H:%M")
@@ -80,10 +113,11 @@ def calculate_greeks(spot_price, strike_price, days_to_expiry, option_type, ltp)
         except:
             sigma = 0.15
         
+        # py_vollib's units rescaled to the table's (pricing.GREEK_UNITS)
         delta_val = delta(flag, S, K, T, r, sigma)
-        gamma_val = gamma(flag, S, K, T, r, sigma) * 100
-        theta_val = theta(flag, S, K, T, r, sigma) / 365
-        vega_val = vega(flag, S, K, T, r, sigma) / 100
+        gamma_val = gamma(flag, S, K, T, r, sigma) * TABLE_SCALE['gamma']
+        theta_val = theta(flag, S, K, T, r, sigma) * TABLE_SCALE['theta']
+        vega_val = vega(flag, S, K, T, r, sigma) * TABLE_SCALE['vega']
         
         return {
             'delta': round(delta_val, 2),
@@ -132,6 +166,7 @@ def get_symbol_quote(symbol):
             fyers = login_fyers()
         
         if fyers:
+            throttle.acquire()
             quote_response = fyers.quotes({"symbols": symbol})
             if quote_response and quote_response.get('code') == 200:
                 quote_data = quote_response.get('d', [{}])[0]
@@ -164,130 +199,215 @@ def get_symbol_quote(symbol):
         print(f"Error getting quote: {e}")
         return {'ltp': 0, 'prev_close': 0, 'change_points': 0, 'change_percent': 0}
 
+# ========== STRIKE WINDOWS ==========
+# Strike counts requested per (symbol, expiry) recently. One upstream fetch at
+# the largest active window serves every smaller window by slicing around ATM.
+active_strike_windows = {}
+STRIKE_WINDOW_TTL = 30
+
+def register_strike_window(symbol, expiry, strikecount):
+    now = time.time()
+    windows = active_strike_windows.setdefault((symbol, expiry), {})
+    windows[strikecount] = now
+    for count, seen in list(windows.items()):
+        if now - seen > STRIKE_WINDOW_TTL:
+            del windows[count]
+    return max(windows)
+
+# ========== UPSTREAM FETCH ==========
+def fetch_chain(symbol, expiry, strikecount):
+    """Fetch one option chain from Fyers and compute its Greeks. Returns a ChainSnapshot or None"""
+    global fyers
+    
+    if not fyers:
+        fyers = login_fyers()
+    if not fyers:
+        return None
+    
+    data = {
+        "symbol": symbol,
+        "strikecount": strikecount,
+        "timestamp": get_expiry_timestamp_ist(expiry)
+    }
+    
+    throttle.acquire()
+    response = fyers.optionchain(data=data)
+    print(f"🔍 API Response Code: {response.get('code') if response else 'None'}")
+    
+    if not (response and response.get('code') == 200 and response.get('data', {}).get('optionsChain')):
+        return None
+    
+    print(f"✅ Got real option chain data for {symbol} ({strikecount} strikes)")
+    
+    # Every chain response carries the symbol's full expiry list
+    expiry_data = response['data'].get('expiryData') or []
+    expiry_calendar.learn_expiries(symbol, expiry_data)
+    
+    # Extract real LTP from option_data
+    option_data = response['data']['optionsChain']
+    index_data = option_data[0] if option_data else {}
+    quote_data = {
+        'ltp': index_data.get('ltp', 0),
+        'prev_close': index_data.get('ltp', 0) - index_data.get('ltpch', 0),
+        'change_points': round(index_data.get('ltpch', 0), 2),
+        'change_percent': round(index_data.get('ltpchp', 0), 2)
+    }
+    
+    spot_price = quote_data.get('ltp', 0)
+    days_to_expiry = calculate_days_to_expiry(expiry)
+    
+    # Greeks are computed once for the whole superset
+    snapshot = ChainSnapshot.from_option_chain(
+        symbol, expiry, option_data, quote_data,
+        lambda strike, option_type, ltp: calculate_greeks(spot_price, strike, days_to_expiry, option_type, ltp),
+        lot_size=get_lot_size(symbol),
+        strikecount=strikecount,
+        expiries=[item.get('date') for item in expiry_data]
+    )
+    return snapshot if len(snapshot) else None
+
+def load_chain(symbol, expiry, strikecount):
+    """Current chain from the tick stream when streaming is on, else a fresh REST fetch"""
+    if streaming.is_enabled():
+        return streaming.get_chain(symbol, expiry, strikecount)
+    return fetch_chain(symbol, expiry, strikecount)
+
+def fetch_expiry_data(symbol):
+    """Fetch a symbol's expiry list with the smallest possible chain request"""
+    global fyers
+    
+    # Followers never call upstream; they learn expiries from published snapshots
+    if cluster.is_enabled() and not cluster.is_leader:
+        return None
+    if not fyers:
+        fyers = login_fyers()
+    if not fyers:
+        return None
+    
+    throttle.acquire()
+    response = fyers.optionchain(data={"symbol": symbol, "strikecount": 1, "timestamp": ""})
+    if response and response.get('code') == 200:
+        return response.get('data', {}).get('expiryData')
+    return None
+
+# ========== SNAPSHOT LISTENERS ==========
+# Called with each new snapshot version this process sees (alerts, history).
+# Listeners must return quickly; slow work belongs on their own thread.
+snapshot_listeners = []
+
+def add_snapshot_listener(listener):
+    if listener not in snapshot_listeners:
+        snapshot_listeners.append(listener)
+
+def notify_snapshot(snapshot):
+    for listener in snapshot_listeners:
+        try:
+            listener(snapshot)
+        except Exception as e:
+            print(f"Snapshot listener error: {e}")
+
 # ========== MAIN DATA FUNCTION ==========
-def getLiveData(symbol=None, expiry=None, strikecount=None):
-    global data_cache, fyers
+def notify_once(entry):
+    """Hand a cached snapshot to the listeners the first time a viewer is served it"""
+    if entry.pop('pending', False):  # pop is atomic, so concurrent requests notify once
+        notify_snapshot(entry['snapshot'])
+
+def getLiveSnapshot(symbol=None, expiry=None, strikecount=None, notify=True):
+    """Current ChainSnapshot window for a selection, or None when no real data is available
+
+    Background loads (the scanner) pass notify=False: they fill the cache without
+    feeding snapshot listeners, which then see the version once someone views it.
+    """
+    global data_cache
     
+    use_symbol = symbol or current_symbol
+    use_expiry = expiry or current_expiry or expiry_calendar.nearest_expiry(use_symbol)
+    use_strikecount = strikecount or current_strikecount
+    
+    # Dead or unlisted expiries never reach upstream
+    expiry_error = expiry_calendar.validate_expiry(use_symbol, use_expiry)
+    if expiry_error:
+        print(f"Rejected expiry: {expiry_error}")
+        return None
+    
+    # One snapshot per (symbol, expiry), fetched at the largest active window
+    cache_key = f"{use_symbol}_{use_expiry}"
+    fetch_strikecount = register_strike_window(use_symbol, use_expiry, use_strikecount)
+    current_time = time.time()
+    
+    # Cached chains live for the chain's adaptive refresh interval; after the
+    # close the first post-close snapshot is kept until the next session
+    cached = data_cache.get(cache_key)
+    if cached and cached['snapshot'].strikecount >= use_strikecount and market_hours.cache_is_fresh(cached['snapshot'], cached['timestamp']):
+        if notify:
+            notify_once(cached)
+        return cached['snapshot'].window(use_strikecount)
+    
+    # In cluster mode only the elected leader talks to Fyers; every node
+    # (leader included) serves the snapshots it publishes
+    if cluster.is_enabled():
+        snapshot = cluster.get_replicated_chain(use_symbol, use_expiry, fetch_strikecount)
+        if snapshot is None or snapshot.strikecount < use_strikecount:
+            return None
+        if not cached or cached['snapshot'] is not snapshot:
+            expiry_calendar.learn_expiries(use_symbol, [{'date': date} for date in snapshot.expiries])
+            cached = {'snapshot': snapshot, 'pending': True}
+        cached['timestamp'] = current_time
+        data_cache[cache_key] = cached
+        if notify:
+            notify_once(cached)
+        return snapshot.window(use_strikecount)
+    
+    # A chain warmed in anticipation of this switch saves the cold fetch
+    snapshot = prefetch.claim(use_symbol, use_expiry, use_strikecount,
+                              newer_than=cached['snapshot'].fetched_at if cached else 0)
+    # A warm chain was fetched a while ago; it is cached only for what is left of its TTL
+    cached_at = snapshot.fetched_at if snapshot is not None else current_time
+    if snapshot is None:
+        snapshot = load_chain(use_symbol, use_expiry, fetch_strikecount)
+    if snapshot is None:
+        return None
+    if not cached or cached['snapshot'].version != snapshot.version:
+        cached = {'snapshot': snapshot, 'pending': True}
+    cached['timestamp'] = cached_at
+    data_cache[cache_key] = cached
+    if notify:
+        notify_once(cached)
+    return snapshot.window(use_strikecount)
+
+def next_poll_delay(symbol, expiry):
+    """When a viewer of this chain should poll again: when its cached copy expires"""
+    cached = data_cache.get(f"{symbol}_{expiry}")
+    return market_hours.poll_delay(symbol, expiry, time.time() - cached['timestamp'] if cached else None)
+
+def getLiveData(symbol=None, expiry=None, strikecount=None):
+    use_symbol = symbol or current_symbol
     try:
-        use_symbol = symbol or current_symbol
-        use_expiry = expiry or current_expiry
-        use_strikecount = strikecount or current_strikecount
-        
-        cache_key = f"{use_symbol}_{use_expiry}_{use_strikecount}"
-        current_time = time.time()
+        use_expiry = expiry or current_expiry or expiry_calendar.nearest_expiry(use_symbol)
+        if expiry_calendar.validate_expiry(use_symbol, use_expiry):
+            return None
         
-        if cache_key in data_cache and (current_time - data_cache[cache_key]['timestamp']) < 2:
-            return data_cache[cache_key]['data'], data_cache[cache_key]['quote_data'], data_cache[cache_key].get('pcr', 0)
-        
-        if not fyers:
-            fyers = login_fyers()
+        snapshot = getLiveSnapshot(use_symbol, use_expiry, strikecount)
+        if snapshot is not None:
+            # Rolling 5/15/60 minute OI change and buildup per strike ride along as extra columns
+            return buildup.add_columns(snapshot, snapshot.to_rows()), snapshot.quote_data, snapshot.pcr
         
-        if fyers:
-            data = {
-                "symbol": use_symbol,
-                "strikecount": use_strikecount,
-                "timestamp": get_expiry_timestamp_ist(use_expiry)
-            }
-            
-            response = fyers.optionchain(data=data)
-            print(f"🔍 API Response Code: {response.get('code') if response else 'None'}")
-            print(f"🔍 API Response: {response}")
-            
-            if response and response.get('code') == 200 and response.get('data', {}).get('optionsChain'):
-                print(f"✅ Got real option chain data for {use_symbol}")
-                
-                # Extract real LTP from option_data
-                option_data = response['data']['optionsChain']
-                index_data = option_data[0] if option_data else {}
-                quote_data = {
-                    'ltp': index_data.get('ltp', 0),
-                    'prev_close': index_data.get('ltp', 0) - index_data.get('ltpch', 0),
-                    'change_points': round(index_data.get('ltpch', 0), 2),
-                    'change_percent': round(index_data.get('ltpchp', 0), 2)
-                }
-                calls = [item for item in option_data if item['option_type'] == 'CE']
-                puts = [item for item in option_data if item['option_type'] == 'PE']
-                
-                if calls and puts:
-                    max_call_volume = max(item['volume'] for item in calls) or 1
-                    max_call_oi = max(item['oi'] for item in calls) or 1
-                    max_put_volume = max(item['volume'] for item in puts) or 1
-                    max_put_oi = max(item['oi'] for item in puts) or 1
-                    
-                    spot_price = quote_data.get('ltp', 0)
-                    days_to_expiry = calculate_days_to_expiry(use_expiry)
-                    
-                    combined_data = []
-                    for i in range(min(len(calls), len(puts))):
-                        call = calls[i]
-                        put = puts[i]
-                        lot_size = get_lot_size(use_symbol)
-                        strike_price = call.get('strike_price', 0)
-                        
-                        call_greeks = calculate_greeks(spot_price, strike_price, days_to_expiry, 'CE', call.get('ltp', 0))
-                        put_greeks = calculate_greeks(spot_price, strike_price, days_to_expiry, 'PE', put.get('ltp', 0))
-                        
-                        row = {
-                            'CALL_OICH': call.get('oich', 0) // lot_size,
-                            'CALL_OI': call.get('oi', 0) // lot_size,
-                            'CALL_PMCOI': round((call.get('oi', 0) / max_call_oi) * 100, 2),
-                            'CALL_VOLUME': call.get('volume', 0) // lot_size,
-                            'CALL_PMCV': round((call.get('volume', 0) / max_call_volume) * 100, 2),
-                            'CALL_LTPCH': call.get('ltpch', 0),
-                            'CALL_LTP': call.get('ltp', 0),
-                            'CALL_IV': call_greeks['iv'],
-                            'CALL_DELTA': call_greeks['delta'],
-                            'CALL_GAMMA': call_greeks['gamma'],
-                            'CALL_THETA': call_greeks['theta'],
-                            'CALL_VEGA': call_greeks['vega'],
-                            'STRIKE_PRICE': strike_price,
-                            'PUT_LTP': put.get('ltp', 0),
-                            'PUT_LTPCH': put.get('ltpch', 0),
-                            'PUT_IV': put_greeks['iv'],
-                            'PUT_DELTA': put_greeks['delta'],
-                            'PUT_GAMMA': put_greeks['gamma'],
-                            'PUT_THETA': put_greeks['theta'],
-                            'PUT_VEGA': put_greeks['vega'],
-                            'PUT_PMPV': round((put.get('volume', 0) / max_put_volume) * 100, 2),
-                            'PUT_VOLUME': put.get('volume', 0) // lot_size,
-                            'PUT_PMPOI': round((put.get('oi', 0) / max_put_oi) * 100, 2),
-                            'PUT_OI': put.get('oi', 0) // lot_size,
-                            'PUT_OICH': put.get('oich', 0) // lot_size
-                        }
-                        combined_data.append(row)
-                    
-                    total_put_oi = sum(put.get('oi', 0) for put in puts)
-                    total_call_oi = sum(call.get('oi', 0) for call in calls)
-                    pcr = round(total_put_oi / total_call_oi, 2) if total_call_oi > 0 else 0
-                    
-                    data_cache[cache_key] = {
-                        'data': combined_data,
-                        'quote_data': quote_data,
-                        'pcr': pcr,
-                        'timestamp': current_time
-                    }
-                    
-                    return combined_data, quote_data, pcr
+        if cluster.is_enabled():
+            return None
         
         print(f"⚠️ Using mock data for {use_symbol}")
         quote_data = get_symbol_quote(use_symbol)
         mock_df, base_price = get_mock_data(use_symbol)
+        mock_rows = mock_df.to_dict('records')
         
-        total_put_oi = sum(row['PUT_OI'] for row in mock_df.to_dict('records'))
-        total_call_oi = sum(row['CALL_OI'] for row in mock_df.to_dict('records'))
+        total_put_oi = sum(row['PUT_OI'] for row in mock_rows)
+        total_call_oi = sum(row['CALL_OI'] for row in mock_rows)
         pcr = round(total_put_oi / total_call_oi, 2) if total_call_oi > 0 else 0
         
-        data_cache[cache_key] = {
-            'data': mock_df.to_dict('records'),
-            'quote_data': quote_data,
-            'pcr': pcr,
-            'timestamp': current_time
-        }
-        
-        return mock_df.to_dict('records'), quote_data, pcr
+        return mock_rows, quote_data, pcr
         
     except Exception as e:
         print(f"Error in getLiveData: {e}")
-        mock_df, _ = get_mock_data(use_symbol or current_symbol)
+        mock_df, _ = get_mock_data(use_symbol)
         quote_data = {'ltp': 0, 'prev_close': 0, 'change_points': 0, 'change_percent': 0}
         return mock_df.to_dict('records'), quote_data, 0
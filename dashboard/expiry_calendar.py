@@ -0,0 +1,151 @@
+# ========== EXPIRY CALENDAR SERVICE ==========
+# Valid expiries per symbol, learned from the expiryData block that Fyers
+# returns with every option chain. Calendars are deduped, sorted and refreshed
+# once a day; symbol.json is only the fallback until upstream has been seen.
+# Only symbols listed in symbol.json get a calendar, and a failed refresh is
+# not retried for FALLBACK_RETRY_SECONDS.
+import json
+import os
+import time
+from datetime import datetime
+
+import pytz
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IST = pytz.timezone("Asia/Kolkata")
+EXPIRY_CUTOFF = "15:30"
+FALLBACK_RETRY_SECONDS = 300
+
+# symbol -> {'dates': [...], 'source': 'upstream' | 'symbol.json', 'refreshed_on': date, 'refreshed_at': ts,
+#            'failed_at': ts of the last failed upstream refresh (optional)}
+expiry_calendars = {}
+
+
+def parse_expiry(date_str):
+    try:
+        return datetime.strptime(date_str.strip(), "%d-%m-%Y").date()
+    except (AttributeError, ValueError):
+        return None
+
+
+def normalize_expiries(dates):
+    """Drop malformed entries and duplicates, sort chronologically"""
+    parsed = {}
+    for date_str in dates:
+        expiry_date = parse_expiry(date_str)
+        if expiry_date:
+            parsed[expiry_date] = expiry_date.strftime("%d-%m-%Y")
+    return [parsed[key] for key in sorted(parsed)]
+
+
+def is_expired(expiry):
+    """True once the expiry's 15:30 IST close has passed (or the date is malformed)"""
+    expiry_date = parse_expiry(expiry)
+    if not expiry_date:
+        return True
+    close = IST.localize(datetime.strptime(f"{expiry} {EXPIRY_CUTOFF}", "%d-%m-%Y %H:%M"))
+    return close < datetime.now(IST)
+
+
+def today_ist():
+    return datetime.now(IST).date()
+
+
+def is_known_symbol(symbol):
+    """Whether symbol.json lists the symbol (client-supplied symbols never reach upstream otherwise)"""
+    from .data import get_symbol_metadata
+    metadata = get_symbol_metadata()
+    return symbol in metadata.get('expiry_dates', {}) or symbol in metadata.get('lot_sizes', {})
+
+
+def load_symbol_file_expiries(symbol):
+    try:
+        symbol_file = os.path.join(BASE_DIR, 'dashboard', 'static', 'symbol.json')
+        with open(symbol_file, 'r') as f:
+            data = json.load(f)
+        return data.get('expiry_dates', {}).get(symbol, [])
+    except Exception:
+        return []
+
+
+def store_calendar(symbol, dates, source):
+    expiry_calendars[symbol] = {
+        'dates': normalize_expiries(dates),
+        'source': source,
+        'refreshed_on': today_ist(),
+        'refreshed_at': time.time()
+    }
+    return expiry_calendars[symbol]
+
+
+def learn_expiries(symbol, expiry_data):
+    """Record the expiry list from an option-chain response (data.expiryData)"""
+    dates = [item.get('date') for item in expiry_data or [] if isinstance(item, dict)]
+    if dates:
+        store_calendar(symbol, dates, 'upstream')
+
+
+def invalidate(symbol=None):
+    if symbol is None:
+        expiry_calendars.clear()
+    else:
+        expiry_calendars.pop(symbol, None)
+
+
+def is_stale(calendar):
+    # Back off after a failed refresh instead of asking upstream on every call
+    if time.time() - calendar.get('failed_at', 0) < FALLBACK_RETRY_SECONDS:
+        return False
+    if calendar['refreshed_on'] != today_ist():
+        return True
+    # Fallback calendars retry upstream every few minutes rather than once a day
+    return calendar['source'] != 'upstream' and time.time() - calendar['refreshed_at'] > FALLBACK_RETRY_SECONDS
+
+
+def get_expiries(symbol, refresh=True):
+    """All known expiries for a symbol, refreshed from upstream at most daily"""
+    if not is_known_symbol(symbol):
+        return []
+    calendar = expiry_calendars.get(symbol)
+    if calendar and not (refresh and is_stale(calendar)):
+        return calendar['dates']
+
+    if refresh:
+        from .data import fetch_expiry_data
+        try:
+            expiry_data = fetch_expiry_data(symbol)
+        except Exception as e:
+            print(f"Error refreshing expiry calendar for {symbol}: {e}")
+            expiry_data = None
+        if expiry_data:
+            learn_expiries(symbol, expiry_data)
+            return expiry_calendars[symbol]['dates']
+
+    if not calendar:
+        calendar = store_calendar(symbol, load_symbol_file_expiries(symbol), 'symbol.json')
+    if refresh:
+        calendar['failed_at'] = time.time()
+    return calendar['dates']
+
+
+def get_active_expiries(symbol, refresh=True):
+    return [expiry for expiry in get_expiries(symbol, refresh) if not is_expired(expiry)]
+
+
+def nearest_expiry(symbol, refresh=True):
+    active = get_active_expiries(symbol, refresh)
+    return active[0] if active else None
+
+
+def validate_expiry(symbol, expiry):
+    """Return an error message for an expiry that must not reach upstream, else None"""
+    if not is_known_symbol(symbol):
+        return f"Unknown symbol {symbol}"
+    if parse_expiry(expiry) is None:
+        return f"Invalid expiry date '{expiry}', expected DD-MM-YYYY"
+    if is_expired(expiry):
+        return f"Expiry {expiry} has already passed"
+    calendar = expiry_calendars.get(symbol)
+    if calendar and calendar['source'] == 'upstream' and expiry not in calendar['dates']:
+        return f"{expiry} is not a listed expiry for {symbol}"
+    return None
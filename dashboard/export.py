@@ -0,0 +1,156 @@
+# ========== CHAIN HISTORY EXPORT ==========
+# Generators that stream recorded snapshots as CSV or Parquet. Records are
+# read with a server-side iterator and converted one chunk at a time, so
+# memory stays flat however long the requested range is.
+import csv
+from datetime import datetime, time as dt_time, timedelta
+
+import numpy as np
+
+from .expiry_calendar import IST
+from .recorder import unpack
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = None
+    pq = None
+
+EXPORT_FORMATS = ('csv', 'parquet')
+RECORDS_PER_CHUNK = 200          # database fetch size and Parquet row group size (in snapshots)
+MAX_EXPORT_DAYS = 31
+
+
+class ExportError(ValueError):
+    pass
+
+
+def parse_export_request(params):
+    """Validate (symbol, expiry, start, end, format); returns a dict with IST datetimes"""
+    symbol = params.get('symbol')
+    expiry = params.get('expiry')
+    file_format = params.get('format', 'csv').lower()
+    if not symbol or not expiry:
+        raise ExportError('symbol and expiry are required')
+    if file_format not in EXPORT_FORMATS:
+        raise ExportError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    if file_format == 'parquet' and pa is None:
+        raise ExportError('Parquet export needs pyarrow installed on the server; use format=csv')
+    try:
+        start = datetime.strptime(params.get('start', ''), '%Y-%m-%d').date()
+        end = datetime.strptime(params.get('end') or params.get('start', ''), '%Y-%m-%d').date()
+    except ValueError:
+        raise ExportError('start and end must be dates as YYYY-MM-DD')
+    if end < start or (end - start).days >= MAX_EXPORT_DAYS:
+        raise ExportError(f"Date range must run forwards and span at most {MAX_EXPORT_DAYS} days")
+    return {
+        'symbol': symbol,
+        'expiry': expiry,
+        'format': file_format,
+        'start': IST.localize(datetime.combine(start, dt_time.min)),
+        'end': IST.localize(datetime.combine(end + timedelta(days=1), dt_time.min)),
+    }
+
+
+def export_records(request_spec):
+    from .models import SnapshotRecord
+    return (SnapshotRecord.objects
+            .filter(symbol=request_spec['symbol'], expiry=request_spec['expiry'],
+                    captured_at__gte=request_spec['start'], captured_at__lt=request_spec['end'])
+            .order_by('captured_at')
+            .iterator(chunk_size=RECORDS_PER_CHUNK))
+
+
+def record_table(record):
+    """(column names, list of column arrays) for one snapshot, one row per strike"""
+    fields, block = unpack(record)
+    count = record.strike_count
+    timestamp = record.captured_at.astimezone(IST).isoformat(timespec='seconds')
+    names = ['timestamp', 'spot'] + fields
+    columns = [np.full(count, timestamp, dtype=object), np.full(count, record.spot)] + list(block)
+    return names, columns
+
+
+# ---------- CSV ----------
+class Echo:
+    """File-like object whose write() hands the row straight back (csv.writer target)"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(records):
+    writer = csv.writer(Echo())
+    header_written = False
+    for record in records:
+        names, columns = record_table(record)
+        if not header_written:
+            yield writer.writerow(names)
+            header_written = True
+        yield ''.join(writer.writerow(row) for row in zip(*(column.tolist() for column in columns)))
+
+
+# ---------- Parquet ----------
+class ChunkSink:
+    """Write-only file that hands over whatever has been written since the last drain"""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def stream_parquet(records):
+    sink = ChunkSink()
+    writer = None
+    pending = []
+
+    def write_group():
+        names = pending[0][0]
+        columns = [np.concatenate([table[1][i] for table in pending]) for i in range(len(names))]
+        batch = pa.table({name: pa.array(column.tolist() if name == 'timestamp' else column)
+                          for name, column in zip(names, columns)})
+        pending.clear()
+        return batch
+
+    for record in records:
+        pending.append(record_table(record))
+        if len(pending) >= RECORDS_PER_CHUNK:
+            table = write_group()
+            writer = writer or pq.ParquetWriter(sink, table.schema, compression='zstd')
+            writer.write_table(table)
+            yield sink.drain()
+    if pending:
+        table = write_group()
+        writer = writer or pq.ParquetWriter(sink, table.schema, compression='zstd')
+        writer.write_table(table)
+    if writer is not None:
+        writer.close()
+    yield sink.drain()
+
+
+def stream_export(request_spec):
+    records = export_records(request_spec)
+    if request_spec['format'] == 'parquet':
+        return stream_parquet(records)
+    return stream_csv(records)
@@ -0,0 +1,198 @@
+# ========== INTRADAY SERIES ==========
+# Per-chain ring buffers of chain-level metrics (spot, change, PCR, total
+# CE/PE OI), one row per snapshot version at most every INTRADAY_STEP_SECONDS,
+# reset at the start of each trading day. Chart requests downsample a series
+# to a requested number of points with LTTB (shape-preserving) or min/max
+# bucketing (keeps every spike); results are cached until the next version.
+import threading
+from datetime import datetime
+
+import numpy as np
+from django.conf import settings
+
+from .expiry_calendar import IST
+
+SERIES_FIELDS = ('ltp', 'change_points', 'pcr', 'call_oi', 'put_oi')
+METHODS = ('lttb', 'minmax')
+MAX_POINTS = 5000
+
+
+class SeriesError(ValueError):
+    pass
+
+
+class RingSeries:
+    """Fixed-capacity (time, field...) buffer that overwrites its oldest rows"""
+
+    def __init__(self, capacity):
+        self.times = np.zeros(capacity)
+        self.values = np.zeros((len(SERIES_FIELDS), capacity))
+        self.start = 0
+        self.count = 0
+        self.day = None
+        self.version = 0
+
+    def append(self, timestamp, row):
+        capacity = len(self.times)
+        position = (self.start + self.count) % capacity
+        self.times[position] = timestamp
+        self.values[:, position] = row
+        if self.count < capacity:
+            self.count += 1
+        else:
+            self.start = (self.start + 1) % capacity
+
+    def ordered(self):
+        """(times, values) copies in time order"""
+        index = (self.start + np.arange(self.count)) % len(self.times)
+        return self.times[index], self.values[:, index]
+
+    def clear(self):
+        self.start = 0
+        self.count = 0
+
+    @property
+    def last_time(self):
+        return self.times[(self.start + self.count - 1) % len(self.times)] if self.count else 0.0
+
+
+# (symbol, expiry) -> RingSeries, and (symbol, expiry) -> {(method, points): payload}
+series = {}
+downsampled = {}
+series_lock = threading.Lock()
+
+
+def snapshot_row(snapshot):
+    # PCR and OI totals over a fixed ATM window: the fetched superset widens and
+    # narrows as other sessions open and close larger windows
+    view = snapshot.window(settings.DEFAULT_STRIKECOUNT)
+    return (
+        snapshot.spot,
+        float(snapshot.quote_data.get('change_points', 0) or 0),
+        view.pcr,
+        float(view['call_oi'].sum()),
+        float(view['put_oi'].sum()),
+    )
+
+
+def record_snapshot(snapshot):
+    """Snapshot listener: append the chain's metrics for this version"""
+    if len(snapshot) == 0:
+        return
+    key = (snapshot.symbol, snapshot.expiry)
+    day = datetime.fromtimestamp(snapshot.fetched_at, IST).date()
+    with series_lock:
+        buffer = series.get(key)
+        if buffer is None:
+            buffer = series[key] = RingSeries(settings.INTRADAY_CAPACITY)
+        if buffer.day != day:
+            buffer.clear()
+            buffer.day = day
+        if buffer.count and snapshot.fetched_at - buffer.last_time < settings.INTRADAY_STEP_SECONDS:
+            return
+        buffer.append(snapshot.fetched_at, snapshot_row(snapshot))
+        buffer.version = snapshot.version
+        downsampled.pop(key, None)
+
+
+# ========== DOWNSAMPLING ==========
+def lttb_indices(x, y, points):
+    """Largest-Triangle-Three-Buckets over each row of y (series, n) sharing x
+
+    Returns an (series, points) index array. The first and last samples are
+    always kept; each bucket in between keeps the sample forming the largest
+    triangle with the previously kept sample and the next bucket's average.
+    """
+    n = len(x)
+    rows = np.arange(y.shape[0])
+    if points >= n or points < 3:
+        return np.tile(np.arange(n), (y.shape[0], 1))
+
+    edges = np.floor(np.linspace(1, n - 1, points - 1)).astype(int)
+    # Next-bucket averages for every bucket at once (the last bucket looks at the final sample)
+    x_avg = np.append(np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / np.diff(edges), x[-1])
+    y_avg = np.column_stack([np.add.reduceat(y[:, 1:n - 1], edges[:-1] - 1, axis=1) / np.diff(edges), y[:, -1]])
+
+    selected = np.empty((y.shape[0], points), dtype=int)
+    selected[:, 0] = 0
+    selected[:, -1] = n - 1
+    previous = np.zeros(y.shape[0], dtype=int)
+    for bucket in range(points - 2):
+        low, high = edges[bucket], edges[bucket + 1]
+        xa, ya = x[previous][:, None], y[rows, previous][:, None]
+        area = np.abs((xa - x_avg[bucket + 1]) * (y[:, low:high] - ya)
+                      - (xa - x[low:high]) * (y_avg[:, bucket + 1][:, None] - ya))
+        previous = low + area.argmax(axis=1)
+        selected[:, bucket + 1] = previous
+    return selected
+
+
+def minmax_indices(y, points):
+    """Min and max sample of each of points/2 equal buckets, in time order (series, points)"""
+    n = y.shape[1]
+    buckets = max(points // 2, 1)
+    if points >= n:
+        return np.tile(np.arange(n), (y.shape[0], 1))
+    width = -(-n // buckets)
+    buckets = -(-n // width)
+    padded = np.full((y.shape[0], buckets * width), np.nan)
+    padded[:, :n] = y
+    padded = padded.reshape(y.shape[0], buckets, width)
+    offsets = np.arange(buckets) * width
+    low = offsets + np.nanargmin(padded, axis=2)
+    high = offsets + np.nanargmax(padded, axis=2)
+    return np.sort(np.stack([low, high], axis=2).reshape(y.shape[0], -1), axis=1)
+
+
+def downsample(times, values, method, points):
+    if method == 'minmax':
+        indices = minmax_indices(values, points)
+    else:
+        indices = lttb_indices(times, values, points)
+    return {
+        field: {
+            't': np.round(times[indices[i]], 3).tolist(),
+            'v': values[i, indices[i]].tolist(),
+        }
+        for i, field in enumerate(SERIES_FIELDS)
+    }
+
+
+def parse_series_request(params):
+    method = params.get('method', 'lttb').lower()
+    if method not in METHODS:
+        raise SeriesError(f"method must be one of: {', '.join(METHODS)}")
+    try:
+        points = int(params.get('points', settings.INTRADAY_DEFAULT_POINTS))
+    except ValueError:
+        raise SeriesError('points must be a number')
+    if not 3 <= points <= MAX_POINTS:
+        raise SeriesError(f"points must be between 3 and {MAX_POINTS}")
+    return method, points
+
+
+def get_series(symbol, expiry, method, points):
+    """Downsampled intraday series for a chain, or None before its first snapshot"""
+    key = (symbol, expiry)
+    with series_lock:
+        buffer = series.get(key)
+        if buffer is None or buffer.count == 0:
+            return None
+        cached = downsampled.get(key, {}).get((method, points))
+        if cached is not None:
+            return cached
+        version = buffer.version
+        times, values = buffer.ordered()
+
+    payload = {
+        'symbol': symbol,
+        'expiry': expiry,
+        'version': version,
+        'method': method,
+        'samples': len(times),
+        'series': downsample(times, values, method, points),
+    }
+    with series_lock:
+        if buffer.version == version:
+            downsampled.setdefault(key, {})[(method, points)] = payload
+    return payload
@@ -0,0 +1,196 @@
+# ========== MARKET HOURS AND REFRESH CADENCE ==========
+# NSE F&O trades 09:15-15:30 IST on weekdays that are not exchange holidays.
+# Outside the session a chain is fetched once after the close and then
+# served frozen until the next open. Inside the session each chain's refresh
+# interval adapts to how often its data actually changes and to how many
+# viewers share it (across every node in cluster mode). The interval is the
+# server cache TTL; each response tells the client to poll again when what it
+# was served expires, so a poll never lands on data older than one interval.
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, time as dt_time, timedelta
+
+import numpy as np
+from django.conf import settings
+
+from .expiry_calendar import IST
+
+SESSION_OPEN = dt_time(9, 15)
+SESSION_CLOSE = dt_time(15, 30)
+MIN_POLL_DELAY = 0.5
+
+# NSE trading holidays (exchange circulars); add more with NSE_HOLIDAYS=DD-MM-YYYY,...
+NSE_HOLIDAYS = {
+    # 2025
+    '26-02-2025', '14-03-2025', '31-03-2025', '10-04-2025', '14-04-2025', '18-04-2025',
+    '01-05-2025', '15-08-2025', '27-08-2025', '02-10-2025', '21-10-2025', '22-10-2025',
+    '05-11-2025', '25-12-2025',
+    # 2026
+    '26-01-2026', '03-03-2026', '26-03-2026', '31-03-2026', '03-04-2026', '14-04-2026',
+    '01-05-2026', '28-05-2026', '26-06-2026', '14-09-2026', '02-10-2026', '20-10-2026',
+    '10-11-2026', '24-11-2026', '25-12-2026',
+}
+
+
+def holidays():
+    extra = os.getenv('NSE_HOLIDAYS', '')
+    return NSE_HOLIDAYS | {date.strip() for date in extra.split(',') if date.strip()}
+
+
+def now_ist():
+    return datetime.now(IST)
+
+
+def is_trading_day(day):
+    return day.weekday() < 5 and day.strftime('%d-%m-%Y') not in holidays()
+
+
+def is_open(now=None):
+    now = now or now_ist()
+    return is_trading_day(now.date()) and SESSION_OPEN <= now.time() < SESSION_CLOSE
+
+
+def last_close(now=None):
+    """Most recent session close at or before now (IST datetime)"""
+    now = now or now_ist()
+    day = now.date()
+    if now.time() < SESSION_CLOSE:
+        day -= timedelta(days=1)
+    while not is_trading_day(day):
+        day -= timedelta(days=1)
+    return IST.localize(datetime.combine(day, SESSION_CLOSE))
+
+
+def next_open(now=None):
+    """Next session open strictly after now, or now itself when the session is running"""
+    now = now or now_ist()
+    if is_open(now):
+        return now
+    day = now.date()
+    if now.time() >= SESSION_OPEN:
+        day += timedelta(days=1)
+    while not is_trading_day(day):
+        day += timedelta(days=1)
+    return IST.localize(datetime.combine(day, SESSION_OPEN))
+
+
+def needs_refresh(fetched_at, now=None):
+    """Whether data fetched at fetched_at (epoch seconds) may be stale
+
+    Always true during the session; afterwards only until one fetch after the close.
+    """
+    now = now or now_ist()
+    return is_open(now) or fetched_at < last_close(now).timestamp()
+
+
+# ========== PER-CHAIN ACTIVITY ==========
+# (symbol, expiry) -> deque of (time, changed) for recent snapshot versions,
+# (symbol, expiry) -> {viewer: last request time} on this node, and
+# (symbol, expiry) -> (count, noted_at) for the cluster-wide count from the broker
+activity = {}
+previous_prices = {}
+viewers = {}
+shared_viewers = {}
+activity_lock = threading.Lock()
+
+
+def viewer_ttl():
+    """Seconds a viewer counts after their last request"""
+    return settings.REFRESH_MAX_SECONDS * 3
+
+
+def observe_snapshot(snapshot):
+    """Snapshot listener: note whether prices moved since the previous version"""
+    key = (snapshot.symbol, snapshot.expiry)
+    prices = np.concatenate(([snapshot.spot], snapshot['call_ltp'], snapshot['put_ltp']))
+    now = time.time()
+    with activity_lock:
+        previous = previous_prices.get(key)
+        changed = previous is None or previous.shape != prices.shape or not np.array_equal(previous, prices)
+        previous_prices[key] = prices
+        samples = activity.setdefault(key, deque())
+        samples.append((now, changed))
+        while samples and now - samples[0][0] > settings.REFRESH_ACTIVITY_WINDOW:
+            samples.popleft()
+
+
+def record_viewer(symbol, expiry, viewer):
+    now = time.time()
+    with activity_lock:
+        chain_viewers = viewers.setdefault((symbol, expiry), {})
+        chain_viewers[viewer] = now
+        for key in [key for key, seen in chain_viewers.items() if now - seen > viewer_ttl()]:
+            del chain_viewers[key]
+
+
+def local_viewers(symbol, expiry):
+    """Viewers of a chain on this node (what this node reports to the cluster broker)"""
+    with activity_lock:
+        return len(viewers.get((symbol, expiry), ()))
+
+
+def note_shared_viewers(symbol, expiry, count):
+    """Record the cluster-wide viewer count the broker reported for a chain"""
+    with activity_lock:
+        shared_viewers[(symbol, expiry)] = (count, time.time())
+
+
+def change_rate(symbol, expiry):
+    """Fraction of recent snapshot versions whose prices moved (1.0 with no history)"""
+    with activity_lock:
+        samples = activity.get((symbol, expiry))
+        if not samples:
+            return 1.0
+        return sum(changed for _, changed in samples) / len(samples)
+
+
+def viewer_count(symbol, expiry):
+    with activity_lock:
+        count, noted_at = shared_viewers.get((symbol, expiry), (0, 0.0))
+        shared = count if time.time() - noted_at <= viewer_ttl() else 0
+        return max(1, len(viewers.get((symbol, expiry), ())), shared)
+
+
+def refresh_interval(symbol, expiry, now=None):
+    """Seconds until this chain is worth fetching (server) or polling (client) again"""
+    now = now or now_ist()
+    if not is_open(now):
+        until_open = (next_open(now) - now).total_seconds()
+        return round(min(max(until_open, settings.REFRESH_MIN_SECONDS), settings.REFRESH_CLOSED_MAX_SECONDS), 1)
+
+    # Quiet chains slow down towards the maximum; viewers sharing a chain pull it back
+    quiet = 1.0 - change_rate(symbol, expiry)
+    span = settings.REFRESH_MAX_SECONDS - settings.REFRESH_MIN_SECONDS
+    interval = settings.REFRESH_MIN_SECONDS + span * quiet / viewer_count(symbol, expiry)
+    # Wake up right after the close to pick up the closing snapshot
+    boundary = (datetime.combine(now.date(), SESSION_CLOSE) - now.replace(tzinfo=None)).total_seconds()
+    return round(max(settings.REFRESH_MIN_SECONDS, min(interval, boundary + 1)), 1)
+
+
+def cache_ttl(symbol, expiry, now=None):
+    """Seconds a fetched chain is served in session before upstream is asked again"""
+    return refresh_interval(symbol, expiry, now)
+
+
+def poll_delay(symbol, expiry, age, now=None):
+    """Client's next poll delay: what is left of the TTL of a chain cached age seconds ago
+
+    A full interval when the age is unknown, the cached chain has already
+    expired (the refetch failed) or the session is closed.
+    """
+    now = now or now_ist()
+    interval = refresh_interval(symbol, expiry, now)
+    if age is None or not is_open(now):
+        return interval
+    remaining = cache_ttl(symbol, expiry, now) - age
+    return round(max(remaining, MIN_POLL_DELAY), 1) if remaining > 0 else interval
+
+
+def cache_is_fresh(snapshot, cached_at, now=None):
+    """Whether a cached chain can be served without asking upstream again"""
+    now = now or now_ist()
+    if not is_open(now):
+        return not needs_refresh(snapshot.fetched_at, now)
+    return now.timestamp() - cached_at < cache_ttl(snapshot.symbol, snapshot.expiry, now)
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PollerLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('holder', models.CharField(max_length=100)),
+                ('expires_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SharedSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=50)),
+                ('expiry', models.CharField(max_length=10)),
+                ('strikecount', models.IntegerField(default=0)),
+                ('payload', models.TextField(blank=True)),
+                ('version', models.IntegerField(default=0)),
+                ('published_at', models.DateTimeField(blank=True, null=True)),
+                ('requested_at', models.DateTimeField()),
+            ],
+            options={
+                'unique_together': {('symbol', 'expiry')},
+            },
+        ),
+    ]
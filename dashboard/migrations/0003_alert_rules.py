@@ -0,0 +1,55 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0002_cluster_snapshots'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=50)),
+                ('expiry', models.CharField(blank=True, max_length=10)),
+                ('field', models.CharField(max_length=20)),
+                ('strike', models.FloatField(blank=True, null=True)),
+                ('condition', models.CharField(choices=[('above', 'Above'), ('below', 'Below'), ('crosses_above', 'Crosses above'), ('crosses_below', 'Crosses below'), ('grows_pct', 'Grows by % within window'), ('falls_pct', 'Falls by % within window')], max_length=20)),
+                ('threshold', models.FloatField()),
+                ('window_minutes', models.IntegerField(default=15)),
+                ('repeat', models.BooleanField(default=False)),
+                ('active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_triggered_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alert_rules', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AlertEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message', models.CharField(max_length=200)),
+                ('value', models.FloatField()),
+                ('strike', models.FloatField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('delivered', models.BooleanField(default=False)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alert_events', to=settings.AUTH_USER_MODEL)),
+                ('rule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='dashboard.alertrule')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='alertrule',
+            index=models.Index(fields=['active', 'symbol', 'expiry', 'field'], name='dashboard_a_active_8a0b91_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='alertevent',
+            index=models.Index(fields=['user', 'delivered'], name='dashboard_a_user_id_7fa487_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_alert_rules'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=50)),
+                ('expiry', models.CharField(max_length=10)),
+                ('captured_at', models.DateTimeField()),
+                ('spot', models.FloatField()),
+                ('fields', models.TextField()),
+                ('strike_count', models.IntegerField()),
+                ('data', models.BinaryField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['symbol', 'expiry', 'captured_at'], name='dashboard_s_symbol_48f8e8_idx')],
+            },
+        ),
+    ]
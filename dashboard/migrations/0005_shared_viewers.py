@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0004_snapshot_records'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sharedsnapshot',
+            name='viewers',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='sharedsnapshot',
+            name='viewers_since',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
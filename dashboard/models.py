@@ -8,3 +8,98 @@ class UserSession(models.Model):
     
     def __str__(self):
         return f"{self.user.username} - {self.session_key}"
+
+
+class PollerLease(models.Model):
+    """Lease row held by the one node allowed to poll Fyers in cluster mode"""
+    name = models.CharField(max_length=50, unique=True)
+    holder = models.CharField(max_length=100)
+    expires_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} - {self.holder}"
+
+
+class SharedSnapshot(models.Model):
+    """Latest option chain published by the leader, plus follower demand for it"""
+    symbol = models.CharField(max_length=50)
+    expiry = models.CharField(max_length=10)
+    strikecount = models.IntegerField(default=0)
+    payload = models.TextField(blank=True)
+    version = models.IntegerField(default=0)
+    published_at = models.DateTimeField(null=True, blank=True)
+    requested_at = models.DateTimeField()
+    viewers = models.IntegerField(default=0)                       # most viewers any node reported ...
+    viewers_since = models.DateTimeField(null=True, blank=True)    # ... since this time
+
+    class Meta:
+        unique_together = ('symbol', 'expiry')
+
+    def __str__(self):
+        return f"{self.symbol} {self.expiry} v{self.version}"
+
+
+class AlertRule(models.Model):
+    """User alert evaluated on every new snapshot of its (symbol, expiry) chain"""
+    CONDITIONS = [
+        ('above', 'Above'),
+        ('below', 'Below'),
+        ('crosses_above', 'Crosses above'),
+        ('crosses_below', 'Crosses below'),
+        ('grows_pct', 'Grows by % within window'),
+        ('falls_pct', 'Falls by % within window'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='alert_rules')
+    symbol = models.CharField(max_length=50)
+    expiry = models.CharField(max_length=10, blank=True)  # blank matches every expiry
+    field = models.CharField(max_length=20)               # 'pcr', 'spot' or a chain column such as 'call_oi'
+    strike = models.FloatField(null=True, blank=True)     # None checks every strike in the chain
+    condition = models.CharField(max_length=20, choices=CONDITIONS)
+    threshold = models.FloatField()
+    window_minutes = models.IntegerField(default=15)      # grows_pct / falls_pct lookback
+    repeat = models.BooleanField(default=False)           # stay armed after firing (with a cooldown)
+    active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_triggered_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['active', 'symbol', 'expiry', 'field'])]
+
+    def __str__(self):
+        strike = f" @{self.strike:g}" if self.strike is not None else ''
+        return f"{self.symbol} {self.expiry or '*'} {self.field}{strike} {self.condition} {self.threshold:g}"
+
+
+class AlertEvent(models.Model):
+    """One firing of an AlertRule, held until the user's page picks it up"""
+    rule = models.ForeignKey(AlertRule, on_delete=models.CASCADE, related_name='events')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='alert_events')
+    message = models.CharField(max_length=200)
+    value = models.FloatField()
+    strike = models.FloatField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    delivered = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'delivered'])]
+
+    def __str__(self):
+        return f"{self.user.username}: {self.message}"
+
+
+class SnapshotRecord(models.Model):
+    """One recorded chain snapshot; per-strike columns packed as zlib-compressed float64"""
+    symbol = models.CharField(max_length=50)
+    expiry = models.CharField(max_length=10)
+    captured_at = models.DateTimeField()
+    spot = models.FloatField()
+    fields = models.TextField()      # comma-separated names of the packed columns, in order
+    strike_count = models.IntegerField()
+    data = models.BinaryField()
+
+    class Meta:
+        indexes = [models.Index(fields=['symbol', 'expiry', 'captured_at'])]
+
+    def __str__(self):
+        return f"{self.symbol} {self.expiry} @ {self.captured_at:%Y-%m-%d %H:%M:%S}"
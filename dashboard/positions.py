@@ -0,0 +1,141 @@
+# ========== MULTI-LEG POSITIONS ==========
+# Net premium, aggregate Greeks and expiry / T+0 payoff curves for positions
+# built from chain legs. All legs of all positions in a request are evaluated
+# as one array (leg x spot point) and summed per position with bincount, so
+# re-evaluating many users' positions on a tick is a handful of NumPy calls.
+import numpy as np
+
+from .pricing import black_scholes, clean_iv, in_table_units, intrinsic_value
+
+SIDES = {'buy': 1, 'sell': -1}
+OPTION_TYPES = ('CE', 'PE')
+MAX_LEGS = 200
+MAX_POINTS = 501
+
+
+class PositionError(ValueError):
+    pass
+
+
+def parse_positions(body):
+    """Normalise a request body into a list of positions (each a list of legs)
+
+    Accepts {"legs": [...]} for one position or {"positions": [{"legs": [...]}, ...]}.
+    A leg is {"strike", "option_type": CE/PE, "side": buy/sell, "lots", optional "price"}.
+    """
+    if 'positions' in body:
+        raw_positions = [position.get('legs', []) for position in body['positions']]
+    else:
+        raw_positions = [body.get('legs', [])]
+    if not raw_positions:
+        raise PositionError('positions must contain at least one position')
+
+    positions = []
+    total_legs = 0
+    for raw_legs in raw_positions:
+        if not raw_legs:
+            raise PositionError('Each position needs at least one leg')
+        legs = []
+        for leg in raw_legs:
+            try:
+                option_type = str(leg['option_type']).upper()
+                side = str(leg['side']).lower()
+                parsed = {
+                    'strike': float(leg['strike']),
+                    'option_type': option_type,
+                    'side': side,
+                    'lots': int(leg.get('lots', 1)),
+                    'price': float(leg['price']) if leg.get('price') is not None else None,
+                }
+            except (KeyError, TypeError, ValueError):
+                raise PositionError('Legs need strike, option_type, side and numeric lots')
+            if option_type not in OPTION_TYPES or side not in SIDES or parsed['lots'] <= 0:
+                raise PositionError('option_type must be CE/PE, side buy/sell, lots positive')
+            legs.append(parsed)
+        total_legs += len(legs)
+        positions.append(legs)
+
+    if total_legs > MAX_LEGS:
+        raise PositionError(f"At most {MAX_LEGS} legs per request")
+    return positions
+
+
+def leg_arrays(snapshot, positions, lot_size):
+    """Flatten legs into parallel arrays, pricing them from the snapshot"""
+    legs = [(index, leg) for index, position in enumerate(positions) for leg in position]
+    strike_index = {strike: i for i, strike in enumerate(snapshot.strikes.tolist())}
+    missing = sorted({leg['strike'] for _, leg in legs if leg['strike'] not in strike_index})
+    if missing:
+        raise PositionError(f"Strikes not in the current chain window: {', '.join(f'{strike:g}' for strike in missing)}")
+
+    rows = np.array([strike_index[leg['strike']] for _, leg in legs], dtype=int)
+    is_call = np.array([leg['option_type'] == 'CE' for _, leg in legs])
+    ltp = np.where(is_call, snapshot['call_ltp'][rows], snapshot['put_ltp'][rows])
+    iv = np.where(is_call, clean_iv(snapshot['call_iv'])[rows], clean_iv(snapshot['put_iv'])[rows])
+    entry = np.array([leg['price'] if leg['price'] is not None else np.nan for _, leg in legs])
+
+    return {
+        'position': np.array([index for index, _ in legs], dtype=int),
+        'strike': snapshot.strikes[rows],
+        'is_call': is_call,
+        'quantity': np.array([SIDES[leg['side']] * leg['lots'] * lot_size for _, leg in legs], dtype=np.float64),
+        'ltp': ltp,
+        'entry': np.where(np.isnan(entry), ltp, entry),
+        'iv': iv,
+    }
+
+
+def per_position(values, position, count):
+    """Sum leg rows (leg, ...) into position rows (position, ...)"""
+    if values.ndim == 1:
+        return np.bincount(position, weights=values, minlength=count)
+    return np.stack([np.bincount(position, weights=column, minlength=count) for column in values.T], axis=1)
+
+
+def evaluate_positions(snapshot, positions, lot_size, days_to_expiry, spot_range=5.0, points=101):
+    """Evaluate every position against one snapshot; returns one result dict per position"""
+    points = max(2, min(int(points), MAX_POINTS))
+    count = len(positions)
+    legs = leg_arrays(snapshot, positions, lot_size)
+    years = days_to_expiry / 365.0
+
+    spots = snapshot.spot * (1 + np.linspace(-spot_range, spot_range, points) / 100.0)
+    quantity = legs['quantity']
+
+    # Current Greeks at spot (in the table's units), then the (leg, point) payoff grids
+    now = in_table_units(black_scholes(snapshot.spot, legs['strike'], years, legs['iv'], legs['is_call']))
+    curve_t0 = black_scholes(spots[None, :], legs['strike'][:, None], years,
+                             legs['iv'][:, None], legs['is_call'][:, None])['price']
+    curve_expiry = intrinsic_value(spots[None, :], legs['strike'][:, None], legs['is_call'][:, None])
+
+    net_premium = per_position(quantity * legs['entry'], legs['position'], count)
+    market_value = per_position(quantity * legs['ltp'], legs['position'], count)
+    greeks = {name: per_position(quantity * now[name], legs['position'], count)
+              for name in ('delta', 'gamma', 'theta', 'vega')}
+    pnl_expiry = per_position(quantity[:, None] * (curve_expiry - legs['entry'][:, None]), legs['position'], count)
+    pnl_t0 = per_position(quantity[:, None] * (curve_t0 - legs['entry'][:, None]), legs['position'], count)
+
+    results = []
+    for i in range(count):
+        results.append({
+            'net_premium': round(float(net_premium[i]), 2),   # positive = debit paid
+            'market_value': round(float(market_value[i]), 2),
+            'unrealized_pnl': round(float(market_value[i] - net_premium[i]), 2),
+            'greeks': {name: round(float(values[i]), 4) for name, values in greeks.items()},
+            'max_profit': round(float(pnl_expiry[i].max()), 2),
+            'max_loss': round(float(pnl_expiry[i].min()), 2),
+            'breakevens': breakevens(spots, pnl_expiry[i]),
+            'payoff': {
+                'expiry': np.round(pnl_expiry[i], 2).tolist(),
+                't0': np.round(pnl_t0[i], 2).tolist(),
+            },
+        })
+    return np.round(spots, 2).tolist(), results
+
+
+def breakevens(spots, pnl):
+    """Spot levels where the expiry P&L crosses zero, linearly interpolated"""
+    signs = np.sign(pnl)
+    crossings = np.nonzero(signs[:-1] * signs[1:] < 0)[0]
+    levels = spots[crossings] - pnl[crossings] * (spots[crossings + 1] - spots[crossings]) / (pnl[crossings + 1] - pnl[crossings])
+    return np.round(levels, 2).tolist()
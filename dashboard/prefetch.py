@@ -0,0 +1,222 @@
+# ========== USAGE-DRIVEN PREFETCH ==========
+# A viewer switching symbol or expiry normally pays a cold upstream fetch plus
+# Greeks for the whole chain. get_live_data reports each viewer's selection
+# here; switches are learned as transitions between (symbol, expiry rank)
+# states (rank 0 is the nearest expiry, 1 the next weekly, ...) so patterns
+# survive expiry roll-overs. For every chain being watched, its likely next
+# chains are warmed by a background thread, only while the upstream limiter
+# has spare capacity, and handed to getLiveSnapshot on a cold switch.
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+from . import expiry_calendar
+from . import market_hours
+from . import throttle
+
+# viewer -> (symbol, expiry, seen_at); state -> Counter of next states
+viewers = {}
+transitions = {}
+# (symbol, expiry) -> (strikecount, wanted_at) for chains worth keeping warm
+wanted = {}
+# (symbol, expiry) -> {'snapshot', 'seconds'} (seconds: what the fetch cost)
+warm = {}
+# (symbol, expiry) -> (claimed_at, seconds) until the switch that claimed it is timed
+claimed = {}
+stats = Counter()
+prefetch_lock = threading.Lock()
+warmer_thread = None
+
+
+def is_enabled():
+    from . import cluster
+    # In cluster mode only the leader fetches, and it polls every chain anyone watches
+    return settings.PREFETCH_ENABLED and not cluster.is_enabled()
+
+
+def expiry_rank(symbol, expiry):
+    active = expiry_calendar.get_active_expiries(symbol, refresh=False)
+    return active.index(expiry) if expiry in active else None
+
+
+def resolve(state):
+    """(symbol, rank) -> (symbol, expiry) for the current calendar, or None"""
+    symbol, rank = state
+    active = expiry_calendar.get_active_expiries(symbol, refresh=False)
+    return (symbol, active[rank]) if rank < len(active) else None
+
+
+def learn(previous, current):
+    states = [(symbol, expiry_rank(symbol, expiry)) for symbol, expiry in (previous, current)]
+    if None in (states[0][1], states[1][1]):
+        return
+    counts = transitions.setdefault(states[0], Counter())
+    counts[states[1]] += 1
+    # Old habits fade: halve a state's counts once it has seen enough switches
+    if sum(counts.values()) > settings.PREFETCH_HISTORY:
+        for state in list(counts):
+            counts[state] //= 2
+            if not counts[state]:
+                del counts[state]
+
+
+def candidates(symbol, expiry):
+    """Chains a viewer of (symbol, expiry) is likely to switch to next, most likely first"""
+    rank = expiry_rank(symbol, expiry)
+    if rank is None:
+        return []
+    learned = [state for state, count in transitions.get((symbol, rank), Counter()).most_common()
+               if count >= settings.PREFETCH_MIN_SWITCHES]
+    # Without history, the next weekly and the nearest expiry are the usual moves
+    likely = learned + [(symbol, rank + 1), (symbol, 0)]
+    chains = []
+    for state in likely:
+        chain = resolve(state)
+        if chain and chain != (symbol, expiry) and chain not in chains:
+            chains.append(chain)
+    return chains[:settings.PREFETCH_CANDIDATES]
+
+
+def record_request(viewer, symbol, expiry, strikecount):
+    """Note a viewer's selection; True when it is a switch from their previous chain"""
+    if not is_enabled():
+        return False
+    now = time.time()
+    with prefetch_lock:
+        previous = viewers.get(viewer)
+        viewers[viewer] = (symbol, expiry, now)
+        switched = previous is not None and previous[:2] != (symbol, expiry)
+        if switched:
+            learn(previous[:2], (symbol, expiry))
+        for chain in candidates(symbol, expiry):
+            wanted[chain] = (strikecount, now)
+        for key in [key for key, seen in viewers.items() if now - seen[2] > settings.PREFETCH_IDLE_SECONDS]:
+            del viewers[key]
+    ensure_warmer()
+    return switched
+
+
+def record_switch(symbol, expiry, seconds):
+    """Time a switch: a hit if it was served from a prefetched chain"""
+    now = time.time()
+    with prefetch_lock:
+        stats['switches'] += 1
+        hit = claimed.pop((symbol, expiry), None)
+        if hit and now - hit[0] < 5:
+            stats['hits'] += 1
+            stats['saved_seconds'] += max(hit[1] - seconds, 0)
+        else:
+            stats['cold_switches'] += 1
+            stats['cold_seconds'] += seconds
+
+
+def max_age(snapshot):
+    """Seconds a warm chain may be served: never longer than the chain's own cache TTL in session"""
+    if market_hours.is_open():
+        return min(settings.PREFETCH_MAX_AGE, market_hours.cache_ttl(snapshot.symbol, snapshot.expiry))
+    return settings.PREFETCH_MAX_AGE
+
+
+def is_usable(entry, now):
+    snapshot = entry['snapshot']
+    return now - snapshot.fetched_at < max_age(snapshot) or not market_hours.needs_refresh(snapshot.fetched_at)
+
+
+def claim(symbol, expiry, strikecount, newer_than=0):
+    """A prefetched snapshot for this chain if one is fresh enough, else None"""
+    now = time.time()
+    with prefetch_lock:
+        entry = warm.pop((symbol, expiry), None)
+        if entry is None or not is_usable(entry, now):
+            return None
+        snapshot = entry['snapshot']
+        if snapshot.strikecount < strikecount or snapshot.fetched_at <= newer_than:
+            return None
+        claimed[(symbol, expiry)] = (now, entry['seconds'])
+        stats['served'] += 1
+    return snapshot
+
+
+# ========== WARMER ==========
+def due_chains(now):
+    """Wanted chains without a usable warm copy that nobody is already polling"""
+    from .data import data_cache
+
+    with prefetch_lock:
+        for key in [key for key, (_, wanted_at) in wanted.items() if now - wanted_at > settings.PREFETCH_IDLE_SECONDS]:
+            del wanted[key]
+        for key in [key for key, entry in warm.items() if not is_usable(entry, now)]:
+            del warm[key]
+            stats['expired_unused'] += 1
+        due = []
+        for (symbol, expiry), (strikecount, _) in sorted(wanted.items(), key=lambda item: -item[1][1]):
+            entry = warm.get((symbol, expiry))
+            if entry and now - entry['snapshot'].fetched_at < max_age(entry['snapshot']) / 2:
+                continue
+            cached = data_cache.get(f"{symbol}_{expiry}")
+            if cached and market_hours.cache_is_fresh(cached['snapshot'], cached['timestamp']):
+                continue
+            due.append((symbol, expiry, strikecount))
+    return due
+
+
+def warm_once():
+    from .data import load_chain
+
+    for symbol, expiry, strikecount in due_chains(time.time()):
+        # Low priority: user requests keep the budget, background fetches take what is left
+        if throttle.headroom() < settings.PREFETCH_HEADROOM:
+            with prefetch_lock:
+                stats['deferred'] += 1
+            return
+        if expiry_calendar.validate_expiry(symbol, expiry):
+            continue
+        started = time.perf_counter()
+        snapshot = load_chain(symbol, expiry, strikecount)
+        if snapshot is None:
+            continue
+        with prefetch_lock:
+            warm[(symbol, expiry)] = {'snapshot': snapshot, 'seconds': time.perf_counter() - started}
+            stats['warmed'] += 1
+
+
+def run_warmer():
+    while True:
+        time.sleep(settings.PREFETCH_INTERVAL)
+        try:
+            warm_once()
+        except Exception as e:
+            print(f"Prefetch warmer error: {e}")
+
+
+def ensure_warmer():
+    global warmer_thread
+    with prefetch_lock:
+        if warmer_thread is None:
+            warmer_thread = threading.Thread(target=run_warmer, name='prefetch-warmer', daemon=True)
+            warmer_thread.start()
+
+
+def get_stats():
+    with prefetch_lock:
+        hits, switches, cold = stats['hits'], stats['switches'], stats['cold_switches']
+        return {
+            'switches': switches,
+            'hits': hits,
+            'hit_rate': round(hits / switches, 3) if switches else None,
+            'served': stats['served'],
+            'warmed': stats['warmed'],
+            'expired_unused': stats['expired_unused'],
+            'deferred': stats['deferred'],
+            'latency_saved_seconds': round(stats['saved_seconds'], 2),
+            'avg_saved_ms': round(stats['saved_seconds'] / hits * 1000, 1) if hits else None,
+            'avg_cold_switch_ms': round(stats['cold_seconds'] / cold * 1000, 1) if cold else None,
+            'watched_chains': len(wanted),
+            'warm_chains': len(warm),
+            'transitions': [
+                {'from': f"{source[0]} #{source[1]}", 'to': f"{target[0]} #{target[1]}", 'count': count}
+                for source, counts in transitions.items() for target, count in counts.most_common(3)
+            ][:50],
+        }
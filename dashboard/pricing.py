@@ -0,0 +1,81 @@
+# ========== VECTORIZED BLACK-SCHOLES ==========
+# Prices and Greeks for whole arrays of options in one NumPy evaluation.
+# Inputs broadcast against each other, so a chain (strikes) can be crossed
+# with spot, volatility and time grids without Python loops.
+#
+# black_scholes units: delta per 1 point of spot, gamma per 1 point, theta
+# per calendar day, vega per 1 volatility point (1%). Results shown next to
+# the option chain table are converted to the table's units (in_table_units).
+import numpy as np
+from scipy.special import ndtr
+
+RISK_FREE_RATE = 0.10
+DEFAULT_IV = 0.15
+MIN_TIME = 1e-6  # years; keeps d1/d2 finite at expiry
+
+# The table's Greeks (calculate_greeks), as multiples of black_scholes units
+TABLE_SCALE = {'price': 1.0, 'delta': 1.0, 'gamma': 100.0, 'theta': 1 / 365.0, 'vega': 0.01}
+GREEK_UNITS = {
+    'delta': 'price change per 1 point of spot',
+    'gamma': 'delta change per 100 points of spot',
+    'theta': 'price change per day, divided by 365',
+    'vega': 'price change per 0.01 volatility point',
+}
+
+
+def norm_pdf(x):
+    return np.exp(-0.5 * x * x) / np.sqrt(2 * np.pi)
+
+
+def black_scholes(spot, strike, years, sigma, is_call, rate=RISK_FREE_RATE):
+    """Return {'price', 'delta', 'gamma', 'theta', 'vega'} arrays broadcast over all inputs
+
+    is_call is a boolean array (or scalar) selecting call vs put formulas.
+    """
+    spot = np.asarray(spot, dtype=np.float64)
+    strike = np.asarray(strike, dtype=np.float64)
+    years = np.maximum(np.asarray(years, dtype=np.float64), MIN_TIME)
+    sigma = np.maximum(np.asarray(sigma, dtype=np.float64), 1e-4)
+    is_call = np.asarray(is_call, dtype=bool)
+
+    sqrt_t = np.sqrt(years)
+    discount = np.exp(-rate * years)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d1 = (np.log(spot / strike) + (rate + 0.5 * sigma * sigma) * years) / (sigma * sqrt_t)
+    d2 = d1 - sigma * sqrt_t
+    pdf_d1 = norm_pdf(d1)
+
+    call_price = spot * ndtr(d1) - strike * discount * ndtr(d2)
+    put_price = strike * discount * ndtr(-d2) - spot * ndtr(-d1)
+    price = np.where(is_call, call_price, put_price)
+
+    delta = np.where(is_call, ndtr(d1), ndtr(d1) - 1)
+    gamma = pdf_d1 / (spot * sigma * sqrt_t)
+    decay = -spot * pdf_d1 * sigma / (2 * sqrt_t)
+    theta = np.where(
+        is_call,
+        decay - rate * strike * discount * ndtr(d2),
+        decay + rate * strike * discount * ndtr(-d2),
+    ) / 365.0
+    vega = spot * pdf_d1 * sqrt_t * 0.01
+
+    return {'price': price, 'delta': delta, 'gamma': gamma, 'theta': theta, 'vega': vega}
+
+
+def in_table_units(greeks):
+    """black_scholes results rescaled to the option chain table's units"""
+    return {name: values * TABLE_SCALE[name] for name, values in greeks.items()}
+
+
+def intrinsic_value(spot, strike, is_call):
+    spot = np.asarray(spot, dtype=np.float64)
+    strike = np.asarray(strike, dtype=np.float64)
+    return np.where(is_call, np.maximum(spot - strike, 0), np.maximum(strike - spot, 0))
+
+
+def clean_iv(iv_percent):
+    """Chain IVs (in %) as decimals, with unsolved (zero) IVs replaced by the chain median"""
+    sigma = np.asarray(iv_percent, dtype=np.float64) / 100.0
+    valid = sigma > 0
+    fallback = float(np.median(sigma[valid])) if valid.any() else DEFAULT_IV
+    return np.where(valid, sigma, fallback)
@@ -0,0 +1,112 @@
+# ========== SNAPSHOT RECORDER ==========
+# Keeps intraday chain history for exports. New snapshots are sampled at most
+# once per RECORDER_INTERVAL per chain, packed into one SnapshotRecord row
+# each (all strike columns as one compressed float64 block) and written by a
+# background thread in batches, so request threads never touch the database.
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .snapshot import COLUMN_NAMES
+
+RECORD_FIELDS = ('strike',) + COLUMN_NAMES
+
+# Snapshots waiting for the writer, and when each chain was last sampled
+queue = []
+queue_lock = threading.Condition()
+last_recorded = {}
+writer_thread = None
+last_purge = 0.0
+
+
+def pack(snapshot):
+    block = np.stack([snapshot.strikes] + [snapshot[name] for name in COLUMN_NAMES]).astype(np.float64)
+    return zlib.compress(block.tobytes(), 1)
+
+
+def unpack(record):
+    """(field names, 2-D array shaped (field, strike)) for a SnapshotRecord"""
+    fields = record.fields.split(',')
+    block = np.frombuffer(zlib.decompress(bytes(record.data)), dtype=np.float64)
+    return fields, block.reshape(len(fields), record.strike_count)
+
+
+def submit(snapshot):
+    """Sample a snapshot for recording; cheap, called on request threads"""
+    if not settings.RECORDER_ENABLED or len(snapshot) == 0:
+        return
+    key = (snapshot.symbol, snapshot.expiry)
+    if snapshot.fetched_at - last_recorded.get(key, 0) < settings.RECORDER_INTERVAL:
+        return
+    last_recorded[key] = snapshot.fetched_at
+    with queue_lock:
+        queue.append(snapshot)
+        # Bounded while the database is unavailable: oldest samples go first
+        del queue[:-settings.RECORDER_BATCH_SIZE * 20]
+        if len(queue) >= settings.RECORDER_BATCH_SIZE:
+            queue_lock.notify()
+    ensure_writer()
+
+
+def record_snapshot(snapshot):
+    """Snapshot listener; in cluster mode the leader records from its poll loop instead"""
+    from . import cluster
+    if not cluster.is_enabled():
+        submit(snapshot)
+
+
+def flush():
+    """Write queued snapshots in one bulk insert; returns the number written"""
+    from .models import SnapshotRecord
+
+    with queue_lock:
+        batch = queue[:]
+        queue.clear()
+    if not batch:
+        return 0
+    SnapshotRecord.objects.bulk_create([
+        SnapshotRecord(
+            symbol=snapshot.symbol,
+            expiry=snapshot.expiry,
+            captured_at=datetime.fromtimestamp(snapshot.fetched_at, tz=dt_timezone.utc),
+            spot=snapshot.spot,
+            fields=','.join(RECORD_FIELDS),
+            strike_count=len(snapshot),
+            data=pack(snapshot),
+        )
+        for snapshot in batch
+    ], batch_size=settings.RECORDER_BATCH_SIZE)
+    return len(batch)
+
+
+def purge_expired():
+    from .models import SnapshotRecord
+    cutoff = timezone.now() - timedelta(days=settings.RECORDER_RETENTION_DAYS)
+    SnapshotRecord.objects.filter(captured_at__lt=cutoff).delete()
+
+
+def run_writer():
+    global last_purge
+    while True:
+        with queue_lock:
+            queue_lock.wait(timeout=settings.RECORDER_FLUSH_SECONDS)
+        try:
+            flush()
+            if time.time() - last_purge > 3600:
+                purge_expired()
+                last_purge = time.time()
+        except Exception as e:
+            print(f"Snapshot recorder error: {e}")
+
+
+def ensure_writer():
+    global writer_thread
+    with queue_lock:
+        if writer_thread is None:
+            writer_thread = threading.Thread(target=run_writer, name='snapshot-recorder', daemon=True)
+            writer_thread.start()
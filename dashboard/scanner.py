@@ -0,0 +1,198 @@
+# ========== MARKET-WIDE SCANNER ==========
+# Sweeps the nearest-expiry chain of every symbol in symbol.json on a
+# background thread and publishes a ranked table. Fetches run in a thread
+# pool (they are I/O bound) and go through getLiveSnapshot, so they share the
+# data cache and cluster replication with normal page traffic. They also
+# share the upstream rate limiter, but at low priority: a fetch waits while
+# the limiter is short of headroom and is deferred (its previous row kept)
+# if it stays short. Metrics for all symbols are computed together on padded
+# (symbol x strike) arrays.
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+
+from . import expiry_calendar
+from . import market_hours
+from . import throttle
+
+SORT_FIELDS = ('oi_change', 'call_oi_change', 'put_oi_change', 'pcr', 'atm_iv', 'change_percent', 'max_pain_distance')
+
+# Latest completed sweep; replaced as a whole so readers never see a partial table
+latest_scan = {'rows': [], 'failed': [], 'deferred': [], 'started_at': None, 'finished_at': None, 'duration': None}
+last_requested = 0.0
+
+scanner_thread = None
+scanner_lock = threading.Lock()
+
+
+def scan_symbols():
+    from .data import get_symbol_metadata
+    return sorted(get_symbol_metadata().get('expiry_dates', {}))
+
+
+def fetch_nearest(symbol):
+    """(symbol, snapshot or None, deferred); deferred when user traffic needs the upstream budget"""
+    from .data import getLiveSnapshot
+    # Wait for the limiter to refill above the reserve kept for users; give up
+    # on this sweep if it stays short. Checked before the calendar lookup too,
+    # which may itself go upstream
+    deadline = time.monotonic() + settings.SCANNER_DEFER_SECONDS
+    while throttle.headroom() < settings.SCANNER_HEADROOM:
+        if time.monotonic() > deadline:
+            return symbol, None, True
+        time.sleep(0.25)
+    expiry = expiry_calendar.nearest_expiry(symbol)
+    if not expiry:
+        return symbol, None, False
+    # Scanner loads stay out of the snapshot listeners (recorder, intraday, buildup, alerts)
+    return symbol, getLiveSnapshot(symbol, expiry, settings.SCANNER_STRIKECOUNT, notify=False), False
+
+
+def fetch_nearest_safely(symbol):
+    try:
+        return fetch_nearest(symbol)
+    except Exception as e:
+        print(f"Scanner fetch failed for {symbol}: {e}")
+        return symbol, None, False
+
+
+def pad(snapshots, name):
+    """Stack one column of every snapshot into a (symbol, strike) array, zero padded"""
+    width = max(len(snapshot) for snapshot in snapshots)
+    out = np.zeros((len(snapshots), width))
+    for i, snapshot in enumerate(snapshots):
+        column = snapshot.strikes if name == 'strike' else snapshot[name]
+        out[i, :len(column)] = column
+    return out
+
+
+def compute_metrics(snapshots):
+    """Scanner row for every snapshot"""
+    strikes = pad(snapshots, 'strike')
+    valid = np.zeros(strikes.shape, dtype=bool)
+    for i, snapshot in enumerate(snapshots):
+        valid[i, :len(snapshot)] = True
+    call_oi, put_oi = pad(snapshots, 'call_oi'), pad(snapshots, 'put_oi')
+    call_oich, put_oich = pad(snapshots, 'call_oich'), pad(snapshots, 'put_oich')
+    call_iv, put_iv = pad(snapshots, 'call_iv'), pad(snapshots, 'put_iv')
+    spots = np.array([snapshot.spot for snapshot in snapshots])
+    rows = np.arange(len(snapshots))
+
+    # ATM is the valid strike closest to spot
+    atm = np.where(valid, np.abs(strikes - spots[:, None]), np.inf).argmin(axis=1)
+    atm_ivs = np.stack([call_iv[rows, atm], put_iv[rows, atm]])
+    atm_iv = np.where((atm_ivs > 0).all(axis=0), atm_ivs.mean(axis=0), atm_ivs.max(axis=0))
+
+    # Max pain: expiry strike (among listed ones) minimising total option-writer payout,
+    # payout[s, j] = sum_i call_oi[s,i] * max(K_j - K_i, 0) + put_oi[s,i] * max(K_i - K_j, 0)
+    diff = strikes[:, None, :] - strikes[:, :, None]            # (symbol, expiry strike j, strike i)
+    payout = (call_oi[:, None, :] * np.maximum(-diff, 0) + put_oi[:, None, :] * np.maximum(diff, 0)).sum(axis=2)
+    max_pain = strikes[rows, np.where(valid, payout, np.inf).argmin(axis=1)]
+
+    # Strikes adding the most OI on each side
+    call_leader = strikes[rows, np.where(valid, call_oich, -np.inf).argmax(axis=1)]
+    put_leader = strikes[rows, np.where(valid, put_oich, -np.inf).argmax(axis=1)]
+
+    total_call_oich = call_oich.sum(axis=1)
+    total_put_oich = put_oich.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        max_pain_distance = np.where(spots > 0, (max_pain - spots) / spots * 100, 0)
+
+    result = []
+    for i, snapshot in enumerate(snapshots):
+        result.append({
+            'symbol': snapshot.symbol,
+            'expiry': snapshot.expiry,
+            'spot': snapshot.spot,
+            'change_percent': snapshot.quote_data.get('change_percent', 0),
+            'pcr': snapshot.pcr,
+            'atm_strike': float(strikes[i, atm[i]]),
+            'atm_iv': round(float(atm_iv[i]), 2),
+            'call_oi_change': int(total_call_oich[i]),
+            'put_oi_change': int(total_put_oich[i]),
+            'oi_change': int(total_call_oich[i] + total_put_oich[i]),
+            'call_oi_leader': float(call_leader[i]),
+            'put_oi_leader': float(put_leader[i]),
+            'max_pain': float(max_pain[i]),
+            'max_pain_distance': round(float(max_pain_distance[i]), 2),
+            'version': snapshot.version,
+        })
+    return result
+
+
+def run_sweep():
+    """Fetch every symbol's nearest chain in parallel and publish the metrics table"""
+    global latest_scan
+    started = time.time()
+    previous_rows = {row['symbol']: row for row in latest_scan['rows']}
+    snapshots = []
+    failed = []
+    deferred = []
+    with ThreadPoolExecutor(max_workers=settings.SCANNER_WORKERS, thread_name_prefix='scanner') as pool:
+        for symbol, snapshot, was_deferred in pool.map(fetch_nearest_safely, scan_symbols()):
+            if was_deferred:
+                deferred.append(symbol)
+            elif snapshot is None or len(snapshot) == 0:
+                failed.append(symbol)
+            else:
+                snapshots.append(snapshot)
+
+    # Deferred symbols keep their row from the previous sweep until the next one
+    rows = compute_metrics(snapshots) if snapshots else []
+    rows += [previous_rows[symbol] for symbol in deferred if symbol in previous_rows]
+    finished = time.time()
+    latest_scan = {
+        'rows': rows,
+        'failed': failed,
+        'deferred': deferred,
+        'started_at': started,
+        'finished_at': finished,
+        'duration': round(finished - started, 2),
+    }
+    print(f"Scanner sweep: {len(rows)} chains, {len(failed)} unavailable, {len(deferred)} deferred, {finished - started:.1f}s")
+    return latest_scan
+
+
+def run_scanner():
+    # Sweeps only while someone has looked at the table recently, and after
+    # the close only until one sweep has seen the closing chains
+    while True:
+        started = time.time()
+        if (started - last_requested < settings.SCANNER_IDLE_TIMEOUT
+                and market_hours.needs_refresh(latest_scan['finished_at'] or 0)):
+            try:
+                run_sweep()
+            except Exception as e:
+                print(f"Scanner error: {e}")
+        time.sleep(max(1.0, settings.SCANNER_INTERVAL - (time.time() - started)))
+
+
+def ensure_scanner():
+    global scanner_thread
+    with scanner_lock:
+        if scanner_thread is None:
+            scanner_thread = threading.Thread(target=run_scanner, name='market-scanner', daemon=True)
+            scanner_thread.start()
+
+
+def get_ranked_table(sort='oi_change', descending=True, limit=None):
+    """Latest sweep ranked by one metric; starts the background scanner on first use"""
+    global last_requested
+    last_requested = time.time()
+    ensure_scanner()
+
+    scan = latest_scan
+    rows = sorted(scan['rows'], key=lambda row: row[sort], reverse=descending)
+    if limit:
+        rows = rows[:limit]
+    return {
+        'rows': [dict(row, rank=rank) for rank, row in enumerate(rows, start=1)],
+        'sort': sort,
+        'failed': scan['failed'],
+        'deferred': scan['deferred'],
+        'finished_at': scan['finished_at'],
+        'duration': scan['duration'],
+    }
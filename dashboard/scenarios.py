@@ -0,0 +1,140 @@
+# ========== WHAT-IF SCENARIO GRID ==========
+# Reprices every option in a chain across spot shifts x IV shifts x days
+# forward in one broadcasted Black-Scholes evaluation. Each strike keeps its
+# own implied volatility from the snapshot (calculate_greeks), shifted by the
+# grid's IV offsets. Encoded results are cached per (snapshot version, grid).
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from .pricing import GREEK_UNITS, black_scholes, clean_iv, in_table_units
+
+GRID_FIELDS = ('price', 'delta', 'gamma', 'theta', 'vega')
+GRID_LIMITS = {'spot_steps': 101, 'iv_steps': 41, 'days_steps': 30}
+MAX_GRID_CELLS = 200_000                 # strikes x spot_steps x iv_steps x days_steps
+GRID_CACHE_BYTES = 64 * 1024 * 1024      # encoded payloads kept across all cached grids
+
+# (symbol, expiry, version, strikes, spec, days) -> encoded JSON bytes, least recently used first
+grid_cache = OrderedDict()
+grid_cache_bytes = 0
+grid_cache_lock = threading.Lock()
+
+
+class GridSpecError(ValueError):
+    pass
+
+
+def parse_grid_spec(params):
+    """Read and bound a grid spec from request parameters"""
+    try:
+        spec = {
+            'spot_range': float(params.get('spot_range', 5)),      # +/- percent of spot
+            'spot_steps': int(params.get('spot_steps', 41)),
+            'iv_range': float(params.get('iv_range', 5)),          # +/- volatility points
+            'iv_steps': int(params.get('iv_steps', 11)),
+            'days_forward': int(params.get('days_forward', 4)),    # 0 .. N days ahead
+            'days_steps': int(params.get('days_steps', 5)),
+        }
+    except (TypeError, ValueError):
+        raise GridSpecError('Grid parameters must be numeric')
+
+    fields = tuple(field for field in params.get('fields', ','.join(GRID_FIELDS)).split(',') if field)
+    unknown = [field for field in fields if field not in GRID_FIELDS]
+    if unknown or not fields:
+        raise GridSpecError(f"Unknown fields: {', '.join(unknown) or '(none)'}")
+    spec['fields'] = fields
+
+    for name, limit in GRID_LIMITS.items():
+        if not 1 <= spec[name] <= limit:
+            raise GridSpecError(f"{name} must be between 1 and {limit}")
+    if not 0 <= spec['spot_range'] <= 50 or not 0 <= spec['iv_range'] <= 50 or spec['days_forward'] < 0:
+        raise GridSpecError('Grid ranges out of bounds')
+    return spec
+
+
+def check_grid_size(spec, strike_count):
+    """Reject grids whose cell count would make the payload too large to compute or send"""
+    cells = strike_count * spec['spot_steps'] * spec['iv_steps'] * spec['days_steps']
+    if cells > MAX_GRID_CELLS:
+        raise GridSpecError(f"Grid has {cells:,} cells (strikes x spot_steps x iv_steps x days_steps); "
+                            f"the limit is {MAX_GRID_CELLS:,}. Use fewer steps or strikes")
+
+
+def grid_axes(spec, days_to_expiry):
+    spot_shifts = np.linspace(-spec['spot_range'], spec['spot_range'], spec['spot_steps'])
+    iv_shifts = np.linspace(-spec['iv_range'], spec['iv_range'], spec['iv_steps'])
+    # Days forward cannot pass expiry; the last step prices at expiry itself
+    last_day = min(spec['days_forward'], days_to_expiry)
+    days = np.unique(np.linspace(0, last_day, spec['days_steps']).round(2))
+    return spot_shifts, iv_shifts, days
+
+
+def compute_grid(snapshot, spec, days_to_expiry):
+    """Evaluate the grid; arrays are shaped (leg, strike, spot, iv, day)"""
+    spot_shifts, iv_shifts, days = grid_axes(spec, days_to_expiry)
+
+    strikes = snapshot.strikes
+    base_iv = np.stack([clean_iv(snapshot['call_iv']), clean_iv(snapshot['put_iv'])])        # (2, N)
+    is_call = np.array([True, False])[:, None, None, None, None]                             # (2,1,1,1,1)
+
+    spot = (snapshot.spot * (1 + spot_shifts / 100.0))[None, None, :, None, None]           # (1,1,S,1,1)
+    strike = strikes[None, :, None, None, None]                                              # (1,N,1,1,1)
+    sigma = np.maximum(base_iv[:, :, None, None, None]
+                       + iv_shifts[None, None, None, :, None] / 100.0, 0.005)                # (2,N,1,I,1)
+    years = ((days_to_expiry - days) / 365.0)[None, None, None, None, :]                     # (1,1,1,1,D)
+
+    # Same units as the table, so the zero-shift cells line up with it
+    greeks = in_table_units(black_scholes(spot, strike, years, sigma, is_call))
+    return {
+        'spot_shifts': spot_shifts,
+        'spots': spot.ravel(),
+        'iv_shifts': iv_shifts,
+        'days_forward': days,
+        'values': {field: greeks[field] for field in spec['fields']},
+    }
+
+
+def encode_grid(snapshot, spec, grid):
+    decimals = {'price': 2, 'delta': 4, 'gamma': 4, 'theta': 4, 'vega': 4}
+    legs = {}
+    for index, leg in enumerate(('call', 'put')):
+        legs[leg] = {field: np.round(values[index], decimals[field]).tolist()
+                     for field, values in grid['values'].items()}
+    return json.dumps({
+        'symbol': snapshot.symbol,
+        'expiry': snapshot.expiry,
+        'version': snapshot.version,
+        'spot': snapshot.spot,
+        'strikes': snapshot.strikes.tolist(),
+        'spot_shifts': np.round(grid['spot_shifts'], 4).tolist(),
+        'spots': np.round(grid['spots'], 2).tolist(),
+        'iv_shifts': np.round(grid['iv_shifts'], 4).tolist(),
+        'days_forward': grid['days_forward'].tolist(),
+        'shape': ['strike', 'spot', 'iv', 'day'],
+        'units': {field: GREEK_UNITS[field] for field in grid['values'] if field in GREEK_UNITS},
+        'call': legs['call'],
+        'put': legs['put'],
+    }).encode()
+
+
+def get_scenario_grid(snapshot, spec, days_to_expiry):
+    """Encoded grid for this snapshot version, computed at most once per spec"""
+    global grid_cache_bytes
+    check_grid_size(spec, len(snapshot))
+    key = (snapshot.symbol, snapshot.expiry, snapshot.version, len(snapshot),
+           tuple(sorted((name, value) for name, value in spec.items())), days_to_expiry)
+    with grid_cache_lock:
+        if key in grid_cache:
+            grid_cache.move_to_end(key)
+            return grid_cache[key]
+
+    payload = encode_grid(snapshot, spec, compute_grid(snapshot, spec, days_to_expiry))
+    with grid_cache_lock:
+        if key not in grid_cache:
+            grid_cache[key] = payload
+            grid_cache_bytes += len(payload)
+        while grid_cache_bytes > GRID_CACHE_BYTES and len(grid_cache) > 1:
+            grid_cache_bytes -= len(grid_cache.popitem(last=False)[1])
+    return payload
@@ -0,0 +1,188 @@
+# ========== CHAIN SNAPSHOT ==========
+# One option chain at one instant, stored column-wise: a sorted strike array
+# plus one NumPy array per CE/PE field. Snapshots are never modified after
+# construction; table rows and JSON are produced from them only at the edge.
+import itertools
+import time
+
+import numpy as np
+
+LEG_FIELDS = ('oi', 'oich', 'volume', 'ltp', 'ltpch')
+GREEK_FIELDS = ('iv', 'delta', 'gamma', 'theta', 'vega')
+COLUMN_NAMES = tuple(
+    f"{side}_{field}" for side in ('call', 'put') for field in LEG_FIELDS + GREEK_FIELDS
+)
+
+# Versions key caches (scenario grids, vol-surface fits, intraday series) and
+# travel with replicated snapshots, so they must not repeat after a restart or
+# on another node: start the counter at the wall clock in microseconds.
+version_counter = itertools.count(time.time_ns() // 1000)
+
+
+def next_version():
+    return next(version_counter)
+
+
+def freeze(array):
+    array.flags.writeable = False
+    return array
+
+
+class ChainSnapshot:
+    """Immutable struct-of-arrays option chain for one (symbol, expiry)"""
+
+    def __init__(self, symbol, expiry, strikes, columns, quote_data, lot_size=1,
+                 strikecount=0, expiries=(), version=None, fetched_at=None, option_symbols=None):
+        self.symbol = symbol
+        self.expiry = expiry
+        self.strikes = freeze(np.asarray(strikes, dtype=np.float64))
+        self.columns = {name: freeze(np.asarray(columns[name], dtype=np.float64)) for name in COLUMN_NAMES}
+        # Broker symbols of each strike's legs, e.g. NSE:NIFTY25N2024000CE (used to subscribe ticks)
+        option_symbols = option_symbols or {}
+        self.call_symbols = tuple(option_symbols.get('call') or ('',) * len(self.strikes))
+        self.put_symbols = tuple(option_symbols.get('put') or ('',) * len(self.strikes))
+        self.quote_data = dict(quote_data)
+        self.spot = float(quote_data.get('ltp', 0) or 0)
+        self.lot_size = lot_size or 1
+        self.strikecount = strikecount
+        self.expiries = tuple(expiries)
+        self.version = version if version is not None else next_version()
+        self.fetched_at = fetched_at if fetched_at is not None else time.time()
+
+        total_call_oi = self.columns['call_oi'].sum()
+        total_put_oi = self.columns['put_oi'].sum()
+        self.pcr = round(float(total_put_oi / total_call_oi), 2) if total_call_oi > 0 else 0
+        self._windows = {}
+
+    def __len__(self):
+        return len(self.strikes)
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    # ---------- construction ----------
+    @classmethod
+    def from_option_chain(cls, symbol, expiry, option_data, quote_data, greeks_fn, lot_size=1,
+                          strikecount=0, expiries=()):
+        """Join CE and PE legs on strike price (one dict pass) and compute Greeks per leg
+
+        greeks_fn(strike, option_type, ltp) -> {'iv', 'delta', 'gamma', 'theta', 'vega'}
+        """
+        calls = {}
+        puts = {}
+        for item in option_data:
+            option_type = item.get('option_type')
+            if option_type == 'CE':
+                calls[item.get('strike_price', 0)] = item
+            elif option_type == 'PE':
+                puts[item.get('strike_price', 0)] = item
+
+        strikes = sorted(strike for strike in calls if strike in puts)
+        columns = {name: np.zeros(len(strikes)) for name in COLUMN_NAMES}
+        option_symbols = {
+            'call': [calls[strike].get('symbol', '') for strike in strikes],
+            'put': [puts[strike].get('symbol', '') for strike in strikes],
+        }
+        for i, strike in enumerate(strikes):
+            for side, leg, option_type in (('call', calls[strike], 'CE'), ('put', puts[strike], 'PE')):
+                for field in LEG_FIELDS:
+                    columns[f"{side}_{field}"][i] = leg.get(field, 0) or 0
+                greeks = greeks_fn(strike, option_type, leg.get('ltp', 0))
+                for field in GREEK_FIELDS:
+                    columns[f"{side}_{field}"][i] = greeks[field]
+
+        return cls(symbol, expiry, strikes, columns, quote_data, lot_size=lot_size,
+                   strikecount=strikecount, expiries=expiries, option_symbols=option_symbols)
+
+    # ---------- strike windows ----------
+    def atm_index(self):
+        if len(self.strikes) == 0:
+            return 0
+        return int(np.abs(self.strikes - self.spot).argmin())
+
+    def window(self, strikecount):
+        """The 2 * strikecount + 1 strikes centred on ATM, as a snapshot of array views"""
+        size = 2 * strikecount + 1
+        if len(self.strikes) <= size:
+            return self
+        if strikecount not in self._windows:
+            start = max(0, min(self.atm_index() - strikecount, len(self.strikes) - size))
+            stop = start + size
+            self._windows[strikecount] = ChainSnapshot(
+                self.symbol, self.expiry, self.strikes[start:stop],
+                {name: column[start:stop] for name, column in self.columns.items()},
+                self.quote_data, lot_size=self.lot_size, strikecount=strikecount,
+                expiries=self.expiries, version=self.version, fetched_at=self.fetched_at,
+                option_symbols={'call': self.call_symbols[start:stop], 'put': self.put_symbols[start:stop]}
+            )
+        return self._windows[strikecount]
+
+    # ---------- rendering (edge only) ----------
+    def to_rows(self):
+        """Table rows as the page expects them; percentages are relative to this window"""
+        c = self.columns
+        lot_size = self.lot_size
+
+        def lots(name):
+            return (c[name] // lot_size).astype(np.int64).tolist()
+
+        def percent_of_max(name):
+            peak = c[name].max() if len(c[name]) else 0
+            return np.round(c[name] / (peak or 1) * 100, 2).tolist()
+
+        def plain(name):
+            return c[name].tolist()
+
+        strikes = [int(strike) if strike.is_integer() else strike for strike in self.strikes.tolist()]
+        table = {
+            'CALL_OICH': lots('call_oich'),
+            'CALL_OI': lots('call_oi'),
+            'CALL_PMCOI': percent_of_max('call_oi'),
+            'CALL_VOLUME': lots('call_volume'),
+            'CALL_PMCV': percent_of_max('call_volume'),
+            'CALL_LTPCH': plain('call_ltpch'),
+            'CALL_LTP': plain('call_ltp'),
+            'CALL_IV': plain('call_iv'),
+            'CALL_DELTA': plain('call_delta'),
+            'CALL_GAMMA': plain('call_gamma'),
+            'CALL_THETA': plain('call_theta'),
+            'CALL_VEGA': plain('call_vega'),
+            'STRIKE_PRICE': strikes,
+            'PUT_LTP': plain('put_ltp'),
+            'PUT_LTPCH': plain('put_ltpch'),
+            'PUT_IV': plain('put_iv'),
+            'PUT_DELTA': plain('put_delta'),
+            'PUT_GAMMA': plain('put_gamma'),
+            'PUT_THETA': plain('put_theta'),
+            'PUT_VEGA': plain('put_vega'),
+            'PUT_PMPV': percent_of_max('put_volume'),
+            'PUT_VOLUME': lots('put_volume'),
+            'PUT_PMPOI': percent_of_max('put_oi'),
+            'PUT_OI': lots('put_oi'),
+            'PUT_OICH': lots('put_oich'),
+        }
+        keys = list(table)
+        return [dict(zip(keys, values)) for values in zip(*table.values())]
+
+    # ---------- serialization ----------
+    def to_dict(self):
+        return {
+            'symbol': self.symbol,
+            'expiry': self.expiry,
+            'strikes': self.strikes.tolist(),
+            'columns': {name: column.tolist() for name, column in self.columns.items()},
+            'quote_data': self.quote_data,
+            'lot_size': self.lot_size,
+            'strikecount': self.strikecount,
+            'expiries': list(self.expiries),
+            'version': self.version,
+            'fetched_at': self.fetched_at,
+            'option_symbols': {'call': list(self.call_symbols), 'put': list(self.put_symbols)},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['symbol'], data['expiry'], data['strikes'], data['columns'], data['quote_data'],
+                   lot_size=data.get('lot_size', 1), strikecount=data.get('strikecount', 0),
+                   expiries=data.get('expiries', ()), version=data.get('version'),
+                   fetched_at=data.get('fetched_at'), option_symbols=data.get('option_symbols'))
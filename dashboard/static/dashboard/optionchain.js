@@ -1,23 +1,246 @@
-fetch('/get-optionchain-data/')
-    .then(response => response.json())
-    .then(json => {
-        const container = document.getElementById('optionchain-container');
-        const data = json.data;
+// ========== KEYED OPTION CHAIN RENDERER ==========
+// Rows are keyed by strike price and kept between updates. Each update only
+// touches cells whose text changed, and all DOM writes for an update are
+// batched into a single animation frame.
 
-        let html = '<table><tr>';
-        for (let key in data[0]) {
-            html += `<th>${key}</th>`;
+/**
+ * Format numbers in Indian numbering system (lakhs, crores)
+ * @param {number} value - Number to format
+ * @returns {string} - Formatted string (e.g., 1,23,456)
+ */
+function formatIndianNumber(value) {
+    const num = parseInt(value);
+    return num.toLocaleString('en-IN');
+}
+
+// Column layout matching the table header, left to right
+// format: 'indian' (grouped integer), 'percent' (value + '%'), 'plain'
+// sign: true for columns coloured positive/negative
+const CHAIN_COLUMNS = [
+    { key: 'CALL_OICH', className: 'call-data call-oich', format: 'indian', highlight: true },
+    { key: 'CALL_OI', className: 'call-data call-oi', format: 'indian', highlight: true },
+    { key: 'CALL_PMCOI', className: 'call-data call-pmcoi', format: 'percent', highlight: true },
+    { key: 'CALL_VOLUME', className: 'call-data call-volume', format: 'indian', highlight: true },
+    { key: 'CALL_PMCV', className: 'call-data call-pmcv', format: 'percent', highlight: true },
+    { key: 'CALL_LTPCH', className: 'call-data', format: 'plain', sign: true },
+    { key: 'CALL_IV', className: 'call-data greek-iv', format: 'percent' },
+    { key: 'CALL_GAMMA', className: 'call-data greek-gamma', format: 'plain' },
+    { key: 'CALL_THETA', className: 'call-data greek-theta', format: 'plain' },
+    { key: 'CALL_VEGA', className: 'call-data greek-vega', format: 'plain' },
+    { key: 'CALL_DELTA', className: 'call-data greek-delta', format: 'plain' },
+    { key: 'CALL_LTP', className: 'call-data call-ltp', format: 'plain' },
+    { key: 'STRIKE_PRICE', className: 'strike-price', format: 'plain' },
+    { key: 'PUT_LTP', className: 'put-data put-ltp', format: 'plain' },
+    { key: 'PUT_DELTA', className: 'put-data greek-delta', format: 'plain' },
+    { key: 'PUT_VEGA', className: 'put-data greek-vega', format: 'plain' },
+    { key: 'PUT_THETA', className: 'put-data greek-theta', format: 'plain' },
+    { key: 'PUT_GAMMA', className: 'put-data greek-gamma', format: 'plain' },
+    { key: 'PUT_IV', className: 'put-data greek-iv', format: 'percent' },
+    { key: 'PUT_LTPCH', className: 'put-data', format: 'plain', sign: true },
+    { key: 'PUT_PMPV', className: 'put-data put-pmpv', format: 'percent', highlight: true },
+    { key: 'PUT_VOLUME', className: 'put-data put-volume', format: 'indian', highlight: true },
+    { key: 'PUT_PMPOI', className: 'put-data put-pmpoi', format: 'percent', highlight: true },
+    { key: 'PUT_OI', className: 'put-data put-oi', format: 'indian', highlight: true },
+    { key: 'PUT_OICH', className: 'put-data put-oich', format: 'indian', highlight: true }
+];
+
+function formatChainCell(column, value) {
+    if (column.format === 'indian') return formatIndianNumber(value);
+    if (column.format === 'percent') return `${value}%`;
+    return `${value}`;
+}
+
+class ChainRenderer {
+    /**
+     * @param {HTMLElement} tbody - Table body the chain is rendered into
+     */
+    constructor(tbody) {
+        this.tbody = tbody;
+        this.rows = new Map();        // strike -> {tr, cells, texts, signs}
+        this.maxCells = {};           // column key -> currently highlighted cell
+        this.messageRow = null;       // Loading / error row, replaced by data
+        this.ltpRow = null;           // Persistent LTP marker row
+        this.pending = null;          // Latest update waiting for the next frame
+        this.frame = null;
+    }
+
+    /**
+     * Queue a chain update; only the latest one per animation frame is written
+     * @param {Array} data - Rows from /get-live-data/
+     * @param {number} ltp - Underlying LTP for the marker line
+     */
+    render(data, ltp) {
+        this.pending = { data, ltp };
+        if (this.frame === null) {
+            this.frame = requestAnimationFrame(() => this.flush());
+        }
+    }
+
+    /**
+     * Replace the table with a single message row (loading, errors)
+     * @param {string} text - Message to show
+     * @param {string} color - Optional text colour
+     */
+    showMessage(text, color) {
+        this.cancel();
+        this.tbody.textContent = '';
+        this.rows.clear();
+        this.maxCells = {};
+        this.ltpRow = null;
+        const tr = document.createElement('tr');
+        const td = document.createElement('td');
+        td.colSpan = CHAIN_COLUMNS.length;
+        td.style.cssText = `text-align: center; padding: 20px; color: ${color || '#8b949e'}; font-weight: 600;`;
+        td.textContent = text;
+        tr.appendChild(td);
+        this.tbody.appendChild(tr);
+        this.messageRow = tr;
+    }
+
+    hasRows() {
+        return this.rows.size > 0 || this.messageRow !== null;
+    }
+
+    cancel() {
+        if (this.frame !== null) {
+            cancelAnimationFrame(this.frame);
+            this.frame = null;
         }
-        html += '</tr>';
+        this.pending = null;
+    }
+
+    /**
+     * Apply the pending update to the DOM (normally called from requestAnimationFrame)
+     */
+    flush() {
+        this.frame = null;
+        const update = this.pending;
+        this.pending = null;
+        if (!update) return;
+
+        if (this.messageRow) {
+            this.messageRow.remove();
+            this.messageRow = null;
+        }
+
+        const { data, ltp } = update;
+        const seen = new Set();
+        let cursor = this.tbody.firstChild;
 
         data.forEach(row => {
-            html += '<tr>';
-            for (let key in row) {
-                html += `<td>${row[key]}</td>`;
+            const strike = row.STRIKE_PRICE;
+            seen.add(strike);
+            let entry = this.rows.get(strike);
+            if (!entry) {
+                entry = this.createRow();
+                this.rows.set(strike, entry);
+            }
+            this.updateRow(entry, row);
+
+            // Keep DOM order equal to data order, moving rows only when out of place
+            if (cursor !== null && cursor === this.ltpRow) cursor = cursor.nextSibling;
+            if (entry.tr !== cursor) {
+                this.tbody.insertBefore(entry.tr, cursor);
+            } else {
+                cursor = cursor.nextSibling;
+            }
+        });
+
+        // Drop strikes that left the window
+        this.rows.forEach((entry, strike) => {
+            if (!seen.has(strike)) {
+                entry.tr.remove();
+                this.rows.delete(strike);
+            }
+        });
+
+        this.updateHighlights(data);
+        this.updateLTPLine(ltp, data);
+    }
+
+    createRow() {
+        const tr = document.createElement('tr');
+        const cells = CHAIN_COLUMNS.map(column => {
+            const td = document.createElement('td');
+            td.className = column.className;
+            tr.appendChild(td);
+            return td;
+        });
+        return { tr, cells, texts: new Array(CHAIN_COLUMNS.length), signs: new Array(CHAIN_COLUMNS.length) };
+    }
+
+    updateRow(entry, row) {
+        for (let i = 0; i < CHAIN_COLUMNS.length; i++) {
+            const column = CHAIN_COLUMNS[i];
+            const value = row[column.key];
+            const text = formatChainCell(column, value);
+            if (entry.texts[i] !== text) {
+                entry.cells[i].textContent = text;
+                entry.texts[i] = text;
+            }
+            if (column.sign) {
+                const sign = value >= 0 ? 'positive' : 'negative';
+                if (entry.signs[i] !== sign) {
+                    entry.cells[i].classList.remove(entry.signs[i] || 'negative');
+                    entry.cells[i].classList.add(sign);
+                    entry.signs[i] = sign;
+                }
             }
-            html += '</tr>';
+        }
+    }
+
+    /**
+     * Highlight the maximum of each OI/volume column, computed from data rather than the DOM
+     */
+    updateHighlights(data) {
+        CHAIN_COLUMNS.forEach((column, index) => {
+            if (!column.highlight) return;
+            let maxValue = -Infinity;
+            let maxStrike = null;
+            data.forEach(row => {
+                const value = parseFloat(row[column.key]);
+                if (value > maxValue) {
+                    maxValue = value;
+                    maxStrike = row.STRIKE_PRICE;
+                }
+            });
+            const entry = this.rows.get(maxStrike);
+            const cell = entry ? entry.cells[index] : null;
+            const previous = this.maxCells[column.key];
+            if (previous === cell) return;
+            if (previous) previous.classList.remove('highlight-max');
+            if (cell) cell.classList.add('highlight-max');
+            this.maxCells[column.key] = cell;
         });
+    }
 
-        html += '</table>';
-        container.innerHTML = html;
-    });
+    /**
+     * Place the LTP marker between the two strikes the LTP falls between
+     */
+    updateLTPLine(ltp, data) {
+        const ltpValue = parseFloat(ltp);
+        let after = null;
+        for (let i = 0; i < data.length - 1; i++) {
+            if (ltpValue > parseFloat(data[i].STRIKE_PRICE) && ltpValue < parseFloat(data[i + 1].STRIKE_PRICE)) {
+                after = this.rows.get(data[i].STRIKE_PRICE).tr;
+                break;
+            }
+        }
+        if (!after) {
+            if (this.ltpRow) this.ltpRow.remove();
+            return;
+        }
+        if (!this.ltpRow) {
+            this.ltpRow = document.createElement('tr');
+            this.ltpRow.className = 'ltp-line-row';
+            this.ltpRow.innerHTML = `<td colspan="${CHAIN_COLUMNS.length}" style="padding: 0; position: relative; height: 4px; background: linear-gradient(90deg, #dc2626, #ef4444, #dc2626); border: none; box-shadow: 0 1px 3px rgba(0,0,0,0.3);"><div style="position: absolute; left: 50%; top: -9px; transform: translateX(-50%); background: linear-gradient(135deg, #dc2626 0%, #ef4444 50%, #b91c1c 100%); color: white; padding: 2px 8px; font-size: 9px; font-weight: 600; border-radius: 4px; box-shadow: 0 2px 8px rgba(220, 38, 38, 0.4), 0 1px 3px rgba(0,0,0,0.2); border: 1px solid rgba(255,255,255,0.2); letter-spacing: 0.5px;"></div></td>`;
+            this.ltpLabel = this.ltpRow.querySelector('div');
+        }
+        if (this.ltpLabel.textContent !== `${ltp}`) {
+            this.ltpLabel.textContent = `${ltp}`;
+        }
+        if (after.nextSibling !== this.ltpRow) {
+            after.insertAdjacentElement('afterend', this.ltpRow);
+        }
+    }
+}
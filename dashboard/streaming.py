@@ -0,0 +1,341 @@
+# ========== STREAMING CHAIN INGESTION ==========
+# With STREAMING_MODE set, active chains are loaded once over REST and then
+# kept current from the broker's data socket: each option tick updates that
+# leg's LTP, change and volume (and OI when the feed carries it) and
+# recomputes Greeks for that leg only. Underlying ticks move the spot used by
+# the next leg recalculation. REST is used again only to resync: periodically
+# (OI is not part of the Fyers scrip feed), after a reconnect, or when a
+# wider strike window is requested.
+#
+# Published snapshots stay immutable; a chain that ticked is copied into a
+# new ChainSnapshot the next time it is read.
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .snapshot import COLUMN_NAMES, ChainSnapshot
+
+
+def is_enabled():
+    return getattr(settings, 'STREAMING_MODE', 'off') in SOCKETS
+
+
+# ========== SOCKETS ==========
+class FyersSocket:
+    """fyers_apiv3 data socket; subscriptions are replayed on every (re)connect"""
+
+    def __init__(self, on_message, on_connect):
+        self.on_message = on_message
+        self.on_connect = on_connect
+        self.symbols = set()
+        self.connected = False
+        self.socket = None
+        self.lock = threading.Lock()
+
+    def connect(self):
+        from fyers_apiv3.FyersWebsocket import data_ws
+        from .fyers_auth import client_id, get_valid_access_token
+
+        access_token = get_valid_access_token()
+        if not access_token:
+            return False
+        self.socket = data_ws.FyersDataSocket(
+            access_token=f"{client_id}:{access_token}",
+            litemode=False,
+            reconnect=True,
+            on_message=self.on_message,
+            on_connect=self.handle_connect,
+            on_close=self.handle_close,
+            on_error=lambda message: print(f"Data socket error: {message}"),
+        )
+        self.socket.connect()
+        return True
+
+    def handle_connect(self):
+        with self.lock:
+            self.connected = True
+            symbols = sorted(self.symbols)
+        if symbols:
+            self.socket.subscribe(symbols=symbols, data_type='SymbolUpdate')
+        self.on_connect()
+
+    def handle_close(self, message):
+        self.connected = False
+        print(f"Data socket closed: {message}")
+
+    def subscribe(self, symbols):
+        with self.lock:
+            new = sorted(set(symbols) - self.symbols)
+            self.symbols.update(new)
+        if new and self.connected:
+            self.socket.subscribe(symbols=new, data_type='SymbolUpdate')
+
+    def unsubscribe(self, symbols):
+        with self.lock:
+            gone = sorted(set(symbols) & self.symbols)
+            self.symbols.difference_update(gone)
+        if gone and self.connected:
+            self.socket.unsubscribe(symbols=gone, data_type='SymbolUpdate')
+
+
+class LocalSocket:
+    """In-process stand-in for FyersSocket (development, tests); ticks are pushed by hand"""
+
+    def __init__(self, on_message, on_connect):
+        self.on_message = on_message
+        self.on_connect = on_connect
+        self.symbols = set()
+        self.connected = False
+
+    def connect(self):
+        self.connected = True
+        self.on_connect()
+        return True
+
+    def subscribe(self, symbols):
+        self.symbols.update(symbols)
+
+    def unsubscribe(self, symbols):
+        self.symbols.difference_update(symbols)
+
+    def push(self, message):
+        """Deliver one tick, e.g. {'symbol': ..., 'ltp': ..., 'ch': ..., 'vol_traded_today': ...}"""
+        if message.get('symbol') in self.symbols:
+            self.on_message(message)
+
+    def disconnect(self):
+        self.connected = False
+
+
+SOCKETS = {
+    'fyers': FyersSocket,
+    'local': LocalSocket,
+}
+
+
+# ========== STREAMED CHAINS ==========
+class StreamingChain:
+    """Mutable working copy of one chain, updated in place by ticks"""
+
+    def __init__(self, snapshot, days_to_expiry):
+        self.snapshot = snapshot
+        self.symbol = snapshot.symbol
+        self.expiry = snapshot.expiry
+        self.strikecount = snapshot.strikecount
+        self.days_to_expiry = days_to_expiry
+        self.columns = {name: np.array(snapshot[name]) for name in COLUMN_NAMES}
+        self.quote_data = dict(snapshot.quote_data)
+        # OI change is reported against the previous session's OI
+        self.oi_base = {side: self.columns[f"{side}_oi"] - self.columns[f"{side}_oich"] for side in ('call', 'put')}
+        self.legs = {}
+        for side, symbols in (('call', snapshot.call_symbols), ('put', snapshot.put_symbols)):
+            for row, leg_symbol in enumerate(symbols):
+                if leg_symbol:
+                    self.legs[leg_symbol] = (side, row)
+        self.loaded_at = time.time()
+        self.requested_at = self.loaded_at
+        self.needs_resync = False
+        self.dirty = False
+        self.ticks = 0
+        self.lock = threading.Lock()
+
+    def subscriptions(self):
+        return [self.symbol, *self.legs]
+
+    def apply_underlying(self, tick):
+        with self.lock:
+            ltp = tick.get('ltp')
+            if not ltp:
+                return
+            self.quote_data['ltp'] = ltp
+            if 'ch' in tick:
+                self.quote_data['change_points'] = round(tick['ch'], 2)
+                self.quote_data['prev_close'] = ltp - tick['ch']
+            if 'chp' in tick:
+                self.quote_data['change_percent'] = round(tick['chp'], 2)
+            self.dirty = True
+
+    def apply_option(self, tick):
+        from .data import calculate_greeks
+
+        side, row = self.legs[tick['symbol']]
+        option_type = 'CE' if side == 'call' else 'PE'
+        with self.lock:
+            columns = self.columns
+            if tick.get('ltp') is not None:
+                columns[f"{side}_ltp"][row] = tick['ltp']
+            if tick.get('ch') is not None:
+                columns[f"{side}_ltpch"][row] = tick['ch']
+            if tick.get('vol_traded_today') is not None:
+                columns[f"{side}_volume"][row] = tick['vol_traded_today']
+            if tick.get('OI') is not None:
+                columns[f"{side}_oi"][row] = tick['OI']
+                columns[f"{side}_oich"][row] = tick['OI'] - self.oi_base[side][row]
+            # Greeks for this leg only, at the latest underlying price
+            greeks = calculate_greeks(self.quote_data.get('ltp', 0), self.snapshot.strikes[row],
+                                      self.days_to_expiry, option_type, columns[f"{side}_ltp"][row])
+            for field, value in greeks.items():
+                columns[f"{side}_{field}"][row] = value
+            self.ticks += 1
+            self.dirty = True
+
+    def current(self):
+        """Immutable snapshot of the chain as of the last tick"""
+        with self.lock:
+            if self.dirty:
+                base = self.snapshot
+                self.snapshot = ChainSnapshot(
+                    base.symbol, base.expiry, base.strikes,
+                    {name: column.copy() for name, column in self.columns.items()}, self.quote_data,
+                    lot_size=base.lot_size, strikecount=base.strikecount, expiries=base.expiries,
+                    option_symbols={'call': base.call_symbols, 'put': base.put_symbols},
+                )
+                self.dirty = False
+            return self.snapshot
+
+    def is_synced(self, now):
+        return not self.needs_resync and now - self.loaded_at < settings.STREAMING_RESYNC_SECONDS
+
+
+# (symbol, expiry) -> StreamingChain, and tick symbol -> keys of the chains it feeds.
+# streams_lock guards both maps and is never held across network I/O.
+streams = {}
+routes = {}
+streams_lock = threading.Lock()
+# (symbol, expiry) -> Event set when its in-flight REST load/resync finishes.
+# Readers keep serving the old copy meanwhile; with no usable copy they wait.
+loading = {}
+LOAD_WAIT_SECONDS = 15
+socket = None
+socket_lock = threading.Lock()
+
+
+def handle_tick(message):
+    """Socket callback: route a tick to the chain(s) it belongs to"""
+    tick_symbol = message.get('symbol') if isinstance(message, dict) else None
+    with streams_lock:
+        chains = [streams[key] for key in routes.get(tick_symbol, ()) if key in streams]
+    for chain in chains:
+        try:
+            if chain.symbol == tick_symbol:
+                chain.apply_underlying(message)
+            else:
+                chain.apply_option(message)
+        except Exception as e:
+            print(f"Tick error for {tick_symbol}: {e}")
+
+
+def handle_connect():
+    # Ticks may have been missed while disconnected; resync every chain over REST
+    with streams_lock:
+        chains = list(streams.values())
+    for chain in chains:
+        chain.needs_resync = True
+
+
+def get_socket():
+    global socket
+    with socket_lock:
+        if socket is None:
+            socket = SOCKETS[settings.STREAMING_MODE](handle_tick, handle_connect)
+            try:
+                socket.connect()
+            except Exception as e:
+                print(f"Data socket connect failed: {e}")
+    return socket
+
+
+def unroute(key, tick_symbols):
+    """Detach a chain from tick symbols; returns those no chain needs any more"""
+    unused = []
+    for tick_symbol in tick_symbols:
+        keys = routes.get(tick_symbol, set())
+        keys.discard(key)
+        if not keys:
+            routes.pop(tick_symbol, None)
+            unused.append(tick_symbol)
+    return unused
+
+
+def install_stream(chain):
+    """Add or replace a chain (caller holds streams_lock)
+
+    Returns (subscribe, unsubscribe): only the symbols whose routing changed, so a
+    resync of an unchanged window touches no subscriptions at all.
+    """
+    key = (chain.symbol, chain.expiry)
+    previous = streams.get(key)
+    streams[key] = chain
+    old_symbols = set(previous.subscriptions()) if previous is not None else set()
+    new_symbols = set(chain.subscriptions())
+    added = []
+    for tick_symbol in new_symbols - old_symbols:
+        keys = routes.setdefault(tick_symbol, set())
+        if not keys:
+            added.append(tick_symbol)
+        keys.add(key)
+    return added, unroute(key, old_symbols - new_symbols)
+
+
+def remove_stream(key):
+    """Drop a chain (caller holds streams_lock); returns the symbols to unsubscribe"""
+    chain = streams.pop(key)
+    return unroute(key, chain.subscriptions())
+
+
+def expire_idle(now):
+    """Drop chains nobody has asked for recently (caller holds streams_lock)"""
+    unused = []
+    for key in [key for key, chain in streams.items() if now - chain.requested_at > settings.STREAMING_IDLE_TIMEOUT]:
+        unused += remove_stream(key)
+    return unused
+
+
+def get_chain(symbol, expiry, strikecount):
+    """Streamed chain for a selection, loaded or resynced over REST when needed"""
+    from .data import calculate_days_to_expiry, fetch_chain
+
+    active_socket = get_socket()
+    now = time.time()
+    key = (symbol, expiry)
+    with streams_lock:
+        unused = expire_idle(now)
+        chain = streams.get(key)
+        if chain is not None:
+            chain.requested_at = now
+        fresh = chain is not None and active_socket.connected and chain.is_synced(now) and chain.strikecount >= strikecount
+        # One REST load per chain at a time; meanwhile readers get the streamed copy
+        in_flight = loading.get(key)
+        if fresh or (chain is not None and in_flight is not None and chain.strikecount >= strikecount):
+            current = chain
+        else:
+            current = None
+            if in_flight is None:
+                loading[key] = threading.Event()
+    if unused:
+        active_socket.unsubscribe(unused)
+    if current is not None:
+        return current.current()
+    if in_flight is not None:
+        # First load (or a wider window) already on its way: wait for it, don't repeat it
+        if in_flight.wait(LOAD_WAIT_SECONDS):
+            return get_chain(symbol, expiry, strikecount)
+        return chain.current() if chain is not None else None
+
+    try:
+        snapshot = fetch_chain(symbol, expiry, strikecount)
+        if snapshot is None:
+            return chain.current() if chain is not None else None
+        replacement = StreamingChain(snapshot, calculate_days_to_expiry(expiry))
+        with streams_lock:
+            subscribe, unsubscribe = install_stream(replacement)
+    finally:
+        with streams_lock:
+            loading.pop(key).set()
+    if unsubscribe:
+        active_socket.unsubscribe(unsubscribe)
+    if subscribe:
+        active_socket.subscribe(subscribe)
+    return snapshot
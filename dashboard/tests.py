@@ -1,3 +1,965 @@
-from django.test import TestCase
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from . import alerts, buildup, cluster, data, expiry_calendar, intraday, market_hours, prefetch, scanner, streaming
+from . import export, recorder, volsurface
+from .expiry_calendar import IST
+from .models import AlertEvent, AlertRule, SnapshotRecord
+from .positions import PositionError, evaluate_positions, parse_positions
+from .pricing import RISK_FREE_RATE
+from .scenarios import GridSpecError, check_grid_size, compute_grid, parse_grid_spec
+from .snapshot import COLUMN_NAMES, ChainSnapshot
+
+SYMBOL = 'NSE:NIFTY50-INDEX'
+EXPIRY = '29-12-2026'
+
+
+def make_snapshot(strikes, spot, fetched_at=None, lot_size=1, strikecount=None, expiry=EXPIRY, **columns):
+    """Chain with every column zero except the ones given (arrays aligned to strikes)"""
+    strikes = np.asarray(strikes, dtype=float)
+    values = {name: np.asarray(columns.get(name, np.zeros(len(strikes))), dtype=float) for name in COLUMN_NAMES}
+    return ChainSnapshot(SYMBOL, expiry, strikes, values, {'ltp': spot}, lot_size=lot_size,
+                         strikecount=len(strikes) // 2 if strikecount is None else strikecount,
+                         fetched_at=fetched_at)
+
+
+class FakeFyers:
+    """optionchain() over strikes 50 apart around spot; counts upstream calls"""
+
+    def __init__(self, spot=24010.0):
+        self.spot = spot
+        self.requests = []
+
+    def optionchain(self, data):
+        self.requests.append(data['strikecount'])
+        atm = round(self.spot / 50) * 50
+        chain = [{'symbol': data['symbol'], 'ltp': self.spot, 'ltpch': 12.5, 'ltpchp': 0.05}]
+        for offset in range(-data['strikecount'], data['strikecount'] + 1):
+            strike = atm + 50 * offset
+            for option_type in ('CE', 'PE'):
+                chain.append({'symbol': f"NSE:NIFTY26D{strike}{option_type}", 'option_type': option_type,
+                              'strike_price': strike, 'ltp': 100.0, 'ltpch': 1.0, 'oi': 75000,
+                              'oich': 750, 'volume': 7500})
+        return {'code': 200, 'data': {'optionsChain': chain, 'expiryData': [{'date': EXPIRY}]}}
+
+
+class UpstreamTestCase(SimpleTestCase):
+    """Serves chains from FakeFyers with a clean cache and no snapshot listeners"""
+
+    def setUp(self):
+        self.fyers = FakeFyers()
+        for patcher in (
+            mock.patch.object(data, 'fyers', self.fyers),
+            mock.patch.object(data, 'get_lot_size', return_value=75),
+            mock.patch.object(data, 'snapshot_listeners', []),
+            mock.patch.dict(data.data_cache, clear=True),
+            mock.patch.dict(data.active_strike_windows, clear=True),
+            mock.patch('dashboard.expiry_calendar.validate_expiry', return_value=None),
+            mock.patch('dashboard.expiry_calendar.learn_expiries'),
+            mock.patch('dashboard.market_hours.cache_is_fresh', return_value=True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+# ========== CHAIN SNAPSHOT ==========
+class ChainSnapshotTests(SimpleTestCase):
+
+    def leg(self, strike, option_type, **fields):
+        return {'strike_price': strike, 'option_type': option_type,
+                'symbol': f"NSE:NIFTY26D{strike}{option_type}", **fields}
+
+    def test_legs_are_joined_on_strike(self):
+        option_data = [
+            self.leg(24050, 'CE', oi=50), self.leg(24100, 'PE', oi=400, ltp=130),
+            self.leg(24000, 'CE', oi=100, ltp=60), self.leg(24100, 'CE', oi=200, ltp=20),
+            self.leg(24000, 'PE', oi=300, ltp=40), self.leg(23950, 'PE', oi=10),
+            {'strike_price': -1, 'option_type': '', 'ltp': 24010},
+        ]
+        greeks = {'iv': 15.0, 'delta': 0.5, 'gamma': 0.1, 'theta': -1.0, 'vega': 2.0}
+        snapshot = ChainSnapshot.from_option_chain(SYMBOL, EXPIRY, option_data, {'ltp': 24010},
+                                                   lambda strike, option_type, ltp: greeks)
+        self.assertEqual(snapshot.strikes.tolist(), [24000, 24100])
+        self.assertEqual(snapshot['call_oi'].tolist(), [100, 200])
+        self.assertEqual(snapshot['put_ltp'].tolist(), [40, 130])
+        self.assertEqual(snapshot['put_iv'].tolist(), [15, 15])
+        self.assertEqual(snapshot.call_symbols, ('NSE:NIFTY26D24000CE', 'NSE:NIFTY26D24100CE'))
+        self.assertEqual(snapshot.pcr, 2.33)
+
+    def test_columns_are_read_only(self):
+        snapshot = make_snapshot([24000, 24050], 24010, call_oi=[100, 200])
+        with self.assertRaises(ValueError):
+            snapshot['call_oi'][0] = 0
+        with self.assertRaises(ValueError):
+            snapshot.window(0).strikes[0] = 0
+
+    def test_rows_are_in_lots_and_percent_of_the_window_max(self):
+        rows = make_snapshot([24000, 24050.5], 24010, lot_size=75, call_oi=[150, 300], put_volume=[75, 0]).to_rows()
+        self.assertEqual([row['STRIKE_PRICE'] for row in rows], [24000, 24050.5])
+        self.assertIsInstance(rows[0]['STRIKE_PRICE'], int)
+        self.assertEqual([row['CALL_OI'] for row in rows], [2, 4])
+        self.assertEqual([row['CALL_PMCOI'] for row in rows], [50.0, 100.0])
+        self.assertEqual([row['PUT_PMPV'] for row in rows], [100.0, 0.0])
+
+    def test_dict_round_trip_keeps_identity(self):
+        snapshot = make_snapshot([24000, 24050], 24010, fetched_at=1_800_000_000.5, lot_size=75,
+                                 call_oi=[100, 200], put_iv=[14.5, 15.25])
+        copy = ChainSnapshot.from_dict(json.loads(json.dumps(snapshot.to_dict())))
+        self.assertEqual((copy.version, copy.fetched_at, copy.lot_size), (snapshot.version, 1_800_000_000.5, 75))
+        for name in COLUMN_NAMES:
+            np.testing.assert_array_equal(copy[name], snapshot[name])
+        self.assertEqual(copy.to_rows(), snapshot.to_rows())
+
+
+# ========== STRIKE WINDOWS ==========
+class StrikeWindowTests(UpstreamTestCase):
+
+    def test_smaller_window_reuses_superset(self):
+        wide = data.getLiveSnapshot(SYMBOL, EXPIRY, 10)
+        narrow = data.getLiveSnapshot(SYMBOL, EXPIRY, 3)
+        self.assertEqual(self.fyers.requests, [10])
+        self.assertEqual(len(wide), 21)
+        self.assertEqual(len(narrow), 7)
+        self.assertEqual(narrow.version, wide.version)
+
+    def test_wider_window_refetches(self):
+        data.getLiveSnapshot(SYMBOL, EXPIRY, 5)
+        wide = data.getLiveSnapshot(SYMBOL, EXPIRY, 15)
+        data.getLiveSnapshot(SYMBOL, EXPIRY, 5)
+        self.assertEqual(self.fyers.requests, [5, 15])
+        self.assertEqual(len(wide), 31)
+
+    def test_window_is_centred_on_atm(self):
+        snapshot = make_snapshot(np.arange(23000, 25050, 50), spot=24010)
+        view = snapshot.window(2)
+        self.assertEqual(view.strikes.tolist(), [23900, 23950, 24000, 24050, 24100])
+        self.assertIs(snapshot.window(2), view)
+
+    def test_window_at_chain_edge_keeps_its_size(self):
+        snapshot = make_snapshot(np.arange(23000, 25050, 50), spot=22000)
+        self.assertEqual(snapshot.window(2).strikes.tolist(), [23000, 23050, 23100, 23150, 23200])
+
+    def test_strikecount_parameter_is_clamped(self):
+        self.assertEqual(data.parse_strikecount(None), 10)
+        self.assertEqual(data.parse_strikecount(''), 10)
+        self.assertEqual(data.parse_strikecount('0'), 1)
+        self.assertEqual(data.parse_strikecount('500'), data.MAX_STRIKECOUNT)
+        with self.assertRaises(ValueError):
+            data.parse_strikecount('ten')
+
+
+# ========== STREAMING ==========
+@override_settings(STREAMING_MODE='local', STREAMING_RESYNC_SECONDS=600, STREAMING_IDLE_TIMEOUT=600)
+class StreamingTests(UpstreamTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for patcher in (
+            mock.patch.object(streaming, 'socket', None),
+            mock.patch.dict(streaming.streams, clear=True),
+            mock.patch.dict(streaming.routes, clear=True),
+            mock.patch.dict(streaming.loading, clear=True),
+            # Past the server cache, so every read goes to the streamed chain
+            mock.patch('dashboard.market_hours.cache_is_fresh', return_value=False),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_tick_updates_row(self):
+        loaded = data.getLiveSnapshot(SYMBOL, EXPIRY, 2)
+        row = loaded.atm_index()
+        streaming.socket.push({'symbol': loaded.call_symbols[row], 'ltp': 180.5, 'ch': 80.5,
+                               'vol_traded_today': 15000})
+
+        rows = data.getLiveSnapshot(SYMBOL, EXPIRY, 2).to_rows()
+        self.assertEqual(self.fyers.requests, [2])
+        self.assertEqual(rows[row]['CALL_LTP'], 180.5)
+        self.assertEqual(rows[row]['CALL_LTPCH'], 80.5)
+        self.assertEqual(rows[row]['CALL_VOLUME'], 15000 // 75)
+        self.assertEqual(rows[row]['PUT_LTP'], 100.0)
+        self.assertEqual(rows[row - 1]['CALL_LTP'], 100.0)
+
+    def test_concurrent_first_loads_share_one_fetch(self):
+        fetch_chain = data.fetch_chain
+        started = threading.Event()
+
+        def slow_fetch(*args):
+            started.set()
+            time.sleep(0.2)
+            return fetch_chain(*args)
+
+        results = []
+        with mock.patch.object(data, 'fetch_chain', side_effect=slow_fetch):
+            first = threading.Thread(target=lambda: results.append(streaming.get_chain(SYMBOL, EXPIRY, 2)))
+            first.start()
+            started.wait(5)
+            others = [threading.Thread(target=lambda: results.append(streaming.get_chain(SYMBOL, EXPIRY, 2)))
+                      for _ in range(3)]
+            for thread in others:
+                thread.start()
+            for thread in [first] + others:
+                thread.join(5)
+        self.assertEqual(self.fyers.requests, [2])
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(result is not None and len(result) == 5 for result in results))
+
+    def test_unsubscribed_tick_is_ignored(self):
+        before = data.getLiveSnapshot(SYMBOL, EXPIRY, 2)
+        streaming.socket.push({'symbol': 'NSE:OTHER26D100CE', 'ltp': 1.0})
+        self.assertIs(data.getLiveSnapshot(SYMBOL, EXPIRY, 2), before)
+
+
+# ========== ALERTS ==========
+class AlertTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('trader')
+        for patcher in (
+            mock.patch.dict(alerts.last_seen, clear=True),
+            mock.patch.dict(alerts.history, clear=True),
+            mock.patch.dict(alerts.cooldowns, clear=True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        alerts.invalidate()
+
+    def add_rule(self, **fields):
+        rule = AlertRule.objects.create(user=self.user, symbol=SYMBOL, **fields)
+        alerts.invalidate()
+        return rule
+
+    def chain(self, call_ltp):
+        return make_snapshot([23950, 24000, 24050], spot=24010, call_ltp=[150, call_ltp, 80])
+
+    def test_cross_fires_on_the_edge_only(self):
+        self.add_rule(field='call_ltp', strike=24000, condition='crosses_above', threshold=120, repeat=True)
+        now = 1_000_000.0
+        self.assertEqual(alerts.evaluate_snapshot(self.chain(110), now), [])
+        self.assertEqual(len(alerts.evaluate_snapshot(self.chain(125), now + 1)), 1)
+        # Still above the threshold, but no new crossing
+        self.assertEqual(alerts.evaluate_snapshot(self.chain(130), now + 2), [])
+
+    def test_one_shot_rule_fires_once(self):
+        rule = self.add_rule(field='call_ltp', strike=24000, condition='above', threshold=120)
+        self.assertEqual(len(alerts.evaluate_snapshot(self.chain(125), 1_000_000.0)), 1)
+        self.assertEqual(alerts.evaluate_snapshot(self.chain(130), 1_000_001.0), [])
+        rule.refresh_from_db()
+        self.assertFalse(rule.active)
+
+    def test_deliver_claims_each_rule_once(self):
+        rule = self.add_rule(field='spot', condition='above', threshold=24000, repeat=True)
+        fired = [(rule.pk, self.user.pk, True, 'spot above', 24010.0, None)]
+        alerts.deliver(fired, 1_000_000.0)
+        # Another process evaluating the same snapshot loses the claim
+        alerts.deliver(fired, 1_000_000.0)
+        self.assertEqual(AlertEvent.objects.filter(rule=rule).count(), 1)
+
+    def test_repeating_rule_fires_again_after_cooldown(self):
+        rule = self.add_rule(field='spot', condition='above', threshold=24000, repeat=True)
+        fired = [(rule.pk, self.user.pk, True, 'spot above', 24010.0, None)]
+        alerts.deliver(fired, 1_000_000.0)
+        AlertRule.objects.filter(pk=rule.pk).update(last_triggered_at=timezone.now() - timedelta(hours=1))
+        alerts.deliver(fired, 1_000_000.0)
+        self.assertEqual(AlertEvent.objects.filter(rule=rule).count(), 2)
+
+
+class RuleParsingTests(SimpleTestCase):
+
+    def setUp(self):
+        metadata = {'expiry_dates': {SYMBOL: [EXPIRY]}, 'lot_sizes': {SYMBOL: 75}}
+        for patcher in (
+            mock.patch.dict(expiry_calendar.expiry_calendars, clear=True),
+            mock.patch('dashboard.data.get_symbol_metadata', return_value=metadata),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def rule(self, **fields):
+        return {'symbol': SYMBOL, 'field': 'call_oi', 'strike': 24000, 'condition': 'above',
+                'threshold': 1000, **fields}
+
+    def test_accepts_listed_and_blank_expiries(self):
+        self.assertEqual(alerts.parse_rule(self.rule(expiry=EXPIRY))['expiry'], EXPIRY)
+        self.assertEqual(alerts.parse_rule(self.rule())['expiry'], '')
+
+    def test_rejects_bad_rules(self):
+        for body in (
+            self.rule(expiry='2026-12-29'),
+            self.rule(expiry='01-01-2020'),
+            self.rule(symbol='NSE:MADEUP-EQ'),
+            self.rule(field='rho'),
+            self.rule(condition='near'),
+            self.rule(field='pcr'),
+            self.rule(threshold='high'),
+            self.rule(condition='grows_pct', window_minutes=90),
+        ):
+            with self.subTest(body=body), self.assertRaises(alerts.RuleError):
+                alerts.parse_rule(body)
+
+
+# ========== ROLLING BUILDUP ==========
+@override_settings(BUILDUP_WINDOWS='5', BUILDUP_STEP_SECONDS=60)
+class BuildupTests(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.dict(buildup.histories, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.start = IST.localize(datetime(2026, 10, 19, 10, 0)).timestamp()
+
+    def observe(self, minute, call_oi, call_ltp=100, start=None):
+        snapshot = make_snapshot([24000, 24050], spot=24010, fetched_at=(start or self.start) + minute * 60,
+                                 lot_size=75, call_oi=[call_oi, 0], call_ltp=[call_ltp, 0])
+        buildup.observe_snapshot(snapshot)
+        return snapshot
+
+    def rows(self, snapshot):
+        return buildup.add_columns(snapshot, snapshot.to_rows())
+
+    def test_ring_rolls_over(self):
+        # Six slots for a five minute window; twenty minutes wraps the ring three times
+        for minute in range(20):
+            snapshot = self.observe(minute, call_oi=7500 * minute, call_ltp=100 + minute)
+        row = self.rows(snapshot)[0]
+        self.assertEqual(buildup.histories[(SYMBOL, EXPIRY)].samples.shape[0], 6)
+        self.assertEqual(row['CALL_OICH_5M'], 7500 * 5 // 75)
+        self.assertEqual(row['CALL_BUILDUP_5M'], buildup.LONG_BUILDUP)
+
+    def test_window_needs_enough_history(self):
+        for minute in range(3):
+            snapshot = self.observe(minute, call_oi=7500 * minute)
+        self.assertIsNone(self.rows(snapshot)[0]['CALL_OICH_5M'])
+
+    def test_new_strike_has_no_change_yet(self):
+        for minute in range(10):
+            self.observe(minute, call_oi=7500 * minute)
+        snapshot = make_snapshot([24000, 24050, 24100], spot=24010, fetched_at=self.start + 600, lot_size=75,
+                                 call_oi=[75000, 0, 7500], call_ltp=[100, 0, 50])
+        buildup.observe_snapshot(snapshot)
+        changes = [row['CALL_OICH_5M'] for row in self.rows(snapshot)]
+        self.assertEqual(changes, [(75000 - 7500 * 5) // 75, 0, None])
+        self.assertIsInstance(changes[0], int)
+
+    def test_new_day_starts_empty(self):
+        for minute in range(10):
+            self.observe(minute, call_oi=7500 * minute)
+        snapshot = self.observe(0, call_oi=75000, start=self.start + 86400)
+        history = buildup.histories[(SYMBOL, EXPIRY)]
+        self.assertEqual(len(history.columns), 2)
+        self.assertIsNone(self.rows(snapshot)[0]['CALL_OICH_5M'])
+
+
+# ========== INTRADAY DOWNSAMPLING ==========
+class DownsampleTests(SimpleTestCase):
+
+    def setUp(self):
+        generator = np.random.default_rng(7)
+        self.times = np.arange(10000, dtype=float)
+        self.values = np.cumsum(generator.normal(size=(3, 10000)), axis=1)
+
+    def test_lttb_keeps_endpoints(self):
+        indices = intraday.lttb_indices(self.times, self.values, 200)
+        self.assertEqual(indices.shape, (3, 200))
+        self.assertTrue((indices[:, 0] == 0).all())
+        self.assertTrue((indices[:, -1] == 9999).all())
+        self.assertTrue((np.diff(indices, axis=1) > 0).all())
+
+    def test_lttb_keeps_a_spike(self):
+        self.values[1, 4321] = 1e6
+        indices = intraday.lttb_indices(self.times, self.values, 100)
+        self.assertIn(4321, indices[1].tolist())
+
+    def test_short_series_is_returned_whole(self):
+        indices = intraday.lttb_indices(self.times[:50], self.values[:, :50], 200)
+        self.assertEqual(indices[0].tolist(), list(range(50)))
+
+    def test_minmax_keeps_extremes(self):
+        indices = intraday.minmax_indices(self.values, 100)
+        self.assertEqual(indices.shape, (3, 100))
+        for series, kept in zip(self.values, indices):
+            self.assertIn(int(series.argmax()), kept.tolist())
+            self.assertIn(int(series.argmin()), kept.tolist())
+
+
+@override_settings(INTRADAY_CAPACITY=100, INTRADAY_STEP_SECONDS=60, INTRADAY_DEFAULT_POINTS=500,
+                   DEFAULT_STRIKECOUNT=10)
+class IntradaySeriesTests(SimpleTestCase):
+
+    def setUp(self):
+        for patcher in (
+            mock.patch.dict(intraday.series, clear=True),
+            mock.patch.dict(intraday.downsampled, clear=True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.start = IST.localize(datetime(2026, 10, 19, 10, 0)).timestamp()
+
+    def test_ring_keeps_the_newest_rows_in_order(self):
+        ring = intraday.RingSeries(4)
+        for second in range(6):
+            ring.append(second, [second] * len(intraday.SERIES_FIELDS))
+        times, values = ring.ordered()
+        self.assertEqual(times.tolist(), [2, 3, 4, 5])
+        self.assertEqual(values[0].tolist(), [2, 3, 4, 5])
+        self.assertEqual(ring.last_time, 5)
+
+    def test_samples_are_spaced_and_cached_per_version(self):
+        for seconds in (0, 30, 60):
+            intraday.record_snapshot(make_snapshot([24000], 24010 + seconds, fetched_at=self.start + seconds))
+        series = intraday.get_series(SYMBOL, EXPIRY, 'lttb', 100)
+        self.assertEqual(series['samples'], 2)
+        self.assertEqual(series['series']['ltp']['v'], [24010, 24070])
+        self.assertIs(intraday.get_series(SYMBOL, EXPIRY, 'lttb', 100), series)
+        intraday.record_snapshot(make_snapshot([24000], 24200, fetched_at=self.start + 120))
+        self.assertEqual(intraday.get_series(SYMBOL, EXPIRY, 'lttb', 100)['samples'], 3)
+        self.assertIsNone(intraday.get_series(SYMBOL, '05-01-2027', 'lttb', 100))
+
+    def test_request_validation(self):
+        self.assertEqual(intraday.parse_series_request({}), ('lttb', 500))
+        self.assertEqual(intraday.parse_series_request({'method': 'MINMAX', 'points': '50'}), ('minmax', 50))
+        for params in ({'method': 'mean'}, {'points': 'lots'}, {'points': '2'}, {'points': '5001'}):
+            with self.subTest(params=params), self.assertRaises(intraday.SeriesError):
+                intraday.parse_series_request(params)
+
+
+# ========== REQUEST PARSING ==========
+class GridSpecTests(SimpleTestCase):
+
+    def test_defaults(self):
+        spec = parse_grid_spec({})
+        self.assertEqual(spec['spot_steps'], 41)
+        self.assertEqual(spec['fields'], ('price', 'delta', 'gamma', 'theta', 'vega'))
+
+    def test_rejects_bad_specs(self):
+        for params in (
+            {'spot_steps': 'many'},
+            {'spot_steps': '0'},
+            {'iv_steps': '42'},
+            {'days_steps': '31'},
+            {'spot_range': '51'},
+            {'iv_range': '-1'},
+            {'days_forward': '-1'},
+            {'fields': 'price,rho'},
+            {'fields': ','},
+        ):
+            with self.subTest(params=params), self.assertRaises(GridSpecError):
+                parse_grid_spec(params)
+
+    def test_rejects_oversized_grid(self):
+        spec = parse_grid_spec({'spot_steps': '101', 'iv_steps': '41', 'days_steps': '30'})
+        with self.assertRaises(GridSpecError):
+            check_grid_size(spec, 101)
+        check_grid_size(parse_grid_spec({}), 21)
+
+
+class GridUnitTests(SimpleTestCase):
+
+    def test_unshifted_grid_matches_the_table(self):
+        strikes, spot, days = [23800, 24000, 24200], 24010.0, 10
+        columns = {}
+        for side, option_type in (('call', 'CE'), ('put', 'PE')):
+            ltp = [max(spot - k, 0) + 60 if side == 'call' else max(k - spot, 0) + 60 for k in strikes]
+            table = [data.calculate_greeks(spot, strike, days, option_type, price) for strike, price in zip(strikes, ltp)]
+            columns[f"{side}_ltp"] = ltp
+            for field in ('iv', 'delta', 'gamma', 'theta', 'vega'):
+                columns[f"{side}_{field}"] = [greeks[field] for greeks in table]
+        snapshot = make_snapshot(strikes, spot, **columns)
+        spec = parse_grid_spec({'spot_range': '0', 'spot_steps': '1', 'iv_range': '0', 'iv_steps': '1',
+                                'days_forward': '0', 'days_steps': '1'})
+        grid = compute_grid(snapshot, spec, days)
+        for index, side in enumerate(('call', 'put')):
+            for field in ('delta', 'gamma', 'theta', 'vega'):
+                np.testing.assert_allclose(grid['values'][field][index].ravel(), snapshot[f"{side}_{field}"],
+                                           atol=0.011, err_msg=f"{side} {field}")
+
+
+class PositionGreekTests(SimpleTestCase):
+
+    def test_position_greeks_are_lots_times_the_table(self):
+        spot, days = 24010.0, 10
+        table = data.calculate_greeks(spot, 24000, days, 'CE', 120.0)
+        snapshot = make_snapshot([24000], spot, call_ltp=[120.0], call_iv=[table['iv']])
+        _, results = evaluate_positions(snapshot, parse_positions({'legs': [
+            {'strike': 24000, 'option_type': 'CE', 'side': 'buy', 'lots': 2}]}), 75, days)
+        for field in ('delta', 'gamma', 'theta', 'vega'):
+            self.assertAlmostEqual(results[0]['greeks'][field] / 150, table[field], delta=0.011, msg=field)
+
+
+class PositionParsingTests(SimpleTestCase):
+
+    def leg(self, **fields):
+        return {'strike': 24000, 'option_type': 'CE', 'side': 'buy', 'lots': 1, **fields}
+
+    def test_single_and_multiple_positions(self):
+        self.assertEqual(len(parse_positions({'legs': [self.leg()]})), 1)
+        positions = parse_positions({'positions': [{'legs': [self.leg()]}, {'legs': [self.leg(side='sell')]}]})
+        self.assertEqual([legs[0]['side'] for legs in positions], ['buy', 'sell'])
+
+    def test_rejects_bad_positions(self):
+        for body in (
+            {'positions': []},
+            {'legs': []},
+            {'positions': [{'legs': [self.leg()]}, {'legs': []}]},
+            {'legs': [self.leg(option_type='XX')]},
+            {'legs': [self.leg(side='hold')]},
+            {'legs': [self.leg(lots=0)]},
+            {'legs': [self.leg(lots='two')]},
+            {'legs': [{'option_type': 'CE', 'side': 'buy'}]},
+            {'legs': [self.leg()] * 201},
+        ):
+            with self.subTest(body=body), self.assertRaises(PositionError):
+                parse_positions(body)
+
+
+# ========== CLUSTER ==========
+class LeaseTests(SimpleTestCase):
+
+    def test_lease_passes_on_only_after_it_lapses(self):
+        broker = cluster.LocalBroker()
+        with mock.patch('dashboard.cluster.time.time', return_value=1000.0):
+            self.assertTrue(broker.try_acquire_lease('a', 10))
+            self.assertFalse(broker.try_acquire_lease('b', 10))
+            self.assertTrue(broker.try_acquire_lease('a', 10))
+        with mock.patch('dashboard.cluster.time.time', return_value=1011.0):
+            self.assertTrue(broker.try_acquire_lease('b', 10))
+            self.assertFalse(broker.try_acquire_lease('a', 10))
+
+    def test_viewers_are_the_most_any_node_reported(self):
+        broker = cluster.LocalBroker()
+        self.assertEqual(broker.request_chain(SYMBOL, EXPIRY, 10, 3)[2], 3)
+        self.assertEqual(broker.request_chain(SYMBOL, EXPIRY, 10, 1)[2], 3)
+        self.assertEqual(broker.demanded_chains(60), [(SYMBOL, EXPIRY, 10, 3)])
+
+
+@override_settings(CLUSTER_LEASE_SECONDS=10, CLUSTER_DEMAND_TTL=60)
+class LeaderPollTests(SimpleTestCase):
+
+    def setUp(self):
+        self.broker = cluster.LocalBroker()
+        for expiry in ('29-12-2026', '05-01-2027', '12-01-2027'):
+            self.broker.request_chain(SYMBOL, expiry, 5, 1)
+        for patcher in (
+            mock.patch.object(cluster, 'broker', self.broker),
+            mock.patch.dict(cluster.last_fetched, clear=True),
+            mock.patch.object(cluster, 'is_leader', False),
+            mock.patch('dashboard.market_hours.is_open', return_value=False),
+            mock.patch('dashboard.market_hours.needs_refresh', return_value=True),
+            mock.patch('dashboard.recorder.submit'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_leader_publishes_every_demanded_chain(self):
+        with mock.patch('dashboard.data.load_chain', return_value=make_snapshot([24000], 24010)):
+            self.assertEqual(cluster.poll_once(), 3)
+        self.assertTrue(cluster.is_leader)
+
+    def test_leader_stops_when_the_lease_is_taken_mid_pass(self):
+        def slow_fetch(symbol, expiry, strikecount):
+            # The fetch outlasted the lease and another node took over
+            self.broker.lease = ('other-node', float('inf'))
+            return make_snapshot([24000], 24010)
+
+        with mock.patch('dashboard.data.load_chain', side_effect=slow_fetch) as load_chain:
+            self.assertEqual(cluster.poll_once(), 1)
+        self.assertEqual(load_chain.call_count, 1)
+        self.assertFalse(cluster.is_leader)
+
+    def test_follower_does_not_poll(self):
+        self.broker.lease = ('other-node', float('inf'))
+        with mock.patch('dashboard.data.load_chain') as load_chain:
+            self.assertEqual(cluster.poll_once(), 0)
+        load_chain.assert_not_called()
+
+
+# ========== PREFETCH ==========
+@override_settings(PREFETCH_MAX_AGE=20)
+class PrefetchClaimTests(SimpleTestCase):
+
+    def setUp(self):
+        for patcher in (
+            mock.patch.dict(prefetch.warm, clear=True),
+            mock.patch.dict(prefetch.claimed, clear=True),
+            mock.patch('dashboard.market_hours.is_open', return_value=True),
+            mock.patch('dashboard.market_hours.cache_ttl', return_value=5.0),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def warm(self, age, strikecount=10):
+        snapshot = make_snapshot([24000], 24010, fetched_at=time.time() - age, strikecount=strikecount)
+        prefetch.warm[(SYMBOL, EXPIRY)] = {'snapshot': snapshot, 'seconds': 0.4}
+        return snapshot
+
+    def test_claim_hands_over_a_fresh_chain_once(self):
+        snapshot = self.warm(age=1)
+        self.assertIs(prefetch.claim(SYMBOL, EXPIRY, 10), snapshot)
+        self.assertIsNone(prefetch.claim(SYMBOL, EXPIRY, 10))
+
+    def test_claim_is_limited_to_the_cache_ttl_in_session(self):
+        self.warm(age=8)
+        self.assertIsNone(prefetch.claim(SYMBOL, EXPIRY, 10))
+
+    def test_claim_needs_a_wide_enough_window(self):
+        self.warm(age=1, strikecount=5)
+        self.assertIsNone(prefetch.claim(SYMBOL, EXPIRY, 10))
+
+    def test_claim_skips_chains_older_than_the_cached_one(self):
+        snapshot = self.warm(age=1)
+        self.assertIsNone(prefetch.claim(SYMBOL, EXPIRY, 10, newer_than=snapshot.fetched_at))
+
+
+class PrefetchServeTests(UpstreamTestCase):
+
+    def test_claimed_chain_is_cached_from_its_fetch_time(self):
+        snapshot = make_snapshot([24000], 24010, fetched_at=time.time() - 3, strikecount=10)
+        with mock.patch.object(prefetch, 'claim', return_value=snapshot):
+            self.assertIs(data.getLiveSnapshot(SYMBOL, EXPIRY, 10), snapshot)
+        self.assertEqual(self.fyers.requests, [])
+        self.assertEqual(data.data_cache[f"{SYMBOL}_{EXPIRY}"]['timestamp'], snapshot.fetched_at)
+
+
+# ========== EXPIRY CALENDAR ==========
+class ExpiryCalendarTests(SimpleTestCase):
+
+    def setUp(self):
+        metadata = {'expiry_dates': {SYMBOL: ['30-12-2026', '29-12-2026']}, 'lot_sizes': {SYMBOL: 75}}
+        for patcher in (
+            mock.patch.dict(expiry_calendar.expiry_calendars, clear=True),
+            mock.patch('dashboard.data.get_symbol_metadata', return_value=metadata),
+            mock.patch('dashboard.expiry_calendar.load_symbol_file_expiries',
+                       side_effect=lambda symbol: metadata['expiry_dates'][symbol]),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_normalize_dedupes_sorts_and_drops_malformed(self):
+        dates = ['05-01-2027', '29-12-2026', '29-12-2026', '2026-12-29', '', None]
+        self.assertEqual(expiry_calendar.normalize_expiries(dates), ['29-12-2026', '05-01-2027'])
+
+    def test_learned_calendar_rejects_unlisted_expiries(self):
+        expiry_calendar.learn_expiries(SYMBOL, [{'date': '29-12-2026'}, {'date': '05-01-2027'}])
+        self.assertIsNone(expiry_calendar.validate_expiry(SYMBOL, '29-12-2026'))
+        self.assertIn('not a listed expiry', expiry_calendar.validate_expiry(SYMBOL, '30-12-2026'))
+        self.assertIn('expected DD-MM-YYYY', expiry_calendar.validate_expiry(SYMBOL, '2026-12-29'))
+        self.assertIn('already passed', expiry_calendar.validate_expiry(SYMBOL, '01-01-2020'))
+
+    def test_failed_refresh_falls_back_and_backs_off(self):
+        with mock.patch('dashboard.data.fetch_expiry_data', return_value=None) as fetch:
+            self.assertEqual(expiry_calendar.get_expiries(SYMBOL), ['29-12-2026', '30-12-2026'])
+            expiry_calendar.nearest_expiry(SYMBOL)
+            expiry_calendar.get_active_expiries(SYMBOL)
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(expiry_calendar.expiry_calendars[SYMBOL]['source'], 'symbol.json')
+
+    def test_upstream_replaces_the_fallback(self):
+        with mock.patch('dashboard.data.fetch_expiry_data', return_value=[{'date': '05-01-2027'}]):
+            self.assertEqual(expiry_calendar.get_expiries(SYMBOL), ['05-01-2027'])
+        self.assertEqual(expiry_calendar.expiry_calendars[SYMBOL]['source'], 'upstream')
+
+    def test_unknown_symbol_never_reaches_upstream(self):
+        with mock.patch('dashboard.data.fetch_expiry_data') as fetch:
+            self.assertEqual(expiry_calendar.get_expiries('NSE:MADEUP-EQ'), [])
+            self.assertIn('Unknown symbol', expiry_calendar.validate_expiry('NSE:MADEUP-EQ', '29-12-2026'))
+        fetch.assert_not_called()
+        self.assertNotIn('NSE:MADEUP-EQ', expiry_calendar.expiry_calendars)
+
+
+# ========== VOLATILITY SURFACE ==========
+@override_settings(VOLSURFACE_DEGREE=2, VOLSURFACE_MONEYNESS_RANGE=10, VOLSURFACE_MAX_EXPIRIES=6,
+                   VOLSURFACE_STRIKECOUNT=8, VOLSURFACE_WORKERS=2)
+class VolSurfaceTests(SimpleTestCase):
+
+    def smile_chain(self, days, iv_at, expiry=EXPIRY):
+        """Chain whose OTM IVs follow iv_at(log-moneyness against the forward)"""
+        strikes = np.arange(22000, 26050, 100)
+        forward = 24000 * np.exp(RISK_FREE_RATE * days / 365)
+        iv = iv_at(np.log(strikes / forward))
+        return make_snapshot(strikes, 24000, expiry=expiry, call_iv=iv, put_iv=iv)
+
+    def test_fit_recovers_a_quadratic_smile(self):
+        fit = volsurface.fit_smile(self.smile_chain(30, lambda x: 15 + 20 * x + 50 * x ** 2), 30)
+        self.assertAlmostEqual(fit['atm_iv'], 15, places=6)
+        self.assertAlmostEqual(fit['skew'], 0.2, places=6)
+        self.assertAlmostEqual(fit['rmse'], 0, places=6)
+
+    def test_fit_needs_two_quotes(self):
+        chain = self.smile_chain(30, lambda x: np.where(np.abs(x) < 0.002, 15, 0))
+        self.assertIsNone(volsurface.fit_smile(chain, 30))
+
+    def test_surface_interpolates_total_variance(self):
+        near = volsurface.fit_smile(self.smile_chain(10, lambda x: 20 + 0 * x), 10)
+        far = volsurface.fit_smile(self.smile_chain(40, lambda x: 10 + 0 * x), 40)
+        surface = volsurface.build_surface([far, near], 24000)
+        iv = np.array(surface['surface']['iv'])
+        days = np.array(surface['surface']['days'])
+        self.assertEqual([row['days'] for row in surface['term_structure']], [10, 40])
+        np.testing.assert_allclose(iv[0], 20, atol=0.01)
+        np.testing.assert_allclose(iv[-1], 10, atol=0.01)
+        variance = np.interp(days, [10, 40], [0.2 ** 2 * 10, 0.1 ** 2 * 40])
+        np.testing.assert_allclose(iv[:, 0], np.sqrt(variance / days) * 100, atol=0.01)
+
+    def test_surface_loads_do_not_notify_listeners(self):
+        expiries = ['29-12-2026', '05-01-2027']
+        chains = {expiry: self.smile_chain(30, lambda x: 15 + 0 * x, expiry=expiry) for expiry in expiries}
+        with mock.patch('dashboard.expiry_calendar.get_active_expiries', return_value=expiries), \
+                mock.patch.dict(volsurface.surfaces, clear=True), \
+                mock.patch('dashboard.data.getLiveSnapshot',
+                           side_effect=lambda symbol, expiry, strikecount, notify: chains[expiry]) as load:
+            surface = volsurface.get_surface(SYMBOL)
+        self.assertEqual(len(surface['term_structure']), 2)
+        self.assertTrue(all(call.kwargs['notify'] is False for call in load.call_args_list))
+
+
+# ========== MARKET HOURS ==========
+def ist(year, month, day, hour, minute=0, second=0):
+    return IST.localize(datetime(year, month, day, hour, minute, second))
+
+
+class SessionCalendarTests(SimpleTestCase):
+    # Friday 16-10-2026, Saturday 17-10-2026, Monday 19-10-2026, holiday Tuesday 20-10-2026
+
+    def test_weekends_and_holidays_do_not_trade(self):
+        self.assertTrue(market_hours.is_trading_day(ist(2026, 10, 19, 10).date()))
+        self.assertFalse(market_hours.is_trading_day(ist(2026, 10, 17, 10).date()))
+        self.assertFalse(market_hours.is_trading_day(ist(2026, 10, 20, 10).date()))
+        with mock.patch.dict(os.environ, {'NSE_HOLIDAYS': '19-10-2026, 21-10-2026'}):
+            self.assertFalse(market_hours.is_trading_day(ist(2026, 10, 19, 10).date()))
+
+    def test_session_bounds(self):
+        self.assertFalse(market_hours.is_open(ist(2026, 10, 19, 9, 14, 59)))
+        self.assertTrue(market_hours.is_open(ist(2026, 10, 19, 9, 15)))
+        self.assertFalse(market_hours.is_open(ist(2026, 10, 19, 15, 30)))
+        self.assertFalse(market_hours.is_open(ist(2026, 10, 20, 11)))
+
+    def test_last_close_skips_back_over_the_weekend(self):
+        self.assertEqual(market_hours.last_close(ist(2026, 10, 19, 11)), ist(2026, 10, 16, 15, 30))
+        self.assertEqual(market_hours.last_close(ist(2026, 10, 19, 15, 30)), ist(2026, 10, 19, 15, 30))
+        self.assertEqual(market_hours.last_close(ist(2026, 10, 20, 11)), ist(2026, 10, 19, 15, 30))
+
+    def test_next_open_skips_forward_over_the_holiday(self):
+        running = ist(2026, 10, 19, 11)
+        self.assertEqual(market_hours.next_open(running), running)
+        self.assertEqual(market_hours.next_open(ist(2026, 10, 19, 8)), ist(2026, 10, 19, 9, 15))
+        self.assertEqual(market_hours.next_open(ist(2026, 10, 19, 16)), ist(2026, 10, 21, 9, 15))
+        self.assertEqual(market_hours.next_open(ist(2026, 10, 17, 10)), ist(2026, 10, 19, 9, 15))
+
+    def test_closed_chains_need_one_fetch_after_the_close(self):
+        now = ist(2026, 10, 19, 18)
+        self.assertTrue(market_hours.needs_refresh(ist(2026, 10, 19, 15, 29).timestamp(), now))
+        self.assertFalse(market_hours.needs_refresh(ist(2026, 10, 19, 15, 31).timestamp(), now))
+        self.assertTrue(market_hours.needs_refresh(time.time(), ist(2026, 10, 19, 11)))
+
+
+@override_settings(REFRESH_MIN_SECONDS=2, REFRESH_MAX_SECONDS=10, REFRESH_ACTIVITY_WINDOW=60,
+                   REFRESH_CLOSED_MAX_SECONDS=1800)
+class RefreshCadenceTests(SimpleTestCase):
+    now = ist(2026, 10, 19, 11)
+
+    def setUp(self):
+        for patcher in (
+            mock.patch.dict(market_hours.activity, clear=True),
+            mock.patch.dict(market_hours.previous_prices, clear=True),
+            mock.patch.dict(market_hours.viewers, clear=True),
+            mock.patch.dict(market_hours.shared_viewers, clear=True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def observe(self, *spots):
+        for spot in spots:
+            market_hours.observe_snapshot(make_snapshot([24000], spot))
+
+    def test_busy_chain_polls_at_the_minimum(self):
+        self.observe(24000, 24001, 24002)
+        self.assertEqual(market_hours.refresh_interval(SYMBOL, EXPIRY, self.now), 2)
+
+    def test_quiet_chain_slows_and_viewers_pull_it_back(self):
+        self.observe(24000, 24000, 24000, 24001)   # half the versions moved
+        self.assertEqual(market_hours.refresh_interval(SYMBOL, EXPIRY, self.now), 6)
+        for viewer in ('a', 'b'):
+            market_hours.record_viewer(SYMBOL, EXPIRY, viewer)
+        self.assertEqual(market_hours.refresh_interval(SYMBOL, EXPIRY, self.now), 4)
+
+    def test_viewers_on_other_nodes_count(self):
+        market_hours.record_viewer(SYMBOL, EXPIRY, 'a')
+        market_hours.note_shared_viewers(SYMBOL, EXPIRY, 4)
+        self.assertEqual(market_hours.viewer_count(SYMBOL, EXPIRY), 4)
+        market_hours.shared_viewers[(SYMBOL, EXPIRY)] = (4, time.time() - 31)
+        self.assertEqual(market_hours.viewer_count(SYMBOL, EXPIRY), 1)
+
+    def test_interval_wakes_up_right_after_the_close(self):
+        self.observe(24000, 24000)
+        self.assertEqual(market_hours.refresh_interval(SYMBOL, EXPIRY, ist(2026, 10, 19, 15, 29, 57)), 4)
+
+    def test_closed_interval_runs_to_the_next_open(self):
+        self.assertEqual(market_hours.refresh_interval(SYMBOL, EXPIRY, ist(2026, 10, 19, 9, 5)), 600)
+        self.assertEqual(market_hours.refresh_interval(SYMBOL, EXPIRY, ist(2026, 10, 19, 16)), 1800)
+
+    def test_poll_delay_is_what_is_left_of_the_cache_ttl(self):
+        self.observe(24000, 24000, 24000, 24001)   # 6 second interval
+        self.assertEqual(market_hours.poll_delay(SYMBOL, EXPIRY, 4.5, self.now), 1.5)
+        self.assertEqual(market_hours.poll_delay(SYMBOL, EXPIRY, 5.9, self.now), market_hours.MIN_POLL_DELAY)
+        self.assertEqual(market_hours.poll_delay(SYMBOL, EXPIRY, 7, self.now), 6)
+        self.assertEqual(market_hours.poll_delay(SYMBOL, EXPIRY, None, self.now), 6)
+
+    def test_cache_freshness(self):
+        self.observe(24000, 24001)
+        snapshot = make_snapshot([24000], 24000, fetched_at=ist(2026, 10, 19, 15, 31).timestamp())
+        now = self.now.timestamp()
+        self.assertTrue(market_hours.cache_is_fresh(snapshot, now - 1.9, self.now))
+        self.assertFalse(market_hours.cache_is_fresh(snapshot, now - 2, self.now))
+        self.assertTrue(market_hours.cache_is_fresh(snapshot, 0, ist(2026, 10, 19, 18)))
+        self.assertFalse(market_hours.cache_is_fresh(snapshot, 0, ist(2026, 10, 21, 18)))
+
+
+# ========== SCANNER ==========
+@override_settings(SCANNER_HEADROOM=0.4, SCANNER_DEFER_SECONDS=1, SCANNER_STRIKECOUNT=10, SCANNER_WORKERS=2)
+class ScannerDeferralTests(SimpleTestCase):
+
+    def setUp(self):
+        for patcher in (
+            mock.patch.object(scanner, 'latest_scan', dict(scanner.latest_scan, rows=[])),
+            mock.patch('dashboard.scanner.time.sleep'),
+            mock.patch('dashboard.expiry_calendar.nearest_expiry', return_value=EXPIRY),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_fetch_waits_for_headroom(self):
+        snapshot = make_snapshot([24000], 24010)
+        with mock.patch('dashboard.throttle.headroom', side_effect=[0.1, 0.2, 0.5]) as headroom, \
+                mock.patch('dashboard.data.getLiveSnapshot', return_value=snapshot) as load:
+            self.assertEqual(scanner.fetch_nearest(SYMBOL), (SYMBOL, snapshot, False))
+        self.assertEqual(headroom.call_count, 3)
+        load.assert_called_once_with(SYMBOL, EXPIRY, 10, notify=False)
+
+    def test_fetch_is_deferred_when_headroom_stays_short(self):
+        clock = iter(range(0, 100))
+        with mock.patch('dashboard.throttle.headroom', return_value=0.1), \
+                mock.patch('dashboard.scanner.time.monotonic', side_effect=lambda: next(clock)), \
+                mock.patch('dashboard.data.getLiveSnapshot') as load:
+            self.assertEqual(scanner.fetch_nearest(SYMBOL), (SYMBOL, None, True))
+        load.assert_not_called()
+
+    def test_deferred_symbols_keep_their_previous_row(self):
+        symbols = ['NSE:BANKNIFTY-INDEX', 'NSE:FINNIFTY-INDEX', SYMBOL]
+        previous = {'symbol': 'NSE:BANKNIFTY-INDEX', 'oi_change': 7}
+        scanner.latest_scan['rows'] = [previous, {'symbol': 'NSE:FINNIFTY-INDEX', 'oi_change': 3}]
+        results = {
+            'NSE:BANKNIFTY-INDEX': ('NSE:BANKNIFTY-INDEX', None, True),
+            'NSE:FINNIFTY-INDEX': ('NSE:FINNIFTY-INDEX', None, False),
+            SYMBOL: (SYMBOL, make_snapshot([24000, 24050], 24010, call_oich=[5, 1]), False),
+        }
+        with mock.patch.object(scanner, 'scan_symbols', return_value=symbols), \
+                mock.patch.object(scanner, 'fetch_nearest', side_effect=results.get):
+            scan = scanner.run_sweep()
+        self.assertEqual([row['symbol'] for row in scan['rows']], [SYMBOL, 'NSE:BANKNIFTY-INDEX'])
+        self.assertIs(scan['rows'][1], previous)
+        self.assertEqual(scan['rows'][0]['call_oi_change'], 6)
+        self.assertEqual(scan['deferred'], ['NSE:BANKNIFTY-INDEX'])
+        self.assertEqual(scan['failed'], ['NSE:FINNIFTY-INDEX'])
+
+
+# ========== RECORDER AND EXPORT ==========
+@override_settings(RECORDER_ENABLED=True, RECORDER_INTERVAL=2, RECORDER_BATCH_SIZE=200, RECORDER_RETENTION_DAYS=7)
+class RecorderTests(TestCase):
+
+    def setUp(self):
+        for patcher in (
+            mock.patch.object(recorder, 'queue', []),
+            mock.patch.dict(recorder.last_recorded, clear=True),
+            mock.patch.object(recorder, 'ensure_writer'),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def record(self, fetched_at, spot=24010.0):
+        recorder.submit(make_snapshot([24000, 24050], spot, fetched_at=fetched_at,
+                                      call_oi=[100, 200], put_iv=[14.5, 15.25]))
+
+    def test_submit_samples_each_chain_once_per_interval(self):
+        for offset in (0, 1, 2.5, 3):
+            self.record(1_800_000_000 + offset)
+        self.assertEqual([snapshot.fetched_at for snapshot in recorder.queue], [1_800_000_000, 1_800_000_002.5])
+
+    @override_settings(RECORDER_ENABLED=False)
+    def test_submit_is_off_unless_enabled(self):
+        self.record(1_800_000_000)
+        self.assertEqual(recorder.queue, [])
+
+    def test_flush_packs_every_column(self):
+        self.record(1_800_000_000)
+        self.assertEqual(recorder.flush(), 1)
+        record = SnapshotRecord.objects.get()
+        fields, block = recorder.unpack(record)
+        self.assertEqual(fields, list(recorder.RECORD_FIELDS))
+        np.testing.assert_array_equal(block[fields.index('strike')], [24000, 24050])
+        np.testing.assert_array_equal(block[fields.index('call_oi')], [100, 200])
+        np.testing.assert_array_equal(block[fields.index('put_iv')], [14.5, 15.25])
+        self.assertEqual(record.captured_at.timestamp(), 1_800_000_000)
+
+    def test_purge_keeps_only_the_retention_window(self):
+        now = time.time()
+        self.record(now - 8 * 86400)
+        self.record(now - 6 * 86400)
+        recorder.flush()
+        recorder.purge_expired()
+        self.assertEqual(SnapshotRecord.objects.count(), 1)
+        self.assertGreater(SnapshotRecord.objects.get().captured_at.timestamp(), now - 7 * 86400)
+
+
+@override_settings(RECORDER_ENABLED=True, RECORDER_INTERVAL=2, RECORDER_BATCH_SIZE=200)
+class ExportTests(TestCase):
+
+    def setUp(self):
+        with mock.patch.object(recorder, 'queue', []), mock.patch.dict(recorder.last_recorded, clear=True), \
+                mock.patch.object(recorder, 'ensure_writer'):
+            for offset, spot in ((0, 24010.0), (60, 24020.0)):
+                fetched_at = ist(2026, 10, 19, 10, 0).timestamp() + offset
+                recorder.submit(make_snapshot([24000, 24050], spot, fetched_at=fetched_at, call_oi=[100, 200]))
+            recorder.flush()
+        self.spec = export.parse_export_request({'symbol': SYMBOL, 'expiry': EXPIRY, 'start': '2026-10-19'})
+
+    def test_request_validation(self):
+        self.assertEqual(self.spec['end'] - self.spec['start'], timedelta(days=1))
+        for params, message in (
+            ({'symbol': SYMBOL, 'start': '2026-10-19'}, 'required'),
+            ({'symbol': SYMBOL, 'expiry': EXPIRY, 'start': '19-10-2026'}, 'YYYY-MM-DD'),
+            ({'symbol': SYMBOL, 'expiry': EXPIRY, 'start': '2026-10-19', 'end': '2026-10-18'}, 'at most'),
+            ({'symbol': SYMBOL, 'expiry': EXPIRY, 'start': '2026-09-01', 'end': '2026-10-19'}, 'at most'),
+            ({'symbol': SYMBOL, 'expiry': EXPIRY, 'start': '2026-10-19', 'format': 'xlsx'}, 'format'),
+        ):
+            with self.assertRaisesMessage(export.ExportError, message):
+                export.parse_export_request(params)
+
+    def test_csv_has_one_row_per_strike_per_snapshot(self):
+        lines = ''.join(export.stream_export(self.spec)).splitlines()
+        header = lines[0].split(',')
+        self.assertEqual(header[:3], ['timestamp', 'spot', 'strike'])
+        self.assertEqual(len(lines), 5)
+        first = dict(zip(header, lines[1].split(',')))
+        self.assertEqual(first['timestamp'], '2026-10-19T10:00:00+05:30')
+        self.assertEqual((float(first['spot']), float(first['strike']), float(first['call_oi'])), (24010, 24000, 100))
+
+    def test_export_is_limited_to_the_requested_days(self):
+        other_day = export.parse_export_request({'symbol': SYMBOL, 'expiry': EXPIRY, 'start': '2026-10-20'})
+        self.assertEqual(list(export.stream_export(other_day)), [])
+
+    def test_parquet_round_trips(self):
+        if export.pa is None:
+            self.skipTest('pyarrow is not installed')
+        spec = dict(self.spec, format='parquet')
+        table = export.pq.read_table(export.pa.BufferReader(b''.join(export.stream_export(spec))))
+        self.assertEqual(table.num_rows, 4)
+        self.assertEqual(table.column('spot').to_pylist(), [24010, 24010, 24020, 24020])
+        self.assertEqual(table.column('call_oi').to_pylist(), [100, 200, 100, 200])
@@ -0,0 +1,80 @@
+# ========== UPSTREAM RATE LIMIT ==========
+# Every Fyers call in this process draws from one limiter, so user polling,
+# the cluster leader and background sweeps (scanner, warmers) share the same
+# budget instead of each assuming it has the API to itself. Fyers enforces
+# both a per-second and a per-minute cap; each gets its own token bucket.
+import threading
+import time
+
+from django.conf import settings
+
+
+class TokenBucket:
+    def __init__(self, capacity, period):
+        self.capacity = capacity
+        self.rate = capacity / period      # tokens per second
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self):
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Blocking limiter over several (requests, seconds) windows"""
+
+    def __init__(self, windows):
+        self.buckets = [TokenBucket(capacity, period) for capacity, period in windows]
+        self.lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        """Take one request slot, sleeping until one is free; False if timeout passes first"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                for bucket in self.buckets:
+                    bucket.refill(now)
+                wait = max(bucket.wait_time() for bucket in self.buckets)
+                if wait == 0:
+                    for bucket in self.buckets:
+                        bucket.tokens -= 1
+                    return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def headroom(self):
+        """Fraction of the tightest window still unused (1.0 when idle); lets background work yield"""
+        with self.lock:
+            now = time.monotonic()
+            for bucket in self.buckets:
+                bucket.refill(now)
+            return min(bucket.tokens / bucket.capacity for bucket in self.buckets)
+
+
+limiter = None
+limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    global limiter
+    with limiter_lock:
+        if limiter is None:
+            limiter = RateLimiter([
+                (settings.FYERS_RATE_PER_SECOND, 1),
+                (settings.FYERS_RATE_PER_MINUTE, 60),
+            ])
+    return limiter
+
+
+def acquire(timeout=None):
+    return get_limiter().acquire(timeout)
+
+
+def headroom():
+    return get_limiter().headroom()
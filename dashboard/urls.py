@@ -2,7 +2,7 @@
 # Maps URLs to view functions
 
 from django.urls import path
-from .views import home_view, login_view, dashboard_view, optionchain_view, get_live_data, fyers_login_view, fyers_callback_view
+from .views import home_view, login_view, dashboard_view, optionchain_view, get_live_data, get_expiries, scenario_grid, evaluate_positions, market_scanner, vol_surface, intraday_series, alert_rules, delete_alert_rule, export_chain_history, prefetch_stats, fyers_login_view, fyers_callback_view
 from .admin_views import update_expiry_dates
 from django.contrib.auth.views import LoginView
 
@@ -12,7 +12,17 @@ urlpatterns = [
     path('dashboard/', dashboard_view, name='dashboard'),  # Dashboard (protected)
     path('optionchain/', optionchain_view, name='optionchain'),  # Main option chain page (protected)
     path('get-live-data/', get_live_data, name='get_live_data'),  # API endpoint for live data (protected)
+    path('expiries/', get_expiries, name='get_expiries'),  # Active expiry calendar for a symbol (protected)
+    path('scenario-grid/', scenario_grid, name='scenario_grid'),  # What-if repricing grid for a chain (protected)
+    path('positions/evaluate/', evaluate_positions, name='evaluate_positions'),  # Multi-leg payoff and Greeks (protected)
+    path('scanner/', market_scanner, name='market_scanner'),  # Ranked nearest-expiry metrics for all symbols (protected)
+    path('vol-surface/', vol_surface, name='vol_surface'),  # Cross-expiry IV smiles, term structure and surface (protected)
+    path('intraday-series/', intraday_series, name='intraday_series'),  # Downsampled spot/PCR/OI history for charts (protected)
+    path('alerts/', alert_rules, name='alert_rules'),  # List or create the user's alert rules (protected)
+    path('alerts/<int:rule_id>/delete/', delete_alert_rule, name='delete_alert_rule'),  # Remove an alert rule (protected)
     path('manage/expiry/', update_expiry_dates, name='admin_expiry'),  # Admin: Update expiry dates (protected)
+    path('manage/export/', export_chain_history, name='export_chain_history'),  # Admin: Stream recorded chain history as CSV/Parquet
+    path('manage/prefetch/', prefetch_stats, name='prefetch_stats'),  # Admin: Prefetch hit rate and cold-switch latency saved
     path('fyers-login/', fyers_login_view, name='fyers_login'),  # Fyers authentication (admin only)
     path('fyers-callback/', fyers_callback_view, name='fyers_callback'),  # Fyers OAuth callback
 ]
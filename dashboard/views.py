@@ -3,13 +3,27 @@ from django.contrib.auth import authenticate, login
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.decorators import login_required
 from django.contrib.sessions.models import Session
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+import json
+import time
 import pandas as pd
-from .data import getLiveData
-from .data import update_symbol_expiry, update_strikecount
-from .models import UserSession
+from .data import getLiveData, getLiveSnapshot, calculate_days_to_expiry, next_poll_delay
+from .data import update_symbol_expiry, update_strikecount, parse_strikecount, get_symbol_metadata, get_lot_size
+from . import expiry_calendar
+from . import scenarios
+from . import positions
+from . import scanner
+from . import volsurface
+from . import alerts
+from . import market_hours
+from . import export
+from . import intraday
+from . import prefetch
+from .models import UserSession, AlertRule, AlertEvent
+from .pricing import GREEK_UNITS
 from .fyers_auth import generate_auth_url, generate_tokens_from_auth_code
 from django.core.cache import cache
+from django.conf import settings
 
 # Cache for storing last successful data
 last_successful_data = {}
@@ -65,13 +79,42 @@ def optionchain_view(request):
     except UserSession.DoesNotExist:
         return redirect('/login/')
         
+    # Embed the current snapshot and symbol metadata so first paint needs no extra requests
+    symbol = request.GET.get('symbol', 'NSE:NIFTY50-INDEX')
+    expiry = request.GET.get('expiry') or expiry_calendar.nearest_expiry(symbol)
     try:
-        data = getLiveData()
-        optionchain_data = data.to_dict(orient='records') if data is not None else []
+        strikecount = parse_strikecount(request.GET.get('strikecount'))
+    except ValueError:
+        strikecount = 10
+    
+    initial_data = None
+    try:
+        result = getLiveData(symbol, expiry, strikecount) if expiry else None
+        if result is not None:
+            data, quote_data, pcr = result
+            initial_data = {
+                'symbol': symbol,
+                'expiry': expiry,
+                'strikecount': strikecount,
+                'data': data,
+                'quote_data': quote_data,
+                'pcr': pcr,
+                'refresh_interval': next_poll_delay(symbol, expiry),
+                'market_open': market_hours.is_open(),
+            }
     except Exception as e:
         print(f"Error loading optionchain data: {e}")
-        optionchain_data = []
-    return render(request, 'dashboard/optionchain.html', {'optionchain_data': optionchain_data})
+    
+    metadata = get_symbol_metadata()
+    expiry_dates = dict(metadata.get('expiry_dates', {}))
+    # Symbols whose calendar has been learned from upstream use it over symbol.json
+    for calendar_symbol, calendar in expiry_calendar.expiry_calendars.items():
+        if calendar['source'] == 'upstream':
+            expiry_dates[calendar_symbol] = calendar['dates']
+    symbol_data = {'expiry_dates': expiry_dates, 'lot_sizes': metadata.get('lot_sizes', {})}
+    
+    return render(request, 'dashboard/optionchain.html', {'initial_data': initial_data, 'symbol_data': symbol_data,
+                                                          'greek_units': GREEK_UNITS})
 
 @login_required
 def get_live_data(request):
@@ -84,24 +127,50 @@ def get_live_data(request):
         return JsonResponse({'redirect': '/login/', 'message': 'Logged in Other Device'})
     
     symbol = request.GET.get('symbol', 'NSE:NIFTY50-INDEX')
-    expiry = request.GET.get('expiry', '28-11-2025')
-    strikecount = int(request.GET.get('strikecount', '10'))
+    expiry = request.GET.get('expiry') or expiry_calendar.nearest_expiry(symbol)
+    try:
+        strikecount = parse_strikecount(request.GET.get('strikecount'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    # Reject dead or unlisted expiries before any upstream call
+    expiry_error = expiry_calendar.validate_expiry(symbol, expiry) if expiry else f"No active expiry for {symbol}"
+    if expiry_error:
+        return JsonResponse({
+            'error': expiry_error,
+            'expiries': expiry_calendar.get_active_expiries(symbol),
+            'data': [],
+            'quote_data': {'ltp': 0, 'prev_close': 0, 'change_points': 0, 'change_percent': 0},
+            'pcr': 0
+        })
+    
     update_symbol_expiry(symbol, expiry)
     update_strikecount(strikecount)
     print(f"Fetching data for: {symbol}, {expiry}, {strikecount}")
     
     cache_key = f"{symbol}_{expiry}_{strikecount}"
+    market_hours.record_viewer(symbol, expiry, request.session.session_key)
+    switched = prefetch.record_request(request.session.session_key, symbol, expiry, strikecount)
     
     try:
+        started = time.perf_counter()
         result = getLiveData(symbol, expiry, strikecount)
+        if switched:
+            prefetch.record_switch(symbol, expiry, time.perf_counter() - started)
+        # Tells the page when to poll next: when the copy it is served expires
+        # (adaptive in session, long waits when closed)
+        cadence = {
+            'refresh_interval': next_poll_delay(symbol, expiry),
+            'market_open': market_hours.is_open(),
+        }
         if result is None:
             print("getLiveData returned None - using previous data")
             # Return previous data if available
             if cache_key in last_successful_data:
                 print("Returning cached data")
-                return JsonResponse(last_successful_data[cache_key])
+                return JsonResponse(dict(last_successful_data[cache_key], **cadence))
             else:
-                return JsonResponse({'data': [], 'quote_data': {'ltp': 0, 'prev_close': 0, 'change_points': 0, 'change_percent': 0}, 'pcr': 0})
+                return JsonResponse({'data': [], 'quote_data': {'ltp': 0, 'prev_close': 0, 'change_points': 0, 'change_percent': 0}, 'pcr': 0, **cadence})
         
         data, quote_data, pcr = result
         print(f"Data fetched successfully: {len(data)} rows, LTP: {quote_data}, PCR: {pcr}")
@@ -110,7 +179,8 @@ def get_live_data(request):
         response_data = {'data': data, 'quote_data': quote_data, 'pcr': pcr}
         last_successful_data[cache_key] = response_data
         
-        return JsonResponse(response_data)
+        # Fired alerts ride along with the poll (never cached with the chain data)
+        return JsonResponse(dict(response_data, alerts=alerts.pop_events(request.user.id), **cadence))
         
     except Exception as e:
         print(f"Error getting live data: {e}")
@@ -124,6 +194,192 @@ def get_live_data(request):
         else:
             return JsonResponse({'data': [], 'quote_data': {'ltp': 0, 'prev_close': 0, 'change_points': 0, 'change_percent': 0}})
 
+def session_is_current(request):
+    # False when the user has since logged in on another device
+    try:
+        return UserSession.objects.get(user=request.user).session_key == request.session.session_key
+    except UserSession.DoesNotExist:
+        return False
+
+@login_required
+def scenario_grid(request):
+    if not session_is_current(request):
+        return JsonResponse({'redirect': '/login/', 'message': 'Logged in Other Device'})
+    
+    symbol = request.GET.get('symbol', 'NSE:NIFTY50-INDEX')
+    expiry = request.GET.get('expiry') or expiry_calendar.nearest_expiry(symbol)
+    try:
+        strikecount = parse_strikecount(request.GET.get('strikecount'))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    expiry_error = expiry_calendar.validate_expiry(symbol, expiry) if expiry else f"No active expiry for {symbol}"
+    if expiry_error:
+        return JsonResponse({'error': expiry_error}, status=400)
+    try:
+        spec = scenarios.parse_grid_spec(request.GET)
+    except scenarios.GridSpecError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    snapshot = getLiveSnapshot(symbol, expiry, strikecount)
+    if snapshot is None or len(snapshot) == 0:
+        return JsonResponse({'error': 'No live chain available for this selection'}, status=503)
+    
+    try:
+        payload = scenarios.get_scenario_grid(snapshot, spec, calculate_days_to_expiry(expiry))
+    except scenarios.GridSpecError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return HttpResponse(payload, content_type='application/json')
+
+@login_required
+def evaluate_positions(request):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST a JSON body with symbol, expiry and legs'}, status=405)
+    if not session_is_current(request):
+        return JsonResponse({'redirect': '/login/', 'message': 'Logged in Other Device'})
+    
+    try:
+        body = json.loads(request.body or b'{}')
+        symbol = body.get('symbol', 'NSE:NIFTY50-INDEX')
+        expiry = body.get('expiry') or expiry_calendar.nearest_expiry(symbol)
+        strikecount = parse_strikecount(body.get('strikecount'))
+        spot_range = float(body.get('spot_range', 5))
+        points = int(body.get('points', 101))
+        legs = positions.parse_positions(body)
+    except (ValueError, TypeError, AttributeError) as e:
+        return JsonResponse({'error': str(e) or 'Invalid JSON body'}, status=400)
+    expiry_error = expiry_calendar.validate_expiry(symbol, expiry) if expiry else f"No active expiry for {symbol}"
+    if expiry_error:
+        return JsonResponse({'error': expiry_error}, status=400)
+    
+    snapshot = getLiveSnapshot(symbol, expiry, strikecount)
+    if snapshot is None or len(snapshot) == 0:
+        return JsonResponse({'error': 'No live chain available for this selection'}, status=503)
+    
+    try:
+        spots, results = positions.evaluate_positions(
+            snapshot, legs, get_lot_size(symbol), calculate_days_to_expiry(expiry),
+            spot_range=min(max(spot_range, 0.5), 50), points=points
+        )
+    except positions.PositionError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    return JsonResponse({
+        'symbol': symbol,
+        'expiry': expiry,
+        'version': snapshot.version,
+        'spot': snapshot.spot,
+        'lot_size': get_lot_size(symbol),
+        'spots': spots,
+        'positions': results,
+        'units': GREEK_UNITS,
+    })
+
+@login_required
+def market_scanner(request):
+    if not session_is_current(request):
+        return JsonResponse({'redirect': '/login/', 'message': 'Logged in Other Device'})
+    
+    sort = request.GET.get('sort', 'oi_change')
+    if sort not in scanner.SORT_FIELDS:
+        return JsonResponse({'error': f"sort must be one of: {', '.join(scanner.SORT_FIELDS)}"}, status=400)
+    descending = request.GET.get('order', 'desc') != 'asc'
+    try:
+        limit = int(request.GET.get('limit', 0)) or None
+    except ValueError:
+        return JsonResponse({'error': 'limit must be a number'}, status=400)
+    
+    return JsonResponse(scanner.get_ranked_table(sort, descending, limit))
+
+@login_required
+def vol_surface(request):
+    if not session_is_current(request):
+        return JsonResponse({'redirect': '/login/', 'message': 'Logged in Other Device'})
+    
+    symbol = request.GET.get('symbol', 'NSE:NIFTY50-INDEX')
+    surface = volsurface.get_surface(symbol)
+    if surface is None:
+        return JsonResponse({'error': f"No live chains available to build a surface for {symbol}"}, status=503)
+    return JsonResponse(surface)
+
+@login_required
+def intraday_series(request):
+    if not session_is_current(request):
+        return JsonResponse({'redirect': '/login/', 'message': 'Logged in Other Device'})
+    
+    symbol = request.GET.get('symbol', 'NSE:NIFTY50-INDEX')
+    expiry = request.GET.get('expiry') or expiry_calendar.nearest_expiry(symbol)
+    try:
+        method, points = intraday.parse_series_request(request.GET)
+    except intraday.SeriesError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    payload = intraday.get_series(symbol, expiry, method, points)
+    if payload is None:
+        return JsonResponse({'error': f"No intraday history recorded yet for {symbol} {expiry}"}, status=404)
+    return JsonResponse(payload)
+
+@login_required
+def alert_rules(request):
+    if not session_is_current(request):
+        return JsonResponse({'redirect': '/login/', 'message': 'Logged in Other Device'})
+    
+    if request.method == 'POST':
+        try:
+            rule = alerts.parse_rule(json.loads(request.body or b'{}'))
+        except (ValueError, AttributeError) as e:
+            return JsonResponse({'error': str(e) or 'Invalid JSON body'}, status=400)
+        if AlertRule.objects.filter(user=request.user, active=True).count() >= settings.ALERTS_MAX_RULES_PER_USER:
+            return JsonResponse({'error': f"At most {settings.ALERTS_MAX_RULES_PER_USER} active alerts per user"}, status=400)
+        created = AlertRule.objects.create(user=request.user, **rule)
+        alerts.invalidate()
+        return JsonResponse({'id': created.pk, 'rule': str(created)}, status=201)
+    
+    rules = AlertRule.objects.filter(user=request.user, active=True).order_by('-created_at')
+    events = AlertEvent.objects.filter(user=request.user).order_by('-created_at')[:20]
+    return JsonResponse({
+        'rules': [dict(id=rule.pk, description=str(rule), **{name: getattr(rule, name) for name in (
+            'symbol', 'expiry', 'field', 'strike', 'condition', 'threshold', 'window_minutes', 'repeat')})
+            for rule in rules],
+        'events': [{'id': event.pk, 'message': event.message, 'created_at': event.created_at.isoformat()}
+                   for event in events],
+    })
+
+@login_required
+def delete_alert_rule(request, rule_id):
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST to delete an alert'}, status=405)
+    if not session_is_current(request):
+        return JsonResponse({'redirect': '/login/', 'message': 'Logged in Other Device'})
+    deleted, _ = AlertRule.objects.filter(pk=rule_id, user=request.user).delete()
+    alerts.invalidate()
+    return JsonResponse({'deleted': bool(deleted)})
+
+@login_required
+def get_expiries(request):
+    symbol = request.GET.get('symbol', 'NSE:NIFTY50-INDEX')
+    return JsonResponse({'symbol': symbol, 'expiries': expiry_calendar.get_active_expiries(symbol)})
+
+@login_required
+def export_chain_history(request):
+    if not request.user.is_superuser:
+        return JsonResponse({'error': 'Exports are limited to administrators'}, status=403)
+    try:
+        spec = export.parse_export_request(request.GET)
+    except export.ExportError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    content_type = 'text/csv' if spec['format'] == 'csv' else 'application/vnd.apache.parquet'
+    filename = f"{spec['symbol'].replace(':', '_')}_{spec['expiry']}_{request.GET.get('start')}_{request.GET.get('end') or request.GET.get('start')}.{spec['format']}"
+    response = StreamingHttpResponse(export.stream_export(spec), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+@login_required
+def prefetch_stats(request):
+    if not request.user.is_superuser:
+        return JsonResponse({'error': 'Prefetch metrics are limited to administrators'}, status=403)
+    return JsonResponse(dict(prefetch.get_stats(), enabled=prefetch.is_enabled()))
+
 @login_required
 def fyers_login_view(request):
     if not request.user.is_superuser:
@@ -0,0 +1,151 @@
+# ========== IMPLIED VOLATILITY SURFACE ==========
+# Builds a per-symbol surface from the ATM region of every active expiry.
+# Each expiry's smile is a low-order polynomial in log-moneyness fitted to
+# out-of-the-money IVs (puts below the forward, calls above). Across
+# maturities the surface interpolates total variance (iv^2 * T) linearly in
+# T. Fits are cached per snapshot version, so a rebuild only refits the
+# expiries whose chain actually changed.
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+
+from . import expiry_calendar
+from .pricing import RISK_FREE_RATE
+
+MONEYNESS_POINTS = 21
+MATURITY_POINTS = 12
+
+# symbol -> {'fits': {expiry: fit}, 'key': ((expiry, version), ...), 'surface': dict}
+surfaces = {}
+surfaces_lock = threading.Lock()
+
+
+def fetch_expiry_snapshots(symbol, expiries):
+    """Fetch the chains for several expiries concurrently; returns {expiry: snapshot}"""
+    from .data import getLiveSnapshot
+
+    def fetch(expiry):
+        try:
+            # Background load: the chain a viewer has open reaches the snapshot
+            # listeners through their own table poll
+            return expiry, getLiveSnapshot(symbol, expiry, settings.VOLSURFACE_STRIKECOUNT, notify=False)
+        except Exception as e:
+            print(f"Surface fetch failed for {symbol} {expiry}: {e}")
+            return expiry, None
+
+    with ThreadPoolExecutor(max_workers=min(len(expiries), settings.VOLSURFACE_WORKERS) or 1,
+                            thread_name_prefix='volsurface') as pool:
+        return {expiry: snapshot for expiry, snapshot in pool.map(fetch, expiries)
+                if snapshot is not None and len(snapshot) > 0}
+
+
+def fit_smile(snapshot, days_to_expiry):
+    """Fit iv(x) = c0 + c1 x + c2 x^2 with x = ln(K / F) to OTM IVs of one expiry"""
+    years = days_to_expiry / 365.0
+    forward = snapshot.spot * np.exp(RISK_FREE_RATE * years)
+    strikes = snapshot.strikes
+    iv = np.where(strikes < forward, snapshot['put_iv'], snapshot['call_iv'])
+    valid = (iv > 0) & (strikes > 0)
+    if valid.sum() < 2 or forward <= 0:
+        return None
+
+    x = np.log(strikes[valid] / forward)
+    y = iv[valid]
+    degree = min(settings.VOLSURFACE_DEGREE, int(valid.sum()) - 1)
+    coefficients = np.polyfit(x, y, degree)
+    residual = y - np.polyval(coefficients, x)
+    slope = np.polyder(coefficients)
+    return {
+        'expiry': snapshot.expiry,
+        'version': snapshot.version,
+        'days': days_to_expiry,
+        'years': years,
+        'forward': float(forward),
+        'coefficients': coefficients,
+        'atm_iv': float(np.polyval(coefficients, 0.0)),
+        'skew': float(np.polyval(slope, 0.0)) / 100.0,      # IV points per 1% of log-moneyness
+        'rmse': float(np.sqrt(np.mean(residual ** 2))),
+        'x_range': (float(x.min()), float(x.max())),
+        'observed': {'moneyness': np.round(x, 4).tolist(), 'iv': y.tolist()},
+    }
+
+
+def smile_values(fit, moneyness):
+    # Flat beyond the fitted strikes; polynomial tails are not trustworthy
+    x = np.clip(moneyness, *fit['x_range'])
+    return np.maximum(np.polyval(fit['coefficients'], x), 0.0)
+
+
+def build_surface(fits, spot):
+    """Smile grid per expiry plus a total-variance interpolated (maturity x moneyness) surface"""
+    fits = sorted(fits, key=lambda fit: fit['days'])
+    half_width = settings.VOLSURFACE_MONEYNESS_RANGE / 100.0
+    moneyness = np.linspace(-half_width, half_width, MONEYNESS_POINTS)
+
+    smiles = np.array([smile_values(fit, moneyness) for fit in fits])            # (expiry, x)
+    years = np.array([fit['years'] for fit in fits])
+    total_variance = (smiles / 100.0) ** 2 * years[:, None]
+
+    grid_days = np.unique(np.linspace(fits[0]['days'], fits[-1]['days'], MATURITY_POINTS).round())
+    grid_years = grid_days / 365.0
+    # Linear in T per moneyness column; np.interp holds the ends flat
+    grid_variance = np.stack([np.interp(grid_years, years, total_variance[:, j])
+                              for j in range(len(moneyness))], axis=1)
+    surface = np.sqrt(np.maximum(grid_variance, 0) / grid_years[:, None]) * 100
+
+    return {
+        'spot': spot,
+        'moneyness': np.round(moneyness, 4).tolist(),
+        'strikes': np.round(spot * np.exp(moneyness), 2).tolist(),
+        'term_structure': [
+            {'expiry': fit['expiry'], 'days': fit['days'], 'atm_iv': round(fit['atm_iv'], 2),
+             'skew': round(fit['skew'], 4), 'rmse': round(fit['rmse'], 3)}
+            for fit in fits
+        ],
+        'smiles': [
+            {'expiry': fit['expiry'], 'days': fit['days'], 'iv': np.round(smile, 2).tolist(),
+             'observed': fit['observed']}
+            for fit, smile in zip(fits, smiles)
+        ],
+        'surface': {
+            'days': grid_days.astype(int).tolist(),
+            'iv': np.round(surface, 2).tolist(),
+        },
+    }
+
+
+def get_surface(symbol):
+    """Current surface for a symbol, refitting only expiries whose snapshot version changed"""
+    from .data import calculate_days_to_expiry
+
+    expiries = expiry_calendar.get_active_expiries(symbol)[:settings.VOLSURFACE_MAX_EXPIRIES]
+    if not expiries:
+        return None
+    snapshots = fetch_expiry_snapshots(symbol, expiries)
+    if not snapshots:
+        return None
+
+    key = tuple((expiry, snapshots[expiry].version) for expiry in expiries if expiry in snapshots)
+    with surfaces_lock:
+        cached = surfaces.get(symbol)
+        if cached and cached['key'] == key:
+            return cached['surface']
+        previous = cached['fits'] if cached else {}
+
+    fits = {}
+    for expiry, snapshot in snapshots.items():
+        fit = previous.get(expiry)
+        if fit is None or fit['version'] != snapshot.version:
+            fit = fit_smile(snapshot, calculate_days_to_expiry(expiry))
+        if fit is not None:
+            fits[expiry] = fit
+    if not fits:
+        return None
+
+    spot = next(iter(snapshots.values())).spot
+    surface = dict(build_surface(list(fits.values()), spot), symbol=symbol)
+    with surfaces_lock:
+        surfaces[symbol] = {'fits': fits, 'key': key, 'surface': surface}
+    return surface
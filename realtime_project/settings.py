@@ -108,6 +108,86 @@ else:
 # Connection pooling for multiple users
 DATABASE_CONNECTION_POOLING = True
 
+# Multi-node deployment: 'single' polls Fyers from every process, 'cluster'
+# elects one leader (lease row in the database) to poll and share snapshots
+CLUSTER_MODE = os.getenv('CLUSTER_MODE', 'single')
+CLUSTER_BROKER = os.getenv('CLUSTER_BROKER', 'database')  # 'database' or 'local'
+CLUSTER_LEASE_SECONDS = int(os.getenv('CLUSTER_LEASE_SECONDS', '10'))
+CLUSTER_POLL_INTERVAL = float(os.getenv('CLUSTER_POLL_INTERVAL', '2'))
+CLUSTER_DEMAND_TTL = int(os.getenv('CLUSTER_DEMAND_TTL', '30'))
+
+# Upstream budget shared by every Fyers call in a process (API caps: 10/s, 200/min)
+FYERS_RATE_PER_SECOND = int(os.getenv('FYERS_RATE_PER_SECOND', '8'))
+FYERS_RATE_PER_MINUTE = int(os.getenv('FYERS_RATE_PER_MINUTE', '180'))
+
+# Market scanner: nearest-expiry sweep of every symbol in symbol.json
+SCANNER_INTERVAL = int(os.getenv('SCANNER_INTERVAL', '60'))           # seconds between sweeps
+SCANNER_WORKERS = int(os.getenv('SCANNER_WORKERS', '8'))
+SCANNER_STRIKECOUNT = int(os.getenv('SCANNER_STRIKECOUNT', '10'))
+SCANNER_IDLE_TIMEOUT = int(os.getenv('SCANNER_IDLE_TIMEOUT', '300'))   # stop sweeping when nobody looks
+SCANNER_HEADROOM = float(os.getenv('SCANNER_HEADROOM', '0.4'))         # limiter share kept for users; below it symbols wait
+SCANNER_DEFER_SECONDS = float(os.getenv('SCANNER_DEFER_SECONDS', '10'))  # then the symbol waits for the next sweep
+
+# Implied volatility surface: ATM-region chains of the nearest active expiries
+VOLSURFACE_MAX_EXPIRIES = int(os.getenv('VOLSURFACE_MAX_EXPIRIES', '6'))
+VOLSURFACE_STRIKECOUNT = int(os.getenv('VOLSURFACE_STRIKECOUNT', '8'))
+VOLSURFACE_WORKERS = int(os.getenv('VOLSURFACE_WORKERS', '4'))
+VOLSURFACE_DEGREE = int(os.getenv('VOLSURFACE_DEGREE', '2'))                    # smile polynomial order
+VOLSURFACE_MONEYNESS_RANGE = float(os.getenv('VOLSURFACE_MONEYNESS_RANGE', '10'))  # +/- percent
+
+# Tick streaming: 'off' polls REST, 'fyers' uses the broker data socket,
+# 'local' an in-process stand-in that ticks are pushed into (tests)
+STREAMING_MODE = os.getenv('STREAMING_MODE', 'off')
+STREAMING_RESYNC_SECONDS = int(os.getenv('STREAMING_RESYNC_SECONDS', '60'))  # REST reload, refreshes OI
+STREAMING_IDLE_TIMEOUT = int(os.getenv('STREAMING_IDLE_TIMEOUT', '60'))      # unsubscribe unrequested chains
+
+# Strike window (strikes either side of ATM) for chain-wide metrics computed
+# outside a page request, e.g. PCR in alerts and intraday series; the
+# page's default window, so those values match what the table shows
+DEFAULT_STRIKECOUNT = int(os.getenv('DEFAULT_STRIKECOUNT', '10'))
+
+# Alert rules
+ALERTS_RELOAD_SECONDS = int(os.getenv('ALERTS_RELOAD_SECONDS', '30'))        # pick up rules saved by other processes
+ALERTS_HISTORY_STEP = int(os.getenv('ALERTS_HISTORY_STEP', '30'))            # snapshot spacing kept for growth rules
+ALERTS_COOLDOWN_SECONDS = int(os.getenv('ALERTS_COOLDOWN_SECONDS', '300'))   # quiet period for repeating rules
+ALERTS_DELIVERY_INTERVAL = int(os.getenv('ALERTS_DELIVERY_INTERVAL', '4'))   # how often a poll checks the database
+ALERTS_MAX_RULES_PER_USER = int(os.getenv('ALERTS_MAX_RULES_PER_USER', '200'))
+
+# Refresh cadence: per-chain interval between these bounds during market hours
+REFRESH_MIN_SECONDS = float(os.getenv('REFRESH_MIN_SECONDS', '2'))
+REFRESH_MAX_SECONDS = float(os.getenv('REFRESH_MAX_SECONDS', '10'))
+REFRESH_ACTIVITY_WINDOW = int(os.getenv('REFRESH_ACTIVITY_WINDOW', '60'))          # seconds of change history
+REFRESH_CLOSED_MAX_SECONDS = int(os.getenv('REFRESH_CLOSED_MAX_SECONDS', '1800'))  # client recheck while closed
+
+# Snapshot history for exports; opt-in, as every viewed chain is written to the
+# main database (roughly 100 MB per chain per day at the default interval)
+RECORDER_ENABLED = os.getenv('RECORDER_ENABLED', 'false').lower() == 'true'
+RECORDER_INTERVAL = float(os.getenv('RECORDER_INTERVAL', '2'))            # seconds between samples per chain
+RECORDER_BATCH_SIZE = int(os.getenv('RECORDER_BATCH_SIZE', '200'))
+RECORDER_FLUSH_SECONDS = float(os.getenv('RECORDER_FLUSH_SECONDS', '5'))
+RECORDER_RETENTION_DAYS = int(os.getenv('RECORDER_RETENTION_DAYS', '7'))
+
+# Intraday chart series: per-chain ring buffer (a 09:15-15:30 session at 2s is 11250 rows)
+INTRADAY_STEP_SECONDS = float(os.getenv('INTRADAY_STEP_SECONDS', '2'))
+INTRADAY_CAPACITY = int(os.getenv('INTRADAY_CAPACITY', '12000'))
+INTRADAY_DEFAULT_POINTS = int(os.getenv('INTRADAY_DEFAULT_POINTS', '500'))
+
+# Rolling OI buildup: per-strike samples every step, kept for the largest window
+BUILDUP_WINDOWS = os.getenv('BUILDUP_WINDOWS', '5,15,60')                  # minutes
+BUILDUP_STEP_SECONDS = int(os.getenv('BUILDUP_STEP_SECONDS', '60'))
+BUILDUP_MAX_STRIKES = int(os.getenv('BUILDUP_MAX_STRIKES', '200'))         # per chain
+BUILDUP_MAX_CHAINS = int(os.getenv('BUILDUP_MAX_CHAINS', '100'))
+
+# Prefetch: warm the chains viewers are likely to switch to next (single mode only)
+PREFETCH_ENABLED = os.getenv('PREFETCH_ENABLED', 'true').lower() == 'true'
+PREFETCH_CANDIDATES = int(os.getenv('PREFETCH_CANDIDATES', '3'))          # chains warmed per watched chain
+PREFETCH_MIN_SWITCHES = int(os.getenv('PREFETCH_MIN_SWITCHES', '2'))      # before a learned transition counts
+PREFETCH_HISTORY = int(os.getenv('PREFETCH_HISTORY', '500'))              # switches per state before counts halve
+PREFETCH_INTERVAL = float(os.getenv('PREFETCH_INTERVAL', '2'))
+PREFETCH_MAX_AGE = float(os.getenv('PREFETCH_MAX_AGE', '20'))             # seconds a warm chain may be served
+PREFETCH_IDLE_SECONDS = int(os.getenv('PREFETCH_IDLE_SECONDS', '60'))
+PREFETCH_HEADROOM = float(os.getenv('PREFETCH_HEADROOM', '0.5'))          # limiter share left for users
+
 CSRF_TRUSTED_ORIGINS = [
 "https://www.futuretraders.in"
 ]
@@ -179,6 +259,19 @@ USE_TZ = True
 STATIC_URL = "static/"
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
+# In production WhiteNoise serves content-hashed, compressed copies from
+# collectstatic with far-future immutable cache headers
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage"
+        if 'DATABASE_URL' in os.environ
+        else "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 